@@ -0,0 +1,124 @@
+import os
+import glob
+import geopandas as gpd
+from pyogrio.raw import open_arrow, write_arrow
+
+# --- 1. CONFIGURATION ---
+# Continental checkpoints are FlatGeobuf: binary, with a packed R-tree over the feature
+# bounding boxes, so a bbox read only decodes the features that intersect it.
+CHECKPOINT_DRIVER = 'FlatGeobuf'
+CHECKPOINT_EXTENSION = '.fgb'
+LEGACY_EXTENSION = '.geojson'
+CHECKPOINT_FOLDERS = ['output_checkpoints', 'output_checkpoints2']
+# The index stores features in spatial (Hilbert) order; this column keeps the original
+# order so readers see the rows exactly as they were written
+ORDER_COLUMN = 'checkpoint_row'
+# Chunked writes are appended here first (the FlatGeobuf index can only be built once all
+# features are known), then streamed into the checkpoint
+STAGING_DRIVER = 'GPKG'
+STAGING_EXTENSION = '.gpkg'
+STAGING_LAYER = 'checkpoint'
+
+# --- 2. READING AND WRITING ---
+def checkpoint_path(folder, continent):
+    return os.path.join(folder, f'{continent}_geology{CHECKPOINT_EXTENSION}')
+
+def _without_empty_geometries(gdf):
+    return gdf[~(gdf.geometry.isna() | gdf.geometry.is_empty)]
+
+def _temp_path(path):
+    # A hidden name that keeps the extension (GDAL picks the layout from it) and that the
+    # glob in list_checkpoints() won't pick up after an interrupted write
+    folder, name = os.path.split(path)
+    return os.path.join(folder, '.' + name)
+
+def write_checkpoint(gdf, path):
+    """
+    Writes a checkpoint with its spatial index; written under a temporary name and then renamed.
+
+    Features with a missing or empty geometry are left out: the spatial index can't hold
+    them, and find_k_global.py skips them anyway. Returns the number of features written.
+    """
+    gdf = _without_empty_geometries(gdf.assign(**{ORDER_COLUMN: range(len(gdf))}))
+    temp_path = _temp_path(path)
+    try:
+        gdf.to_file(temp_path, driver=CHECKPOINT_DRIVER, SPATIAL_INDEX='YES')
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(gdf)
+
+def write_checkpoint_chunks(chunks, path):
+    """
+    Writes a checkpoint from an iterable of GeoDataFrames with the same columns and dtypes,
+    holding only one of them in memory at a time: each is appended to a staging GeoPackage,
+    which GDAL then streams into the indexed FlatGeobuf. Rows keep the order they arrive in,
+    and missing or empty geometries are left out as in write_checkpoint().
+
+    Returns the number of features written; if there are none, no file is written.
+    """
+    temp_path = _temp_path(path)
+    staging_path = os.path.splitext(temp_path)[0] + STAGING_EXTENSION
+    rows, written = 0, 0
+    try:
+        for chunk in chunks:
+            chunk, rows = chunk.assign(**{ORDER_COLUMN: range(rows, rows + len(chunk))}), rows + len(chunk)
+            chunk = _without_empty_geometries(chunk)
+            if chunk.empty:
+                continue
+            # 'Unknown' lets Polygon and MultiPolygon chunks share the layer
+            chunk.to_file(staging_path, layer=STAGING_LAYER, driver=STAGING_DRIVER, mode='a' if written else 'w',
+                          geometry_type='Unknown', SPATIAL_INDEX='NO')
+            written += len(chunk)
+        if not written:
+            return 0
+        with open_arrow(staging_path, layer=STAGING_LAYER, use_pyarrow=False) as (meta, reader):
+            write_arrow(reader, temp_path, driver=CHECKPOINT_DRIVER, geometry_name=meta['geometry_name'],
+                        geometry_type=meta['geometry_type'], crs=meta['crs'], SPATIAL_INDEX='YES')
+        os.replace(temp_path, path)
+    finally:
+        for leftover in (staging_path, temp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return written
+
+def read_checkpoint(path, bbox=None):
+    """
+    Reads a checkpoint, or only the features intersecting bbox (min_lon, min_lat, max_lon, max_lat).
+    Legacy GeoJSON checkpoints are read the same way, but without an index to speed up a bbox read.
+    """
+    gdf = gpd.read_file(path, bbox=bbox)
+    if ORDER_COLUMN in gdf.columns:
+        gdf = gdf.sort_values(ORDER_COLUMN, kind='stable').drop(columns=ORDER_COLUMN).reset_index(drop=True)
+    return gdf
+
+def list_checkpoints(folder):
+    """The checkpoints in a folder, falling back to the GeoJSON file for continents not yet converted."""
+    checkpoints = {}
+    for path in sorted(glob.glob(os.path.join(folder, '*' + LEGACY_EXTENSION))):
+        checkpoints[os.path.splitext(path)[0]] = path
+    for path in sorted(glob.glob(os.path.join(folder, '*' + CHECKPOINT_EXTENSION))):
+        checkpoints[os.path.splitext(path)[0]] = path
+    return sorted(checkpoints.values())
+
+# --- 3. CONVERTING OLD CHECKPOINTS ---
+def main():
+    """Converts the GeoJSON checkpoints left by earlier downloads, without re-downloading them."""
+    converted = 0
+    for folder in CHECKPOINT_FOLDERS:
+        for geojson_path in sorted(glob.glob(os.path.join(folder, '*' + LEGACY_EXTENSION))):
+            fgb_path = os.path.splitext(geojson_path)[0] + CHECKPOINT_EXTENSION
+            if os.path.exists(fgb_path):
+                continue
+            print(f"Converting '{geojson_path}'...")
+            try:
+                written = write_checkpoint(gpd.read_file(geojson_path), fgb_path)
+                print(f"  ✅ Saved '{fgb_path}' ({written} features)")
+                converted += 1
+            except Exception as e:
+                print(f"  --> Error converting {geojson_path}. Error: {e}")
+    print(f"\n✅ Converted {converted} checkpoint(s).")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-import json
 import os
 import csv
-import glob
+import numpy as np
+from lith_store import LITH_DEFS_FILE, LITH_FILES, STORE_FOLDER, lith_defs_index, load_or_build_store, lookup_rows
 
 # --- 1. DEFINE THE K-VALUE CALCULATION MODEL ---
 # This is a simplified model. Replace with your own formula for scientific use.
@@ -28,78 +28,43 @@ def calculate_k_value(lithology_info):
     else:
         return 0.0  # Default for unknown types
 
-# --- 2. LOAD LITHOLOGY DEFINITIONS ---
-print("Loading lithology definitions...")
-try:
-    with open('lith_defs.json', 'r') as f:
-        lith_defs_data = json.load(f)['success']['data']
-    
-    # Create a fast-lookup dictionary using lith_id as the key
-    lith_definitions = {item['lith_id']: item for item in lith_defs_data}
-    print(f"Successfully loaded {len(lith_definitions)} lithology definitions.")
-
-except FileNotFoundError:
-    print("Error: 'lith_defs.json' not found. Please check your file setup.")
+# --- 2. LOAD THE CONSOLIDATED LITHOLOGY STORE ---
+# All lith files and lith_defs.json in one columnar store (see lith_store.py), rebuilt only
+# when one of them changes
+print("Loading lithology store...")
+if not os.path.exists(LITH_DEFS_FILE):
+    print(f"Error: '{LITH_DEFS_FILE}' not found. Please check your file setup.")
     exit()
 
-# --- 3. PROCESS EACH LITHOLOGY FILE AND CALCULATE K-VALUES ---
-output_data = []
-lith_files_path = 'liths/lith_*.json'
-lith_files = glob.glob(lith_files_path)
-
-if not lith_files:
-    print(f"Error: No lithology files found at '{lith_files_path}'. Please check your file setup.")
+columns, lith_defs, store_source = load_or_build_store()
+if not len(lith_defs) or not len(columns['lith_id']):
+    print(f"Error: No lithology files found at '{LITH_FILES}'. Please check your file setup.")
     exit()
+print(f"Successfully loaded {len(lith_defs)} lithology definitions and {len(columns['lith_id'])} locations "
+      f"({'from' if store_source == 'store' else 'rebuilt'} '{STORE_FOLDER}').")
 
-print(f"\nFound {len(lith_files)} lithology files to process...")
-
-for filepath in lith_files:
-    try:
-        # Extract the lithology ID from the filename (e.g., '1' from 'liths/lith_1.json')
-        filename = os.path.basename(filepath)
-        lith_id_str = filename.replace('lith_', '').replace('.json', '')
-        lith_id = int(lith_id_str)
-
-        # Get the definition and calculate k for this entire file
-        if lith_id in lith_definitions:
-            lith_info = lith_definitions[lith_id]
-            k_value = calculate_k_value(lith_info)
-            lith_name = lith_info.get('name', 'Unknown')
-        else:
-            # Skip if the lithology ID from the file doesn't have a definition
-            continue
-        
-        # Open the location data file
-        with open(filepath, 'r') as f:
-            location_data = json.load(f)['success']['data']
-
-        # Loop through each location in the file
-        for location in location_data:
-            lat = location.get('lat')
-            lng = location.get('lng')
-
-            if lat is not None and lng is not None:
-                output_data.append({
-                    'latitude': lat,
-                    'longitude': lng,
-                    'k_value': k_value,
-                    'lithology_name': lith_name
-                })
-
-    except (ValueError, KeyError, IndexError, json.JSONDecodeError) as e:
-        print(f"Warning: Could not process file {filepath}. Error: {e}")
+# --- 3. MAP EACH LOCATION TO ITS K-VALUE ---
+# calculate_k_value runs once per definition; locations pick theirs up through the lith_id index
+k_by_def = np.array([calculate_k_value(item) for item in lith_defs], dtype=np.float64)
+name_by_def = np.array([item.get('name', 'Unknown') for item in lith_defs], dtype=object)
 
-print(f"\nProcessed all files. Found {len(output_data)} valid coordinate points.")
+rows = lookup_rows(lith_defs_index(lith_defs), columns['lith_id'])
+has_def = rows >= 0  # Locations whose lithology ID has no definition are skipped
+rows = rows[has_def]
+print(f"\nProcessed all files. Found {len(rows)} valid coordinate points.")
 
 # --- 4. WRITE THE FINAL DATASET TO A CSV FILE ---
 output_csv_file = 'k_values_by_coordinate.csv'
 print(f"Writing output to '{output_csv_file}'...")
 
-if output_data:
+if len(rows):
+    # Macrostrat reports coordinates with 5 decimals; written back the same way
+    latitudes = np.char.mod('%.5f', columns['lat'][has_def])
+    longitudes = np.char.mod('%.5f', columns['lng'][has_def])
     with open(output_csv_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['latitude', 'longitude', 'k_value', 'lithology_name'])
-        writer.writeheader()
-        writer.writerows(output_data)
+        writer = csv.writer(f)
+        writer.writerow(['latitude', 'longitude', 'k_value', 'lithology_name'])
+        writer.writerows(zip(latitudes, longitudes, k_by_def[rows].tolist(), name_by_def[rows]))
     print("✅ Done! Your dataset has been created successfully.")
 else:
-    print("No data was generated to write to the output file.")
\ No newline at end of file
+    print("No data was generated to write to the output file.")
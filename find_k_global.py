@@ -1,8 +1,36 @@
 import pandas as pd
-import geopandas as gpd
+import numpy as np
+import shapely
 import os
-import glob
-import json
+import functools
+import re
+from multiprocessing import Pool
+from checkpoint_io import list_checkpoints, read_checkpoint
+
+# Define keywords for each rock class, in order of priority, with the k-value each maps to
+K_CLASSES = [
+    (['metamorphic', 'gneiss', 'schist', 'marble', 'mylonite', 'migmatite'], 0.05),
+    (['igneous', 'granite', 'basalt', 'volcanic', 'plutonic', 'gabbro', 'rhyolite', 'extrusive'], 0.03),
+    (['sand', 'gravel', 'alluvium', 'quaternary', 'ooze', 'clay', 'undivided'], 0.01),
+    (['sedimentary', 'sandstone', 'limestone', 'shale', 'carbonate', 'conglomerate'], 0.0005),
+]
+DEFAULT_K = 0.01
+
+# One alternation over every keyword, ordered by class priority: at each position the
+# first alternative that matches belongs to the highest-priority class matching there, and
+# the zero-width lookahead also finds keywords overlapping an earlier match.
+_KEYWORD_CLASS = {key: i for i, (keys, _) in enumerate(K_CLASSES) for key in keys}
+_KEYWORD_PATTERN = re.compile('(?=(' + '|'.join(re.escape(key) for keys, _ in K_CLASSES for key in keys) + '))')
+
+@functools.lru_cache(maxsize=None)
+def _classify(text_description):
+    """k-value for one string; memoized, so each distinct description is scanned once per run."""
+    best = len(K_CLASSES)
+    for match in _KEYWORD_PATTERN.finditer(text_description.lower()):
+        best = min(best, _KEYWORD_CLASS[match.group(1)])
+        if best == 0:
+            break
+    return K_CLASSES[best][1] if best < len(K_CLASSES) else DEFAULT_K
 
 def get_k_value_from_text(text_description):
     """
@@ -10,77 +38,75 @@ def get_k_value_from_text(text_description):
     This is a simplified model.
     """
     if not isinstance(text_description, str):
-        return 0.01  # Default for non-text or empty entries
-
-    text_lower = text_description.lower()
-
-    # Define keywords for each rock class
-    metamorphic_keys = ['metamorphic', 'gneiss', 'schist', 'marble', 'mylonite', 'migmatite']
-    igneous_keys = ['igneous', 'granite', 'basalt', 'volcanic', 'plutonic', 'gabbro', 'rhyolite', 'extrusive']
-    unconsolidated_keys = ['sand', 'gravel', 'alluvium', 'quaternary', 'ooze', 'clay', 'undivided']
-    sedimentary_keys = ['sedimentary', 'sandstone', 'limestone', 'shale', 'carbonate', 'conglomerate']
-
-    # Check in a specific order of priority
-    if any(key in text_lower for key in metamorphic_keys):
-        return 0.05
-    if any(key in text_lower for key in igneous_keys):
-        return 0.03
-    if any(key in text_lower for key in unconsolidated_keys):
-        return 0.01
-    if any(key in text_lower for key in sedimentary_keys):
-        return 0.0005
-    
-    return 0.01 # Default value if no keywords are found
+        return DEFAULT_K  # Default for non-text or empty entries
+    return _classify(text_description)
+
+def get_k_values_from_texts(texts):
+    """Column-wise get_k_value_from_text for a Series of strings; each distinct text is classified once."""
+    codes, uniques = pd.factorize(texts)
+    return np.array([_classify(text) for text in uniques], dtype=np.float64)[codes]
 
 # --- SETUP AND FILE PROCESSING ---
 input_folder = 'output_checkpoints2'
 output_folder = 'k_value_outputs2'
-os.makedirs(output_folder, exist_ok=True)
-geojson_files = glob.glob(os.path.join(input_folder, '*.geojson'))
+WORKERS = os.cpu_count() or 1
+bbox = None  # (min_lon, min_lat, max_lon, max_lat) to process only the features intersecting it
 
-if not geojson_files:
-    print(f"Error: No GeoJSON files found in the '{input_folder}' directory.")
-    exit()
+def _text_column(gdf, column):
+    # Same strings the row-wise str(row.get(column, '')) produced, including 'None' and 'nan'
+    if column not in gdf.columns:
+        return pd.Series('', index=gdf.index)
+    return gdf[column].map(str)
 
-print(f"Found {len(geojson_files)} files to process...")
-
-for filepath in geojson_files:
+def process_file(filepath):
+    """Converts one continental checkpoint to its k-value CSV; returns the message to print."""
     filename = os.path.basename(filepath)
-    print(f"\n--- Processing {filename} ---")
-
     try:
-        gdf = gpd.read_file(filepath)
-        output_data = []
-        
-        for index, row in gdf.iterrows():
-            # --- THIS IS THE KEY FIX ---
-            # Use the exact column names from your file: LITHO_EN and DESCR_EN
-            lith_text = str(row.get('LITHO_EN', ''))
-            desc_text = str(row.get('DESCR_EN', ''))
-            full_description = f"{lith_text} {desc_text}"
-
-            k_value = get_k_value_from_text(full_description)
-            
-            try:
-                centroid = row.geometry.centroid
-                lat = round(centroid.y, 4)
-                lon = round(centroid.x, 4)
-            except Exception:
-                continue
-
-            output_data.append({
-                'latitude': lat,
-                'longitude': lon,
-                'k_value': k_value,
-                'description': desc_text
-            })
-            
-        results_df = pd.DataFrame(output_data)
-        output_path = os.path.join(output_folder, filename.replace('.geojson', '_k_values.csv'))
+        gdf = read_checkpoint(filepath, bbox)
+
+        # Use the exact column names from your file: LITHO_EN and DESCR_EN
+        lith_text = _text_column(gdf, 'LITHO_EN')
+        desc_text = _text_column(gdf, 'DESCR_EN')
+        k_values = get_k_values_from_texts(lith_text + ' ' + desc_text)
+
+        # One vectorized centroid call; rows without a usable centroid are skipped as before
+        geometries = np.asarray(gdf.geometry.values, dtype=object)
+        has_centroid = ~shapely.is_missing(geometries) & ~shapely.is_empty(geometries)
+        centroids = shapely.centroid(geometries[has_centroid])
+        keep = np.flatnonzero(has_centroid)[~shapely.is_empty(centroids)]
+        centroids = centroids[~shapely.is_empty(centroids)]
+
+        output_data = {
+            # Python's round() per value, so the CSV matches the row-by-row version exactly
+            'latitude': [round(y, 4) for y in shapely.get_y(centroids).tolist()],
+            'longitude': [round(x, 4) for x in shapely.get_x(centroids).tolist()],
+            'k_value': k_values[keep],
+            'description': desc_text.values[keep]
+        }
+        results_df = pd.DataFrame(output_data) if len(keep) else pd.DataFrame([])
+        output_path = os.path.join(output_folder, os.path.splitext(filename)[0] + '_k_values.csv')
         results_df.to_csv(output_path, index=False)
-        print(f"✅ Success! Saved processed data to '{output_path}'")
+        return f"✅ Success! Saved processed data to '{output_path}'"
 
     except Exception as e:
-        print(f"  --> Error processing file {filename}. Error: {e}")
+        return f"  --> Error processing file {filename}. Error: {e}"
+
+def main():
+    os.makedirs(output_folder, exist_ok=True)
+    checkpoint_files = list_checkpoints(input_folder)
+
+    if not checkpoint_files:
+        print(f"Error: No checkpoint files found in the '{input_folder}' directory.")
+        exit()
+
+    print(f"Found {len(checkpoint_files)} files to process on {min(WORKERS, len(checkpoint_files))} workers...")
+
+    with Pool(min(WORKERS, len(checkpoint_files))) as pool:
+        for filepath, message in zip(checkpoint_files, pool.imap(process_file, checkpoint_files)):
+            print(f"\n--- Processing {os.path.basename(filepath)} ---")
+            print(message)
+
+    print("\nAll tasks complete!")
 
-print("\nAll tasks complete!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,9 @@
-import pandas as pd
-import geopandas as gpd
 from owslib.wfs import WebFeatureService
-import io
-import time
-import os
+from wfs_download import MAX_FEATURES, TileDownloader, download_checkpoints
 
 # --- 1. Setup ---
-# Create a directory to store the output checkpoint files
+# Directory for the output checkpoint files; downloaded tiles are cached in 'wfs_cache'
 output_folder = 'output_checkpoints'
-os.makedirs(output_folder, exist_ok=True)
 
 # WFS Connection details
 wfs_url = 'https://mapsref.brgm.fr/wxs/1GG/CGMW_Bedrock_and_Structural_Geology'
@@ -42,46 +37,18 @@ continents = {
 step = 15  # Tile size in degrees
 print("\nStarting targeted bulk download...")
 
-for continent, bbox in continents.items():
-    print(f"\n--- Processing {continent} ---")
-    min_lon, min_lat, max_lon, max_lat = bbox
-    continent_gdfs = []  # List to hold all the data tiles for this continent
-    
-    # Loop through the grid for the current continent
-    for lon in range(min_lon, max_lon, step):
-        for lat in range(min_lat, max_lat, step):
-            tile_bbox = (lon, lat, lon + step, lat + step)
-            print(f"  Requesting tile: {tile_bbox}...")
-            
-            try:
-                # Request the data for one tile
-                response = wfs.getfeature(typename=layer_name, bbox=tile_bbox, outputFormat=output_format)
-                tile_gdf = gpd.read_file(io.BytesIO(response.read()))
-
-                # If the tile has data, add it to our list for this continent
-                if not tile_gdf.empty:
-                    continent_gdfs.append(tile_gdf)
-            except Exception as e:
-                print(f"    --> Warning: Could not process tile. Error: {e}")
-            
-            # Be polite to the server
-            time.sleep(1)
-
-    # --- CHECKPOINT STEP: Save the raw data for this continent ---
-    if continent_gdfs:
-        print(f"  Combining tiles for {continent}...")
-        
-        # Combine all the downloaded tiles into a single GeoDataFrame
-        continent_full_gdf = pd.concat(continent_gdfs, ignore_index=True)
-        
-        # Define the output filename for the checkpoint
-        checkpoint_filename = os.path.join(output_folder, f'{continent}_geology.geojson')
-        
-        # Save the full, raw geographic data to the file
-        continent_full_gdf.to_file(checkpoint_filename, driver='GeoJSON')
-        
-        print(f"  ✅ Checkpoint saved: {checkpoint_filename} ({len(continent_full_gdf)} features)")
-    else:
-        print(f"  No data was downloaded for {continent}.")
-
-print("\n✅ All tasks complete!")
\ No newline at end of file
+def fetch_tile(tile_bbox):
+    """One GetFeature request; a response of MAX_FEATURES features is split into smaller tiles."""
+    response = wfs.getfeature(typename=layer_name, bbox=tile_bbox, outputFormat=output_format,
+                              maxfeatures=MAX_FEATURES)
+    return response.read()
+
+# Tiles are requested concurrently under a rate limit and each one is cached on disk as it
+# arrives, so an interrupted run picks up where it stopped
+downloader = TileDownloader(fetch_tile, layer_name)
+incomplete = download_checkpoints(downloader, continents, step, output_folder)
+
+if incomplete:
+    print(f"\nIncomplete: {', '.join(incomplete)}. Run the script again to resume.")
+    exit(1)
+print("\n✅ All tasks complete!")
@@ -2,7 +2,8 @@ import pandas as pd
 import geopandas as gpd
 import numpy as np
 import os
-from shapely.geometry import Point, Polygon
+import shapely
+from shapely.geometry import Polygon
 
 # --- 1. Setup ---
 output_folder = 'k_value_outputs2'
@@ -14,23 +15,26 @@ spacing = 2.0  # Spacing in degrees.
 
 def generate_points_in_shape(shape, spacing, k_value, description):
     """Generates a grid of points that fall within a given geographic shape."""
-    points = []
     min_lon, min_lat, max_lon, max_lat = shape.bounds
     
     lon_coords = np.arange(min_lon, max_lon, spacing)
     lat_coords = np.arange(min_lat, max_lat, spacing)
-    grid_points = [Point(lon, lat) for lon in lon_coords for lat in lat_coords]
+    # Longitude-major order (lon outer, lat inner), as the points have always been listed
+    lon_grid, lat_grid = np.meshgrid(lon_coords, lat_coords, indexing='ij')
+    lon_grid, lat_grid = lon_grid.ravel(), lat_grid.ravel()
     
-    valid_points = [p for p in grid_points if shape.contains(p)]
+    # One vectorized containment test against the prepared shape instead of a Point per node
+    shapely.prepare(shape)
+    inside = shapely.contains_xy(shape, lon_grid, lat_grid)
     
-    for point in valid_points:
-        points.append({
-            'latitude': point.y,
-            'longitude': point.x,
-            'k_value': k_value,
-            'description': description
-        })
-    return pd.DataFrame(points)
+    if not inside.any():
+        return pd.DataFrame([])
+    return pd.DataFrame({
+        'latitude': lat_grid[inside],
+        'longitude': lon_grid[inside],
+        'k_value': k_value,
+        'description': description
+    })
 
 print("Loading world map data for accurate shapes...")
 try:
@@ -81,7 +85,7 @@ except (IndexError, KeyError):
     print("Could not find Antarctica in the world map data.")
 
 # --- 4. Generate Data for Oceans ---
-print("\n--- Processing Oceans (this may take a few minutes)... ---")
+print("\n--- Processing Oceans ---")
 try:
     world_box = Polygon([(-180, -90), (180, -90), (180, 90), (-180, 90)])
     land_union = world.unary_union
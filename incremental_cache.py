@@ -0,0 +1,196 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import glob
+import json
+import os
+import shutil
+import time
+from scipy.spatial import KDTree
+from tile_grid import CACHE_FILE, DESCRIPTIONS_KEY, tile_centers
+
+# --- 1. CONFIGURATION ---
+INPUT_FOLDER = 'k_value_outputs2'
+DATASET_FILE = 'global_complete_k_values.csv'
+STATE_FILE = 'tile_cache_state.json'
+SNAPSHOT_FILE = 'tile_cache_dataset.csv'  # Copy of the dataset the current cache was built from
+REPORT_FILE = 'tile_cache_dirty_report.json'
+RADIUS_KM = 20.0  # Must match k_test2.py
+EARTH_RADIUS_KM = 6371.0
+DATASET_COLUMNS = ['latitude', 'longitude', 'k_value', 'description']
+
+# --- 2. INPUT FINGERPRINTS ---
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint_inputs(input_folder=INPUT_FOLDER):
+    """Returns {filename: {"sha256", "rows", "bbox"}} for every input CSV."""
+    fingerprints = {}
+    for path in sorted(glob.glob(os.path.join(input_folder, '*.csv'))):
+        df = pd.read_csv(path, usecols=['latitude', 'longitude']).dropna()
+        bbox = [df['longitude'].min(), df['latitude'].min(), df['longitude'].max(), df['latitude'].max()]
+        fingerprints[os.path.basename(path)] = {
+            "sha256": file_sha256(path),
+            "rows": len(df),
+            "bbox": [float(v) for v in bbox] if len(df) else None
+        }
+    return fingerprints
+
+def diff_inputs(old, new):
+    """Lists added, removed and modified inputs with their old and new bounding boxes."""
+    changes = []
+    for name in sorted(set(old) | set(new)):
+        before, after = old.get(name), new.get(name)
+        if before is not None and after is not None and before["sha256"] == after["sha256"]:
+            continue
+        status = "added" if before is None else "removed" if after is None else "modified"
+        changes.append({
+            "file": name,
+            "status": status,
+            "old_bbox": before["bbox"] if before else None,
+            "new_bbox": after["bbox"] if after else None,
+            "old_rows": before["rows"] if before else 0,
+            "new_rows": after["rows"] if after else 0
+        })
+    return changes
+
+# --- 3. DIRTY TILE DETECTION ---
+def latlon_to_xyz(lat, lon):
+    lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat_rad) * np.cos(lon_rad), np.cos(lat_rad) * np.sin(lon_rad), np.sin(lat_rad)])
+
+def chord_to_km(chord):
+    return 2.0 * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0)) * EARTH_RADIUS_KM
+
+def load_dataset(path):
+    df = pd.read_csv(path)
+    df.dropna(subset=['latitude', 'longitude', 'k_value'], inplace=True)
+    return df
+
+def changed_points(old_df, new_df):
+    """Rows present in only one of the two datasets (added, removed or modified)."""
+    merged = pd.merge(old_df[DATASET_COLUMNS], new_df[DATASET_COLUMNS], how='outer', indicator=True)
+    return merged[merged['_merge'] != 'both']
+
+def find_dirty_tiles(old_df, changed_df):
+    """
+    Flags the tiles whose result can differ after the change.
+
+    A tile's nearest point can only change if a changed point lies within the old nearest
+    distance, and its description only depends on points within RADIUS_KM. So a tile is
+    dirty exactly when some changed point is within max(old nearest distance, RADIUS_KM).
+    """
+    center_lat, center_lon = tile_centers()
+    if changed_df.empty:
+        return np.zeros(center_lat.shape, dtype=bool)
+    centers_xyz = latlon_to_xyz(center_lat.ravel(), center_lon.ravel())
+
+    old_tree = KDTree(latlon_to_xyz(old_df['latitude'].values, old_df['longitude'].values))
+    nearest_km = chord_to_km(old_tree.query(centers_xyz, k=1)[0])
+
+    changed_tree = KDTree(latlon_to_xyz(changed_df['latitude'].values, changed_df['longitude'].values))
+    changed_km = chord_to_km(changed_tree.query(centers_xyz, k=1)[0])
+
+    dirty = changed_km <= np.maximum(nearest_km, RADIUS_KM) + 1e-9
+    return dirty.reshape(center_lat.shape)
+
+# --- 4. STATE AND REPORTING ---
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return None
+    with open(STATE_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(fingerprints):
+    shutil.copyfile(DATASET_FILE, SNAPSHOT_FILE)
+    state = {"inputs": fingerprints, "dataset_sha256": file_sha256(DATASET_FILE)}
+    with open(STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+
+def write_report(input_changes, n_changed_points, dirty):
+    tile_ys, tile_xs = np.nonzero(dirty)
+    report = {
+        "changed_inputs": input_changes,
+        "changed_points": int(n_changed_points),
+        "dirty_tiles": int(dirty.sum()),
+        "total_tiles": int(dirty.size),
+        "dirty_tile_bbox": ([int(tile_xs.min()), int(tile_ys.min()), int(tile_xs.max()), int(tile_ys.max())]
+                            if len(tile_xs) else None),
+        "dirty_tile_keys": [f"{x},{y}" for x, y in zip(tile_xs, tile_ys)]
+    }
+    with open(REPORT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(report, f)
+
+    print("\n--- Dirty Tile Report ---")
+    for change in input_changes:
+        print(f"  {change['file']}: {change['status']} ({change['old_rows']} -> {change['new_rows']} rows)"
+              f" old bbox {change['old_bbox']} new bbox {change['new_bbox']}")
+    print(f"  Changed dataset points: {n_changed_points}")
+    print(f"  Dirty tiles: {report['dirty_tiles']} of {report['total_tiles']}"
+          f" ({100.0 * report['dirty_tiles'] / report['total_tiles']:.2f}%)")
+    print(f"  Dirty tile bbox (x0, y0, x1, y1): {report['dirty_tile_bbox']}")
+    print(f"  Full report saved to '{REPORT_FILE}'")
+
+# --- 5. INCREMENTAL UPDATE ---
+def recompute_tiles(dirty):
+    """Recomputes only the dirty tiles in the existing cache, in place."""
+    import k_test2  # Loads the current dataset and builds its KD-tree on import
+
+    with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    description_codes = {d: i for i, d in enumerate(cache.pop(DESCRIPTIONS_KEY, []))}
+
+    center_lat, center_lon = tile_centers()
+    for tile_y, tile_x in zip(*np.nonzero(dirty)):
+        lat, lon = float(center_lat[tile_y, tile_x]), float(center_lon[tile_y, tile_x])
+        nearest_point, description, similar = k_test2.find_k_description_and_similarity(lat, lon)
+        cache[f"{tile_x},{tile_y}"] = {
+            "k_value": nearest_point["k_value"] if nearest_point is not None else 0.0,
+            "description_code": k_test2.encode_description(description, description_codes),
+            "similar": similar
+        }
+
+    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump({**cache, DESCRIPTIONS_KEY: list(description_codes)}, f)
+
+def main():
+    start = time.time()
+    fingerprints = fingerprint_inputs()
+    state = load_state()
+
+    if state is None or not os.path.exists(CACHE_FILE) or not os.path.exists(SNAPSHOT_FILE):
+        print("No previous build state found; running a full tile precompute...")
+        import k_test2
+        k_test2.main()
+        save_state(fingerprints)
+        print(f"✅ Full build recorded in '{STATE_FILE}' ({time.time() - start:.1f}s)")
+        return
+
+    input_changes = diff_inputs(state["inputs"], fingerprints)
+    newest_input = max((os.path.getmtime(os.path.join(INPUT_FOLDER, c["file"]))
+                        for c in input_changes if c["status"] != "removed"), default=0.0)
+    if os.path.getmtime(DATASET_FILE) < newest_input:
+        print(f"Warning: '{DATASET_FILE}' is older than the changed inputs. Run smooth.py first.")
+
+    if file_sha256(DATASET_FILE) == state["dataset_sha256"]:
+        print("Dataset unchanged since the last build; the tile cache is up to date.")
+        if input_changes:
+            write_report(input_changes, 0, np.zeros(tile_centers()[0].shape, dtype=bool))
+        return
+
+    old_df, new_df = load_dataset(SNAPSHOT_FILE), load_dataset(DATASET_FILE)
+    changed_df = changed_points(old_df, new_df)
+    dirty = find_dirty_tiles(old_df, changed_df)
+    write_report(input_changes, len(changed_df), dirty)
+
+    print(f"\nRecomputing {int(dirty.sum())} dirty tiles...")
+    recompute_tiles(dirty)
+    save_state(fingerprints)
+    print(f"✅ Tile cache updated in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+from functools import partial
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import scipy
+from scipy import sparse
+from scipy.spatial import ConvexHull, Delaunay, KDTree
+from kd_index import latlon_to_xyz
+
+# --- 1. CONFIGURATION ---
+WEIGHTS_FOLDER = "interpolation_weights"
+WEIGHTS_FILE = "weights.npz"
+META_FILE = "meta.json"
+MODES = ("planar", "spherical")
+CHUNK_NODES = 8192  # Grid nodes per work item in spherical mode
+WORKERS = os.cpu_count() or 1
+BARYCENTRIC_TOLERANCE = 1e-12
+
+# --- 2. HELPERS ---
+def coordinates_sha256(points, grid_x, grid_y, mode="planar"):
+    """Hash of the known point coordinates (in order), the grid they are interpolated onto and the mode."""
+    digest = hashlib.sha256(mode.encode('ascii'))
+    for array in (points, grid_x, grid_y):
+        array = np.ascontiguousarray(array, dtype='<f8')
+        digest.update(str(array.shape).encode('ascii'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+# --- 3. WEIGHTS ---
+def build_linear_weights(points, grid_x, grid_y):
+    """
+    Barycentric weights of griddata(method='linear') as a sparse (grid nodes x points) matrix.
+
+    Each grid node inside the Delaunay triangulation gets one row holding the weights of its
+    triangle's three corners, so values @ weights reproduces the linear interpolation. Nodes
+    outside the convex hull get an empty row, which interpolate() turns into NaN.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    xi = np.column_stack([np.ravel(grid_x), np.ravel(grid_y)]).astype(np.float64)
+    tri = Delaunay(points)
+    simplex = tri.find_simplex(xi)
+    inside = simplex >= 0
+
+    transform = tri.transform[simplex[inside]]
+    coords = np.einsum('nij,nj->ni', transform[:, :2], xi[inside] - transform[:, 2])
+    barycentric = np.column_stack([coords, 1.0 - coords.sum(axis=1)])
+    return _weights_matrix(inside, tri.simplices[simplex[inside]], barycentric, len(points))
+
+def _weights_matrix(rows, corners, barycentric, n_points):
+    """CSR matrix with the given three corner weights on each listed row and empty rows elsewhere."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.where(rows, 3, 0))
+    # Built from raw arrays, so exact-zero weights stay stored and only outside rows are empty
+    return sparse.csr_matrix((barycentric.ravel(), corners.ravel(), indptr), shape=(len(rows), n_points))
+
+def interpolate(weights, values):
+    """Linear interpolation of new values at the known points: one sparse mat-vec."""
+    result = weights @ np.asarray(values, dtype=np.float64)
+    result[np.diff(weights.indptr) == 0] = np.nan
+    return result
+
+# --- 4. SPHERICAL WEIGHTS ---
+def _locate_on_sphere(sphere, bounds):
+    """Containing hull facet and normalized barycentric weights for a chunk of grid nodes."""
+    start, stop = bounds
+    nodes = sphere["nodes"][start:stop]
+    inverse, incident = sphere["inverse"], sphere["incident"]
+
+    # The containing facet almost always touches the nearest hull vertex; try its facets in
+    # turn, testing only the nodes that are still unresolved
+    _, nearest = sphere["tree"].query(nodes)
+    facet = np.full(len(nodes), -1, dtype=np.int64)
+    barycentric = np.zeros((len(nodes), 3))
+    pending = np.arange(len(nodes))
+    for slot in range(incident.shape[1]):
+        candidate = incident[nearest[pending], slot]
+        pending = pending[candidate >= 0]
+        candidate = candidate[candidate >= 0]
+        if not len(pending):
+            break
+        weights = np.einsum('nij,nj->ni', inverse[candidate], nodes[pending])
+        hit = (weights >= -BARYCENTRIC_TOLERANCE).all(axis=1)
+        facet[pending[hit]] = candidate[hit]
+        barycentric[pending[hit]] = weights[hit]
+        pending = pending[~hit]
+
+    # Exact fallback: the ray from the center leaves the hull through the facet maximizing
+    # n.u / d; coplanar facets tie on that score, so take the tied one containing the node
+    for node in np.flatnonzero(facet < 0):
+        scores = sphere["scaled_normals"] @ nodes[node]
+        tied = np.flatnonzero(scores >= scores.max() - BARYCENTRIC_TOLERANCE)
+        weights = inverse[tied] @ nodes[node]
+        best = (weights >= -BARYCENTRIC_TOLERANCE).all(axis=1).argmax()
+        facet[node], barycentric[node] = tied[best], weights[best]
+
+    barycentric = np.clip(barycentric, 0.0, None)
+    return facet, barycentric / barycentric.sum(axis=1, keepdims=True)
+
+def build_spherical_weights(points, grid_x, grid_y, workers=WORKERS, chunk_nodes=CHUNK_NODES):
+    """
+    Linear interpolation weights on the unit sphere, in the same sparse format as build_linear_weights.
+
+    The convex hull of the known points' xyz positions is their spherical Delaunay
+    triangulation, so it has no seam at +-180 degrees and no distortion near the poles.
+    Each grid node is interpolated on the hull facet its direction passes through (a
+    gnomonic projection onto that facet). Grid nodes are located in chunks on a thread pool
+    (the KD-tree queries and array kernels release the GIL, and smooth.py has no
+    __main__ guard for worker processes to import it safely).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    xyz = latlon_to_xyz(points[:, 1], points[:, 0])
+    hull = ConvexHull(xyz)
+    offsets = hull.equations[:, 3]
+    if (offsets >= 0).any():
+        raise ValueError("Spherical interpolation needs known points all around the globe "
+                         "(the center of the Earth must lie inside their convex hull).")
+
+    # Per facet: inverse of the matrix whose columns are its corners, so weights = inverse @ node
+    simplices = hull.simplices
+    inverse = np.linalg.inv(xyz[simplices].transpose(0, 2, 1))
+
+    # Facets around each hull vertex, padded with -1 to the highest vertex degree
+    vertex_of = np.full(len(xyz), -1, dtype=np.int64)
+    vertex_of[hull.vertices] = np.arange(len(hull.vertices))
+    facet_vertex = vertex_of[simplices.ravel()]
+    order = np.argsort(facet_vertex, kind='stable')
+    degree = np.bincount(facet_vertex, minlength=len(hull.vertices))
+    starts = np.concatenate([[0], np.cumsum(degree)[:-1]])
+    slot = np.arange(len(order)) - np.repeat(starts, degree)
+    incident = np.full((len(hull.vertices), degree.max()), -1, dtype=np.int64)
+    incident[facet_vertex[order], slot] = order // 3
+
+    sphere = {
+        "nodes": latlon_to_xyz(np.ravel(grid_y), np.ravel(grid_x)),
+        "tree": KDTree(xyz[hull.vertices]),
+        "inverse": inverse,
+        "incident": incident,
+        "scaled_normals": hull.equations[:, :3] / -offsets[:, None]
+    }
+    n_nodes = len(sphere["nodes"])
+    chunks = [(start, min(start + chunk_nodes, n_nodes)) for start in range(0, n_nodes, chunk_nodes)]
+    with ThreadPool(max(1, min(workers, len(chunks)))) as pool:
+        results = pool.map(partial(_locate_on_sphere, sphere), chunks)
+
+    facet = np.concatenate([r[0] for r in results])
+    barycentric = np.concatenate([r[1] for r in results])
+    return _weights_matrix(np.ones(n_nodes, dtype=bool), simplices[facet], barycentric, len(points))
+
+# --- 5. PERSISTED WEIGHTS ---
+def save_weights(weights, content_hash, folder=WEIGHTS_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    # Removed before the matrix is replaced and written again last, so new (or half-written)
+    # weights are never paired with the old coordinates' meta.json
+    meta_path = os.path.join(folder, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    sparse.save_npz(os.path.join(folder, WEIGHTS_FILE), weights, compressed=False)
+    meta = {"content_sha256": content_hash, "shape": list(weights.shape), "scipy_version": scipy.__version__}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+def load_weights(content_hash, folder=WEIGHTS_FOLDER):
+    """Returns the persisted weights if they were built for exactly these coordinates, else None."""
+    meta_path = os.path.join(folder, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("content_sha256") != content_hash:
+        return None
+    try:
+        return sparse.load_npz(os.path.join(folder, WEIGHTS_FILE)).tocsr()
+    except Exception:
+        return None
+
+def load_or_build_weights(points, grid_x, grid_y, mode="planar", folder=WEIGHTS_FOLDER):
+    """
+    Returns (weights, source) where source is "cache" or "built".
+
+    mode is "planar" (griddata's linear interpolation in lon/lat) or "spherical"
+    (build_spherical_weights). The triangulation only depends on where the known points
+    are, so re-running with new k-values at the same locations skips it entirely.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown interpolation mode '{mode}'; expected one of {MODES}.")
+    folder = os.path.join(folder, mode)
+    content_hash = coordinates_sha256(points, grid_x, grid_y, mode)
+    weights = load_weights(content_hash, folder)
+    if weights is not None:
+        return weights, "cache"
+
+    if mode == "spherical":
+        weights = build_spherical_weights(points, grid_x, grid_y)
+    else:
+        weights = build_linear_weights(points, grid_x, grid_y)
+    try:
+        save_weights(weights, content_hash, folder)
+    except OSError as e:
+        print(f"Warning: Could not persist the interpolation weights. Error: {e}")
+    return weights, "built"
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from k_snapshot import CSV_FILE, load_dataframe
+from kd_index import load_or_build_kdtree
+from parallel_precompute import encode_dataset, lookup_points
+from tile_grid import NO_DESCRIPTION_CODE
+
+# --- 1. CONFIGURATION ---
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH = 512  # Points answered by one vectorized query
+MAX_WAIT_MS = 2.0  # How long the first point of a batch waits for company
+LATENCY_SAMPLES = 10000  # Recent request latencies kept for the percentiles
+MAX_POINTS_PER_REQUEST = 10000
+MAX_BODY_BYTES = 1 << 20
+
+# --- 2. MICRO-BATCHING INDEX ---
+class MicroBatchingKIndex:
+    """
+    Answers concurrent point lookups in batches against the k-value KD-tree.
+
+    Each lookup() enqueues its point and awaits a future. A single batcher task takes the
+    first waiting point, gathers more for up to MAX_WAIT_MS (or until MAX_BATCH points),
+    then answers them all with one lookup_points call, so the per-point Python overhead
+    of sample.py-style functions is paid once per batch instead of once per point.
+    """
+
+    def __init__(self, tree, arrays, descriptions, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.tree = tree
+        self.arrays = arrays
+        self.descriptions = descriptions
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = None
+        self.batcher = None
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.batch_sizes = deque(maxlen=LATENCY_SAMPLES)
+        self.points = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+
+    @classmethod
+    def load(cls, csv_file=CSV_FILE, **kwargs):
+        df, _ = load_dataframe(csv_file)
+        tree, _ = load_or_build_kdtree(df, csv_file)
+        arrays, descriptions = encode_dataset(df)
+        return cls(tree, arrays, descriptions, **kwargs)
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.create_task(self._run_batches())
+
+    async def stop(self):
+        self.batcher.cancel()
+        try:
+            await self.batcher
+        except asyncio.CancelledError:
+            pass
+
+    async def lookup(self, lat, lon):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((lat, lon, time.perf_counter(), future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if self.queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self.queue.get_nowait())
+            self._answer(batch)
+
+    def _answer(self, batch):
+        lat = np.array([item[0] for item in batch], dtype=np.float64)
+        lon = np.array([item[1] for item in batch], dtype=np.float64)
+        try:
+            nearest, code, similar = lookup_points(self.tree, self.arrays, lat, lon)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        done = time.perf_counter()
+        for i, (_, _, queued, future) in enumerate(batch):
+            if future.done():  # The client went away while waiting
+                continue
+            row = nearest[i]
+            future.set_result({
+                "latitude": float(lat[i]),
+                "longitude": float(lon[i]),
+                "k_value": float(self.arrays["k_value"][row]),
+                "nearest": {"latitude": float(self.arrays["latitude"][row]),
+                            "longitude": float(self.arrays["longitude"][row])},
+                "description": None if code[i] == NO_DESCRIPTION_CODE else self.descriptions[code[i]],
+                "similar": bool(similar[i])
+            })
+            self.latencies.append(done - queued)
+        self.batch_sizes.append(len(batch))
+        self.points += len(batch)
+        self.batches += 1
+
+    def stats(self):
+        """Request latency percentiles (ms), batch sizes and queue depth."""
+        latencies = np.array(self.latencies) * 1000.0
+        sizes = np.array(self.batch_sizes)
+        percentiles = {f"p{p}": round(float(np.percentile(latencies, p)), 3) if len(latencies) else None
+                       for p in (50, 90, 99)}
+        return {
+            "points": self.points,
+            "batches": self.batches,
+            "latency_ms": percentiles,
+            "batch_size": {"mean": round(float(sizes.mean()), 2) if len(sizes) else None,
+                           "max": int(sizes.max()) if len(sizes) else None},
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+# --- 3. HTTP/JSON FRONT END (STANDARD LIBRARY ONLY) ---
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+def _parse_point(lat, lon):
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "lat and lon must be numbers")
+    if not (math.isfinite(lat) and math.isfinite(lon)) or abs(lat) > 90.0:
+        raise HTTPError(400, "lat must be in [-90, 90] and lon finite")
+    return lat, lon
+
+async def _route(index, method, target, body):
+    """
+    GET  /k?lat=..&lon=..                    -> one result
+    POST /k  {"points": [[lat, lon], ...]}   -> {"results": [...]}, each point joins the batches
+    GET  /stats                              -> MicroBatchingKIndex.stats()
+    """
+    url = urlsplit(target)
+    if url.path == "/stats":
+        return index.stats()
+    if url.path != "/k":
+        raise HTTPError(404, f"unknown path '{url.path}'")
+
+    if method == "GET":
+        query = parse_qs(url.query)
+        return await index.lookup(*_parse_point(query.get("lat", [None])[0], query.get("lon", [None])[0]))
+    if method == "POST":
+        try:
+            points = json.loads(body)["points"]
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, 'body must be JSON like {"points": [[lat, lon], ...]}')
+        if not isinstance(points, list) or len(points) > MAX_POINTS_PER_REQUEST:
+            raise HTTPError(400, f"points must be a list of at most {MAX_POINTS_PER_REQUEST} [lat, lon] pairs")
+        parsed = []
+        for point in points:
+            if not isinstance(point, (list, tuple)) or len(point) != 2:
+                raise HTTPError(400, "each point must be [lat, lon]")
+            parsed.append(_parse_point(*point))
+        return {"results": await asyncio.gather(*(index.lookup(lat, lon) for lat, lon in parsed))}
+    raise HTTPError(405, f"method {method} not allowed")
+
+async def _handle_connection(index, reader, writer):
+    """Minimal HTTP/1.1 with keep-alive: enough for JSON clients and load generators."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = headers.get("connection", "").lower() != "close"
+            try:
+                try:
+                    method, target, _ = request_line.decode("latin-1").split()
+                    # Plain digits only: int() would also take "-1", "+1" or "1_0"
+                    length = headers.get("content-length", "0")
+                    if not (length.isascii() and length.isdigit()):
+                        raise ValueError(length)
+                    length = int(length)
+                except ValueError:
+                    keep_alive = False
+                    raise HTTPError(400, "malformed request")
+                if length > MAX_BODY_BYTES:
+                    keep_alive = False
+                    raise HTTPError(413, "request body too large")
+                body = await reader.readexactly(length) if length else b""
+                status, payload = 200, await _route(index, method, target, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception as e:
+                status, payload = 500, {"error": f"An error occurred during query: {e}"}
+
+            data = json.dumps(payload).encode("utf-8")
+            writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                         f"Content-Type: application/json\r\n"
+                         f"Content-Length: {len(data)}\r\n"
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(index, host=HOST, port=PORT):
+    index.start()
+    server = await asyncio.start_server(lambda r, w: _handle_connection(index, r, w), host, port)
+    print(f"✅ Serving k-value lookups on http://{host}:{port}/k?lat=34.6834&lon=-82.8374 (stats at /stats)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await index.stop()
+
+# --- 4. MAIN EXECUTION ---
+def main():
+    print(f"Loading data from '{CSV_FILE}'...")
+    if not os.path.exists(CSV_FILE):
+        print(f"\nFatal Error: Data file not found at '{CSV_FILE}'.")
+        exit()
+
+    index = MicroBatchingKIndex.load(CSV_FILE)
+    print(f"✅ Index ready over {len(index.arrays['k_value'])} points "
+          f"(batches of up to {index.max_batch} points, {MAX_WAIT_MS} ms window).")
+    try:
+        asyncio.run(serve(index))
+    except KeyboardInterrupt:
+        print(f"\nStopped. {index.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import hashlib
+import io
+import json
+import mmap
+import os
+import sys
+import time
+
+# Numpy/pandas are imported inside the functions that need them, so k_test.py can read
+# snapshots with the standard library only.
+
+# --- 1. CONFIGURATION ---
+CSV_FILE = "global_complete_k_values.csv"
+SNAPSHOT_SUFFIX = ".snapshot"
+META_FILE = "meta.json"
+NO_DESCRIPTION_CODE = -1
+# Column name -> (file name, struct/memoryview format, numpy dtype); all little-endian
+COLUMNS = {
+    "latitude": ("latitude.f64", "d", "<f8"),
+    "longitude": ("longitude.f64", "d", "<f8"),
+    "k_value": ("k_value.f64", "d", "<f8"),
+    "description_code": ("description_code.i32", "i", "<i4"),
+    "morton_key": ("morton_key.u32", "I", "<u4"),
+    # Row number in the CSV: rows are stored in Morton order, and loaders put them back in
+    # CSV order so nearest-neighbour ties resolve as they do on the CSV
+    "source_row": ("source_row.i64", "q", "<i8"),
+}
+MORTON_INDEX_FILE = "morton_index.i64"
+
+# --- 2. HELPERS ---
+def snapshot_folder(csv_file=CSV_FILE):
+    return csv_file + SNAPSHOT_SUFFIX
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_meta(csv_file, meta):
+    # Replaced in one step, so readers never see a partly written meta.json
+    meta_path = os.path.join(snapshot_folder(csv_file), META_FILE)
+    with open(meta_path + '.part', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.part', meta_path)
+
+def read_meta(csv_file=CSV_FILE):
+    """
+    Returns the snapshot metadata, or None if the snapshot is missing or older than the CSV.
+
+    The CSV is only hashed when its size matches but its mtime doesn't (e.g. it was copied
+    or touched); if the content turns out unchanged, the new mtime is recorded.
+    """
+    meta_path = os.path.join(snapshot_folder(csv_file), META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("columns") != list(COLUMNS):
+        return None  # Written by an older version, without every column
+    if not os.path.exists(csv_file):
+        return meta
+    stat = os.stat(csv_file)
+    if stat.st_size != meta.get("source_size"):
+        return None
+    if stat.st_mtime_ns != meta.get("source_mtime_ns"):
+        if file_sha256(csv_file) != meta.get("source_sha256"):
+            return None
+        meta["source_mtime_ns"] = stat.st_mtime_ns
+        try:
+            write_meta(csv_file, meta)
+        except OSError:
+            pass  # Read-only snapshot: still valid, it just gets hashed again next time
+    return meta
+
+# --- 3. WRITING (RUN ONCE BY smooth.py) ---
+def write_snapshot(csv_file=CSV_FILE):
+    """
+    Parses the CSV once and writes it as memory-mappable binary columns.
+
+    Rows are stored in Morton order (a no-op for CSVs written by smooth.py, which are
+    already sorted), with a sparse index of key-prefix offsets, so spatial neighbors
+    are contiguous. Each row keeps its CSV row number in the source_row column.
+    """
+    import numpy as np
+    import pandas as pd
+    from morton import build_sparse_index, morton_key, morton_order
+
+    # Stat first and hash the bytes that are parsed, so a CSV changed meanwhile reads as stale
+    stat = os.stat(csv_file)
+    with open(csv_file, 'rb') as f:
+        data = f.read()
+    df = pd.read_csv(io.BytesIO(data))
+    df.dropna(subset=['latitude', 'longitude', 'k_value'], inplace=True)
+    df = df.iloc[morton_order(df['latitude'].values, df['longitude'].values)]
+    keys = morton_key(df['latitude'].values, df['longitude'].values)
+
+    has_text = df['description'].apply(lambda d: isinstance(d, str)).values
+    descriptions = list(pd.unique(df['description'][has_text]))
+    codes = np.full(len(df), NO_DESCRIPTION_CODE, dtype=np.int32)
+    codes[has_text] = df['description'][has_text].map({d: i for i, d in enumerate(descriptions)}).values
+
+    folder = snapshot_folder(csv_file)
+    os.makedirs(folder, exist_ok=True)
+    # Removed before the columns are rewritten and written again last, so a half-written
+    # snapshot is never paired with a meta.json that looks valid
+    meta_path = os.path.join(folder, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    columns = {"latitude": df['latitude'].values, "longitude": df['longitude'].values,
+               "k_value": df['k_value'].values, "description_code": codes, "morton_key": keys,
+               "source_row": df.index.values}
+    for name, (filename, _, dtype) in COLUMNS.items():
+        np.ascontiguousarray(columns[name], dtype=dtype).tofile(os.path.join(folder, filename))
+    build_sparse_index(keys).astype('<i8').tofile(os.path.join(folder, MORTON_INDEX_FILE))
+
+    meta = {"source_sha256": hashlib.sha256(data).hexdigest(), "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns, "columns": list(COLUMNS), "rows": len(df),
+            "descriptions": descriptions}
+    write_meta(csv_file, meta)
+    return folder
+
+# --- 4. READING ---
+def load_snapshot_arrays(csv_file=CSV_FILE):
+    """
+    Memory-maps the snapshot columns as numpy arrays, in Morton order.
+
+    Returns:
+        tuple: (columns, descriptions), or None if the snapshot is missing or stale.
+    """
+    import numpy as np
+
+    meta = read_meta(csv_file)
+    if meta is None:
+        return None
+    folder = snapshot_folder(csv_file)
+    columns = {name: np.memmap(os.path.join(folder, filename), dtype=dtype, mode='r', shape=(meta["rows"],))
+               if meta["rows"] else np.empty(0, dtype=dtype)
+               for name, (filename, _, dtype) in COLUMNS.items()}
+    return columns, meta["descriptions"]
+
+def load_morton_index(csv_file=CSV_FILE):
+    """
+    Returns (morton_key, sparse_index) for the snapshot rows, or None if it is missing or stale.
+
+    Pass both to the morton.py range helpers to read spatial subsets as contiguous slices.
+    """
+    import numpy as np
+
+    snapshot = load_snapshot_arrays(csv_file)
+    if snapshot is None:
+        return None
+    index = np.fromfile(os.path.join(snapshot_folder(csv_file), MORTON_INDEX_FILE), dtype='<i8')
+    return snapshot[0]["morton_key"], index
+
+def load_snapshot_columns(csv_file=CSV_FILE):
+    """
+    Standard-library version of load_snapshot_arrays: memory-mapped memoryviews, in Morton order.
+
+    Returns:
+        tuple: (columns, descriptions), or None if the snapshot is missing, stale, or
+        this machine is big-endian (the columns are stored little-endian).
+    """
+    meta = read_meta(csv_file)
+    if meta is None or sys.byteorder != "little":
+        return None
+    folder = snapshot_folder(csv_file)
+    columns = {}
+    for name, (filename, fmt, _) in COLUMNS.items():
+        if meta["rows"] == 0:
+            columns[name] = memoryview(b'').cast(fmt)
+            continue
+        with open(os.path.join(folder, filename), 'rb') as f:
+            columns[name] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(fmt)
+    return columns, meta["descriptions"]
+
+def load_dataframe(csv_file=CSV_FILE):
+    """
+    Loads the dataset as a DataFrame from the snapshot, falling back to the CSV.
+
+    Returns:
+        tuple: (df, source) where source is "snapshot" or "csv". Rows with a missing
+        latitude, longitude or k_value are dropped either way, and the rows come back in
+        CSV order with the CSV row numbers as the index, as read_csv gives.
+    """
+    import numpy as np
+    import pandas as pd
+
+    snapshot = load_snapshot_arrays(csv_file)
+    if snapshot is None:
+        df = pd.read_csv(csv_file)
+        df.dropna(subset=['latitude', 'longitude', 'k_value'], inplace=True)
+        return df, "csv"
+
+    columns, descriptions = snapshot
+    source_row = np.asarray(columns["source_row"])
+    order = np.argsort(source_row, kind='stable')
+    # NaN in the last slot so code -1 maps back to a missing description, as read_csv gives
+    table = np.array(descriptions + [np.nan], dtype=object)
+    df = pd.DataFrame({
+        "latitude": np.asarray(columns["latitude"], dtype=np.float64)[order],
+        "longitude": np.asarray(columns["longitude"], dtype=np.float64)[order],
+        "k_value": np.asarray(columns["k_value"], dtype=np.float64)[order],
+        "description": table[np.asarray(columns["description_code"])[order]]
+    }, index=pd.Index(source_row[order]))
+    return df, "snapshot"
+
+# --- 5. COLD-START MEASUREMENT ---
+def main():
+    import pandas as pd
+
+    if not os.path.exists(CSV_FILE):
+        print(f"\nFatal Error: Data file not found at '{CSV_FILE}'.")
+        exit()
+
+    if read_meta(CSV_FILE) is None:
+        print(f"Snapshot missing or stale; writing '{snapshot_folder(CSV_FILE)}'...")
+        write_snapshot(CSV_FILE)
+
+    start = time.perf_counter()
+    df_csv = pd.read_csv(CSV_FILE)
+    df_csv.dropna(subset=['latitude', 'longitude', 'k_value'], inplace=True)
+    csv_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df_snapshot, _ = load_dataframe(CSV_FILE)
+    snapshot_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_snapshot_columns(CSV_FILE)
+    columns_seconds = time.perf_counter() - start
+
+    print(f"--- Cold-start load of {len(df_csv)} rows ---")
+    print(f"  CSV (pandas.read_csv):        {csv_seconds * 1000:.1f} ms")
+    print(f"  Snapshot (DataFrame):         {snapshot_seconds * 1000:.1f} ms")
+    print(f"  Snapshot (memory-mapped only): {columns_seconds * 1000:.1f} ms")
+    print(f"  Snapshot matches CSV: {df_csv.equals(df_snapshot)}")
+
+if __name__ == "__main__":
+    main()
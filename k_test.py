@@ -1,7 +1,11 @@
 import csv
+import functools
 import json
 import math
 from typing import Dict, List, Tuple, Optional
+import time
+from k_snapshot import NO_DESCRIPTION_CODE as SNAPSHOT_NO_DESCRIPTION, load_snapshot_columns
+from query_cache import QuantizedLRUCache, file_version
 
 # Configuration
 CSV_FILE = "global_complete_k_values.csv"
@@ -11,15 +15,39 @@ END_POS = (3085, 1542)
 GRID_SIZE = 1.0  # degrees per cell for spatial hashing
 RADIUS_KM = 20.0
 K_VALUE_SIMILARITY_THRESHOLD = 0.0002
+NO_DESCRIPTION_CODE = -1
+DESCRIPTIONS_KEY = "descriptions"  # Reserved cache key holding the description code table
+
+EARTH_RADIUS_KM = 6371.0
 
 class SpatialHash:
+    """
+    Grid of lat/lon cells. Longitude wraps across the antimeridian and latitude is
+    clamped into the polar rows, so every point and query maps to a real cell.
+    
+    Columns count eastward from -180 degrees; when grid_size does not divide 360, the last
+    column (just west of the antimeridian) is narrower than the others.
+    """
     def __init__(self, grid_size: float):
         self.grid_size = grid_size
         self.hash_map: Dict[Tuple[int, int], List[dict]] = {}
+        self.lon_cells = int(math.ceil(360.0 / grid_size))
+        self.min_y = int(math.floor(-90.0 / grid_size))
+        self.max_y = int(math.ceil(90.0 / grid_size)) - 1
+        # How much narrower the last column is when grid_size does not divide 360
+        self.seam_slack = self.lon_cells * grid_size - 360.0
+        self.brute_force_fallbacks = 0
+    
+    def get_lon_column(self, lon: float) -> int:
+        lon = (lon + 180.0) % 360.0 - 180.0
+        return min(int(math.floor((lon + 180.0) / self.grid_size)), self.lon_cells - 1)
     
     def get_grid_pos(self, lat: float, lon: float) -> Tuple[int, int]:
-        return (int(math.floor(lon / self.grid_size)), 
-                int(math.floor(lat / self.grid_size)))
+        y = int(math.floor(lat / self.grid_size))
+        return self.get_lon_column(lon), min(max(y, self.min_y), self.max_y)
+    
+    def wrap_x(self, x: int) -> int:
+        return x % self.lon_cells
     
     def add_point(self, point: dict):
         if "longitude" not in point or "latitude" not in point:
@@ -32,17 +60,108 @@ class SpatialHash:
         
         self.hash_map[grid_pos].append(point)
     
+    def get_lon_columns(self, cx: int, half_width: int) -> set:
+        """Wrapped columns within half_width cells of cx (every column once it spans the globe)."""
+        if half_width < 0:
+            return set()
+        if 2 * half_width + 1 >= self.lon_cells:
+            return set(range(self.lon_cells))
+        return {self.wrap_x(cx + dx) for dx in range(-half_width, half_width + 1)}
+    
+    def get_ring_cells(self, center_cell: Tuple[int, int], ring: int, lon_scale: int = 1) -> List[Tuple[int, int]]:
+        """
+        Cells added when the search block grows from ring - 1 to ring, wrapped and deduplicated.
+        
+        The block spans ring rows and ring * lon_scale columns each way, so high-latitude
+        searches can widen faster in longitude, where cells are narrow.
+        """
+        cx, cy = center_cell
+        columns = self.get_lon_columns(cx, ring * lon_scale)
+        new_columns = columns - self.get_lon_columns(cx, (ring - 1) * lon_scale)
+        cells = []
+        for dy in range(-ring, ring + 1):
+            y = cy + dy
+            if y < self.min_y or y > self.max_y:
+                continue
+            for x in (columns if abs(dy) == ring else new_columns):
+                cells.append((x, y))
+        return cells
+    
+    def get_lon_scale(self, lat: float) -> int:
+        """Columns per ring step that keep a ring roughly as wide in km as it is tall."""
+        cos_lat = math.cos(math.radians(min(abs(lat), 89.999)))
+        return min(self.lon_cells, max(1, int(round(1.0 / cos_lat))))
+    
     def get_nearby_cells(self, lat: float, lon: float, search_radius: int = 1) -> List[dict]:
         center_cell = self.get_grid_pos(lat, lon)
+        seen = set()
         cells = []
         
-        for dy in range(-search_radius, search_radius + 1):
-            for dx in range(-search_radius, search_radius + 1):
-                check_cell = (center_cell[0] + dx, center_cell[1] + dy)
-                if check_cell in self.hash_map:
+        for ring in range(search_radius + 1):
+            for check_cell in self.get_ring_cells(center_cell, ring):
+                if check_cell in self.hash_map and check_cell not in seen:
+                    seen.add(check_cell)
                     cells.extend(self.hash_map[check_cell])
         
         return cells
+    
+    def get_points_in_radius_cells(self, lat: float, lon: float, radius_km: float) -> List[dict]:
+        """Points in every cell that can hold a point within radius_km (all longitudes near a pole)."""
+        angle = radius_km / EARTH_RADIUS_KM
+        lat_min = lat - math.degrees(angle)
+        lat_max = lat + math.degrees(angle)
+        _, y0 = self.get_grid_pos(lat_min, lon)
+        _, y1 = self.get_grid_pos(lat_max, lon)
+        
+        if lat_min <= -90.0 or lat_max >= 90.0:
+            xs = range(self.lon_cells)
+        else:
+            # Exact longitude half-width of a spherical cap
+            dlon = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(lat)))))
+            if 2 * dlon >= 360.0:
+                xs = range(self.lon_cells)
+            else:
+                # Columns are looked up from real longitudes, split at the antimeridian: with a
+                # narrower last column, counting columns past the seam would land on the wrong ones
+                position = (lon + 180.0) % 360.0
+                x0, x1 = self.get_lon_column(lon - dlon), self.get_lon_column(lon + dlon)
+                if position - dlon >= 0.0 and position + dlon < 360.0:
+                    xs = range(x0, x1 + 1)
+                else:
+                    xs = set(range(x0, self.lon_cells)) | set(range(x1 + 1))
+        
+        points = []
+        for y in range(y0, y1 + 1):
+            for x in xs:
+                points.extend(self.hash_map.get((x, y), ()))
+        return points
+    
+    def unscanned_lower_bound_km(self, lat: float, lon: float, center_cell: Tuple[int, int], ring: int,
+                                 lon_scale: int = 1) -> float:
+        """
+        Provable minimum distance from (lat, lon) to any point outside rings 0..ring.
+        
+        Such a point is either outside the block's latitude band, so at least the latitude
+        gap away, or outside its longitude band, so at least the distance to the nearest
+        uncovered meridian: asin(cos(lat) * sin(dlon)).
+        """
+        cx, cy = center_cell
+        lon = (lon + 180.0) % 360.0 - 180.0
+        bounds = []
+        
+        if cy - ring > self.min_y:
+            bounds.append(math.radians(lat - (cy - ring) * self.grid_size))
+        if cy + ring < self.max_y:
+            bounds.append(math.radians((cy + ring + 1) * self.grid_size - lat))
+        
+        if 2 * ring * lon_scale + 1 < self.lon_cells:
+            # Position within the center column; the narrower last column is what seam_slack covers
+            offset = (lon + 180.0) - math.floor((lon + 180.0) / self.grid_size) * self.grid_size
+            dlon = min(offset, self.grid_size - offset) + ring * lon_scale * self.grid_size - self.seam_slack
+            dlon = math.radians(min(max(dlon, 0.0), 90.0))
+            bounds.append(math.asin(min(1.0, math.cos(math.radians(lat)) * math.sin(dlon))))
+        
+        return EARTH_RADIUS_KM * max(min(bounds), 0.0) if bounds else float('inf')
 
 def haversine_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
     """Calculate distance between two points in km"""
@@ -61,55 +180,77 @@ def haversine_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> fl
     return R * c
 
 def load_data(filename: str) -> Tuple[List[dict], SpatialHash]:
-    """Load CSV data and build spatial hash"""
+    """Load data (binary snapshot if up to date, else CSV) and build spatial hash"""
     print(f"Loading data from {filename}...")
+    load_start = time.perf_counter()
     
     data = []
     spatial_hash = SpatialHash(GRID_SIZE)
     
-    with open(filename, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
-            # Convert numeric fields
-            entry = {}
-            for key, val in row.items():
-                if key in ["latitude", "longitude", "k_value"]:
-                    entry[key] = float(val)
-                else:
-                    entry[key] = val
-            
+    snapshot = load_snapshot_columns(filename)
+    if snapshot is not None:
+        columns, descriptions = snapshot
+        # The snapshot is in Morton order; added in CSV order so nearest-point ties resolve as on the CSV
+        source_row = columns["source_row"]
+        for i in sorted(range(len(source_row)), key=source_row.__getitem__):
+            code = columns["description_code"][i]
+            # Missing descriptions come back as "" to match csv.DictReader
+            entry = {
+                "latitude": columns["latitude"][i],
+                "longitude": columns["longitude"][i],
+                "k_value": columns["k_value"][i],
+                "description": descriptions[code] if code != SNAPSHOT_NO_DESCRIPTION else ""
+            }
             data.append(entry)
             spatial_hash.add_point(entry)
-    
-    print(f"Loaded {len(data)} points")
+    else:
+        with open(filename, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            
+            for row in reader:
+                # Convert numeric fields
+                entry = {}
+                for key, val in row.items():
+                    if key in ["latitude", "longitude", "k_value"]:
+                        entry[key] = float(val)
+                    else:
+                        entry[key] = val
+                
+                data.append(entry)
+                spatial_hash.add_point(entry)
+    
+    source = "snapshot" if snapshot is not None else "CSV"
+    print(f"Loaded {len(data)} points from {source} in {time.perf_counter() - load_start:.3f}s")
     print(f"Built spatial hash with {len(spatial_hash.hash_map)} cells")
     
     return data, spatial_hash
 
 def find_nearest_point(lat: float, lon: float, data: List[dict], 
                        spatial_hash: SpatialHash) -> Optional[dict]:
-    """Find nearest point using spatial hash"""
-    search_radius = 1
-    max_search_radius = 5
+    """Find nearest point by expanding the spatial hash search ring by ring"""
+    center_cell = spatial_hash.get_grid_pos(lat, lon)
+    lon_scale = spatial_hash.get_lon_scale(lat)
+    max_ring = max(spatial_hash.lon_cells, spatial_hash.max_y - spatial_hash.min_y + 1)
     
     nearest_point = None
     min_dist = float('inf')
     
-    while nearest_point is None and search_radius <= max_search_radius:
-        candidates = spatial_hash.get_nearby_cells(lat, lon, search_radius)
+    for ring in range(max_ring + 1):
+        # Each ring only holds cells not scanned before, so no point is checked twice
+        for cell in spatial_hash.get_ring_cells(center_cell, ring, lon_scale):
+            for point in spatial_hash.hash_map.get(cell, ()):
+                dist = haversine_distance(lon, lat, point["longitude"], point["latitude"])
+                if dist < min_dist:
+                    min_dist = dist
+                    nearest_point = point
         
-        for point in candidates:
-            dist = haversine_distance(lon, lat, point["longitude"], point["latitude"])
-            if dist < min_dist:
-                min_dist = dist
-                nearest_point = point
-        
-        if nearest_point is None:
-            search_radius += 1
+        # Stop once nothing outside the scanned block can be closer
+        if min_dist <= spatial_hash.unscanned_lower_bound_km(lat, lon, center_cell, ring, lon_scale):
+            break
     
-    # Fallback to full search if needed
+    # Fallback to full search; unreachable unless points are missing from the hash
     if nearest_point is None:
+        spatial_hash.brute_force_fallbacks += 1
         for point in data:
             if "longitude" not in point or "latitude" not in point:
                 continue
@@ -120,22 +261,20 @@ def find_nearest_point(lat: float, lon: float, data: List[dict],
     
     return nearest_point
 
-def find_k_and_description(lat: float, lon: float, data: List[dict], 
-                           spatial_hash: SpatialHash) -> Tuple[Optional[dict], Optional[str]]:
-    """Find k-value and relevant description for a lat/lon"""
+def find_k_description_and_similarity(lat: float, lon: float, data: List[dict],
+                                      spatial_hash: SpatialHash) -> Tuple[Optional[dict], Optional[str], bool]:
+    """Find k-value, relevant description and whether a similar detailed point supplied it"""
     
     nearest_point = find_nearest_point(lat, lon, data, spatial_hash)
     
     if nearest_point is None:
-        return None, None
+        return None, None, False
     
     final_description = nearest_point.get("description", None)
+    similar = False
     
     # Find nearby detailed points
-    radius_in_degrees = RADIUS_KM / 111.0
-    search_cells_radius = int(math.ceil(radius_in_degrees / GRID_SIZE)) + 1
-    
-    candidates = spatial_hash.get_nearby_cells(lat, lon, search_cells_radius)
+    candidates = spatial_hash.get_points_in_radius_cells(lat, lon, RADIUS_KM)
     
     nearby_points = []
     for point in candidates:
@@ -156,16 +295,39 @@ def find_k_and_description(lat: float, lon: float, data: List[dict],
         
         if abs(k_main - k_detail) <= K_VALUE_SIMILARITY_THRESHOLD:
             final_description = closest_detailed["description"]
+            similar = True
         else:
             final_description = f"Nearest detailed point geologically different (k={k_detail:.5f})"
     
     if final_description == "Interpolated":
         final_description = None
     
+    return nearest_point, final_description, similar
+
+def find_k_and_description(lat: float, lon: float, data: List[dict], 
+                           spatial_hash: SpatialHash) -> Tuple[Optional[dict], Optional[str]]:
+    """Find k-value and relevant description for a lat/lon"""
+    nearest_point, final_description, _ = find_k_description_and_similarity(lat, lon, data, spatial_hash)
     return nearest_point, final_description
 
-def precompute_tile_k_values(data: List[dict], spatial_hash: SpatialHash) -> dict:
-    """Precompute k-values for all tiles"""
+# Repeated point queries are answered from a quantized LRU cache; the data list and
+# spatial hash are part of the key by identity and size, so a new dataset never hits,
+# and a batch that finds the data file changed on disk clears the cache.
+query_cache = QuantizedLRUCache(version=functools.partial(file_version, CSV_FILE))
+find_k_and_description = query_cache.wrap(find_k_and_description)
+
+def encode_description(description: Optional[str], description_codes: Dict[str, int]) -> int:
+    """Return the table index for a description, adding it if new (-1 for no description)"""
+    if description is None:
+        return NO_DESCRIPTION_CODE
+    
+    if description not in description_codes:
+        description_codes[description] = len(description_codes)
+    
+    return description_codes[description]
+
+def precompute_tile_k_values(data: List[dict], spatial_hash: SpatialHash) -> Tuple[dict, List[str]]:
+    """Precompute k-values, description codes and similarity flags for all tiles"""
     
     tile_grid_size = (
         math.ceil(END_POS[0] / TILE_SIZE[0]),
@@ -175,6 +337,7 @@ def precompute_tile_k_values(data: List[dict], spatial_hash: SpatialHash) -> dic
     print(f"Precomputing k-values for {tile_grid_size[0]} x {tile_grid_size[1]} = {tile_grid_size[0] * tile_grid_size[1]} tiles...")
     
     tile_k_values = {}
+    description_codes: Dict[str, int] = {}
     total_tiles = tile_grid_size[0] * tile_grid_size[1]
     
     for tile_y in range(tile_grid_size[1]):
@@ -188,12 +351,15 @@ def precompute_tile_k_values(data: List[dict], spatial_hash: SpatialHash) -> dic
             lon = 180.0 * 2.0 * (pixel_x / END_POS[0] - 0.5)
             
             # Find k-value and description
-            nearest_point, description = find_k_and_description(lat, lon, data, spatial_hash)
+            nearest_point, description, similar = find_k_description_and_similarity(
+                lat, lon, data, spatial_hash)
             
-            # Store with string key for JSON (only k_value to save space)
+            # Store with string key for JSON; descriptions are stored as codes into a shared table
             key = f"{tile_x},{tile_y}"
             tile_k_values[key] = {
-                "k_value": nearest_point["k_value"] if nearest_point else 0.0
+                "k_value": nearest_point["k_value"] if nearest_point else 0.0,
+                "description_code": encode_description(description, description_codes),
+                "similar": similar
             }
         
         # Progress indicator
@@ -202,7 +368,9 @@ def precompute_tile_k_values(data: List[dict], spatial_hash: SpatialHash) -> dic
             print(f"Progress: {progress:.1f}% ({tile_y}/{tile_grid_size[1]} rows)")
     
     print("Precomputation complete!")
-    return tile_k_values
+    print(f"Brute-force nearest searches: {spatial_hash.brute_force_fallbacks}")
+    print(f"Encoded {len(description_codes)} distinct descriptions")
+    return tile_k_values, list(description_codes)
 
 def main():
     print("=== Tile K-Value Cache Generator ===")
@@ -217,12 +385,12 @@ def main():
     data, spatial_hash = load_data(CSV_FILE)
     
     # Precompute tiles
-    tile_k_values = precompute_tile_k_values(data, spatial_hash)
+    tile_k_values, descriptions = precompute_tile_k_values(data, spatial_hash)
     
-    # Save to JSON
+    # Save to JSON (description table stored under a reserved key next to the tiles)
     print(f"Saving to {OUTPUT_FILE}...")
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(tile_k_values, f)
+        json.dump({**tile_k_values, DESCRIPTIONS_KEY: descriptions}, f)
     
     print(f"Successfully saved {len(tile_k_values)} tiles to {OUTPUT_FILE}")
     
@@ -1,9 +1,10 @@
-import pandas as pd
 import numpy as np
 import json
 import math
 import os
-from scipy.spatial import KDTree
+import time
+from k_snapshot import load_dataframe
+from kd_index import load_or_build_kdtree
 from tqdm import tqdm
 
 # --- 1. CONFIGURATION ---
@@ -13,6 +14,8 @@ TILE_SIZE = (3, 3)
 END_POS = (3085, 1542)
 RADIUS_KM = 20.0
 K_VALUE_SIMILARITY_THRESHOLD = 2e-4
+NO_DESCRIPTION_CODE = -1
+DESCRIPTIONS_KEY = "descriptions"  # Reserved cache key holding the description code table
 
 # --- 2. HELPER FUNCTIONS ---
 def latlon_to_xyz(lat, lon):
@@ -40,16 +43,21 @@ if not os.path.exists(CSV_FILE):
     print(f"\nFatal Error: Data file not found at '{CSV_FILE}'.")
     exit()
 
-df = pd.read_csv(CSV_FILE)
-df.dropna(subset=['latitude', 'longitude', 'k_value'], inplace=True)
+load_start = time.perf_counter()
+df, data_source = load_dataframe(CSV_FILE)
+print(f"Loaded {len(df)} rows from {data_source} in {time.perf_counter() - load_start:.3f}s.")
 
-# Convert lat/lon to XYZ for the KDTree
-xyz = np.array(latlon_to_xyz(df['latitude'], df['longitude'])).T
-tree = KDTree(xyz)
+# Convert lat/lon to XYZ for the KDTree, or load the tree persisted for this exact data
+index_start = time.perf_counter()
+tree, tree_source = load_or_build_kdtree(df, CSV_FILE)
+print(f"KD-tree {'loaded from cache' if tree_source == 'cache' else 'built'} in {time.perf_counter() - index_start:.3f}s.")
 print(f"✅ Data loaded and indexed. Ready to query {len(df)} points.")
 
 # --- 4. FAST QUERY FUNCTION ---
-def find_k_and_relevant_description(lat, lon):
+def find_k_description_and_similarity(lat, lon):
+    """Like find_k_and_relevant_description, but also reports whether the
+    description came from a geologically similar detailed point."""
+    similar = False
     try:
         # Convert query point to XYZ and find the nearest neighbor in the tree
         query_xyz = latlon_to_xyz(lat, lon)
@@ -77,15 +85,28 @@ def find_k_and_relevant_description(lat, lon):
 
                 if abs(k_value_main - k_value_detailed) <= K_VALUE_SIMILARITY_THRESHOLD:
                     final_description = closest_detailed_point['description']
+                    similar = True
                 else:
                     final_description = f"Nearest detailed point is geologically different (k-value: {k_value_detailed:.5f})"
 
         if final_description == 'Interpolated':
             final_description = None
-        return nearest_point_for_k, final_description
+        return nearest_point_for_k, final_description, similar
 
     except Exception as e:
-        return None, "Error during search."
+        return None, "Error during search.", False
+
+def find_k_and_relevant_description(lat, lon):
+    nearest_point_for_k, final_description, _ = find_k_description_and_similarity(lat, lon)
+    return nearest_point_for_k, final_description
+
+def encode_description(description, description_codes):
+    """Return the table index for a description, adding it if new (-1 for no description)."""
+    if not isinstance(description, str):  # None, or NaN from a missing CSV field
+        return NO_DESCRIPTION_CODE
+    if description not in description_codes:
+        description_codes[description] = len(description_codes)
+    return description_codes[description]
 
 # --- 5. PRECOMPUTATION FUNCTION WITH PROGRESS BAR ---
 def precompute_tile_k_values():
@@ -94,6 +115,7 @@ def precompute_tile_k_values():
     print(f"\nPrecomputing k-values for {total_tiles} tiles...")
     
     tile_k_values = {}
+    description_codes = {}
     
     # Create a single loop and wrap it with tqdm for a continuous progress bar
     for i in tqdm(range(total_tiles), desc="Processing Tiles"):
@@ -106,23 +128,26 @@ def precompute_tile_k_values():
         lat = 90.0 * 2.0 * (pixel_y / END_POS[1] - 0.5)
         lon = 180.0 * 2.0 * (pixel_x / END_POS[0] - 0.5)
         
-        nearest_point, description = find_k_and_relevant_description(lat, lon)
+        nearest_point, description, similar = find_k_description_and_similarity(lat, lon)
         
+        # Descriptions are stored as codes into a shared table, aligned with k_value
         key = f"{tile_x},{tile_y}"
         tile_k_values[key] = {
-            "k_value": nearest_point["k_value"] if nearest_point is not None else 0.0
+            "k_value": nearest_point["k_value"] if nearest_point is not None else 0.0,
+            "description_code": encode_description(description, description_codes),
+            "similar": similar
         }
             
-    print("Precomputation complete!")
-    return tile_k_values
+    print(f"Precomputation complete! Encoded {len(description_codes)} distinct descriptions.")
+    return tile_k_values, list(description_codes)
 
 # --- 6. MAIN EXECUTION ---
 def main():
-    tile_k_values = precompute_tile_k_values()
+    tile_k_values, descriptions = precompute_tile_k_values()
     
     print(f"\nSaving to {OUTPUT_FILE}...")
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(tile_k_values, f)
+        json.dump({**tile_k_values, DESCRIPTIONS_KEY: descriptions}, f)
     
     print(f"Successfully saved {len(tile_k_values)} tiles.")
 
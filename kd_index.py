@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import numpy as np
+import scipy
+from scipy.spatial import KDTree
+
+# --- 1. CONFIGURATION ---
+CSV_FILE = "global_complete_k_values.csv"
+INDEX_SUFFIX = ".kdtree"
+META_FILE = "meta.json"
+# KDTree pickle state that is stored as arrays (one .npy file each); the scalars go into meta.json
+TREE_ARRAYS = {"tree_buffer": 0, "xyz": 1, "tree_maxes": 5, "tree_mins": 6, "tree_indices": 7}
+TREE_SCALARS = {"n": 2, "m": 3, "leafsize": 4}
+
+# --- 2. HELPERS ---
+def latlon_to_xyz(lat, lon):
+    """Convert latitude and longitude arrays to an (N, 3) array of 3D Cartesian coordinates."""
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.column_stack([np.cos(lat_rad) * np.cos(lon_rad), np.cos(lat_rad) * np.sin(lon_rad), np.sin(lat_rad)])
+
+def index_folder(csv_file=CSV_FILE):
+    return csv_file + INDEX_SUFFIX
+
+def coordinates_sha256(df):
+    """Hash of the coordinates in row order; tree indices are only valid for this exact order."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(df['latitude'].values, dtype='<f8').tobytes())
+    digest.update(np.ascontiguousarray(df['longitude'].values, dtype='<f8').tobytes())
+    return digest.hexdigest()
+
+# --- 3. TREE STATE ---
+def tree_state(tree):
+    """The tree's internal state split into (arrays, scalars), for storing without pickle."""
+    state = tree.__getstate__()
+    arrays = {name: np.asarray(state[i]) for name, i in TREE_ARRAYS.items()}
+    scalars = {name: int(state[i]) for name, i in TREE_SCALARS.items()}
+    return arrays, scalars
+
+def tree_from_state(arrays, scalars):
+    """
+    Rebuilds a tree around stored arrays (e.g. memory-mapped) without re-running the build.
+    The data, bounds and index order are used in place; scipy only copies its node buffer.
+    """
+    state = [None] * 10
+    for name, i in TREE_ARRAYS.items():
+        state[i] = arrays[name]
+    for name, i in TREE_SCALARS.items():
+        state[i] = scalars[name]
+    tree = KDTree.__new__(KDTree)
+    tree.__setstate__(tuple(state))
+    return tree
+
+# --- 4. PERSISTED INDEX ---
+def save_kdtree(tree, content_hash, csv_file=CSV_FILE):
+    folder = index_folder(csv_file)
+    os.makedirs(folder, exist_ok=True)
+    # Removed first and written last, so arrays that are half-written (or from a different
+    # dataset) are never paired with a meta.json that looks valid
+    meta_path = os.path.join(folder, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    arrays, scalars = tree_state(tree)
+    for name, array in arrays.items():
+        np.save(os.path.join(folder, name + ".npy"), array, allow_pickle=False)
+    meta = {"content_sha256": content_hash, "rows": int(tree.n), "tree": scalars, "scipy_version": scipy.__version__}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+def load_kdtree(content_hash, csv_file=CSV_FILE):
+    """Returns the persisted tree if it was built from data with this hash, else None."""
+    folder = index_folder(csv_file)
+    meta_path = os.path.join(folder, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("content_sha256") != content_hash or meta.get("scipy_version") != scipy.__version__:
+        return None
+    try:
+        arrays = {name: np.load(os.path.join(folder, name + ".npy"), mmap_mode='r', allow_pickle=False)
+                  for name in TREE_ARRAYS}
+        return tree_from_state(arrays, meta["tree"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def load_or_build_kdtree(df, csv_file=CSV_FILE):
+    """
+    Returns (tree, source) for the dataset's xyz coordinates, where source is "cache" or "built".
+
+    The tree's arrays (xyz data, index order, bounds and nodes) are stored as .npy files
+    next to the dataset and memory-mapped on load, so every process shares the same pages
+    and nothing is unpickled; only scipy's node buffer is copied when the tree is rebuilt.
+    """
+    content_hash = coordinates_sha256(df)
+    tree = load_kdtree(content_hash, csv_file)
+    if tree is not None:
+        return tree, "cache"
+
+    tree = KDTree(latlon_to_xyz(df['latitude'].values, df['longitude'].values))
+    try:
+        save_kdtree(tree, content_hash, csv_file)
+    except OSError as e:
+        print(f"Warning: Could not persist the KD-tree index. Error: {e}")
+    return tree, "built"
@@ -0,0 +1,139 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+LITH_FILES = 'liths/lith_*.json'
+LITH_DEFS_FILE = 'lith_defs.json'
+STORE_FOLDER = 'liths.store'
+META_FILE = 'meta.json'
+# Column name -> (file name, numpy dtype); one row per Macrostrat column location
+COLUMNS = {
+    "lith_id": ("lith_id.i32", "<i4"),
+    "lat": ("lat.f64", "<f8"),
+    "lng": ("lng.f64", "<f8"),
+}
+
+# --- 2. HELPERS ---
+def lith_id_of(path):
+    """The lithology ID in a file name (e.g. 1 for 'liths/lith_1.json')."""
+    return int(re.fullmatch(r'lith_(\d+)\.json', os.path.basename(path)).group(1))
+
+def source_files():
+    """The lith files in lith_id order, followed by the definitions file."""
+    return sorted(glob.glob(LITH_FILES), key=lith_id_of) + [LITH_DEFS_FILE]
+
+def sources_sha256(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(path.encode('utf-8') + b'\0' + hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+# --- 3. WRITING (ONCE PER CHANGE TO liths/ OR lith_defs.json) ---
+def build_store():
+    """
+    Parses every lith file and lith_defs.json once and writes them as one store: the
+    locations as binary columns (lith_id, lat, lng) in lith_id order, and the definitions,
+    sorted by lith_id, in the metadata. Locations without a lat or lng are left out, as
+    are files that can't be parsed (with a warning, as find_k.py always did).
+    """
+    with open(LITH_DEFS_FILE, 'r') as f:
+        lith_defs = sorted(json.load(f)['success']['data'], key=lambda item: item['lith_id'])
+
+    paths = source_files()
+    lith_ids, lats, lngs = [], [], []
+    for filepath in paths[:-1]:
+        try:
+            with open(filepath, 'r') as f:
+                location_data = json.load(f)['success']['data']
+            points = [(location.get('lat'), location.get('lng')) for location in location_data]
+            points = [(float(lat), float(lng)) for lat, lng in points if lat is not None and lng is not None]
+        except (ValueError, KeyError, IndexError, TypeError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not process file {filepath}. Error: {e}")
+            continue
+        lith_ids.extend([lith_id_of(filepath)] * len(points))
+        lats.extend(lat for lat, _ in points)
+        lngs.extend(lng for _, lng in points)
+
+    os.makedirs(STORE_FOLDER, exist_ok=True)
+    # Removed before the columns are rewritten and written again last, so a half-written
+    # store is never paired with a meta.json that looks valid
+    meta_path = os.path.join(STORE_FOLDER, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    columns = {"lith_id": lith_ids, "lat": lats, "lng": lngs}
+    for name, (filename, dtype) in COLUMNS.items():
+        np.asarray(columns[name], dtype=dtype).tofile(os.path.join(STORE_FOLDER, filename))
+
+    meta = {"source_sha256": sources_sha256(paths), "rows": len(lith_ids), "lith_defs": lith_defs}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return STORE_FOLDER
+
+# --- 4. READING ---
+def load_store():
+    """
+    Reads the store's columns and definitions.
+
+    Returns:
+        tuple: (columns, lith_defs), or None if the store is missing or older than its sources.
+    """
+    meta_path = os.path.join(STORE_FOLDER, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("source_sha256") != sources_sha256(source_files()):
+        return None
+    columns = {name: np.fromfile(os.path.join(STORE_FOLDER, filename), dtype=dtype)
+               for name, (filename, dtype) in COLUMNS.items()}
+    return columns, meta["lith_defs"]
+
+def load_or_build_store():
+    """Returns (columns, lith_defs, source) where source is "store" or "built"."""
+    store = load_store()
+    if store is not None:
+        return store[0], store[1], "store"
+    build_store()
+    columns, lith_defs = load_store()
+    return columns, lith_defs, "built"
+
+def lith_defs_index(lith_defs):
+    """Dense lith_id -> row array for the definitions table; -1 where an ID has no definition."""
+    ids = np.array([item['lith_id'] for item in lith_defs], dtype=np.int64)
+    index = np.full((ids.max() + 1) if len(ids) else 1, -1, dtype=np.int64)
+    index[ids] = np.arange(len(ids))
+    return index
+
+def lookup_rows(index, lith_ids):
+    """Definition row for each lith_id (-1 if it has none), for IDs of any range."""
+    lith_ids = np.asarray(lith_ids, dtype=np.int64)
+    in_range = (lith_ids >= 0) & (lith_ids < len(index))
+    return np.where(in_range, index[np.where(in_range, lith_ids, 0)], -1)
+
+# --- 5. COLD-START MEASUREMENT ---
+def main():
+    if not os.path.exists(LITH_DEFS_FILE):
+        print(f"\nFatal Error: '{LITH_DEFS_FILE}' not found.")
+        exit()
+
+    start = time.perf_counter()
+    build_store()
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns, lith_defs = load_store()
+    load_seconds = time.perf_counter() - start
+
+    print(f"--- Lithology store for {len(columns['lith_id'])} locations and {len(lith_defs)} definitions ---")
+    print(f"  Build (parse every JSON file): {build_seconds * 1000:.1f} ms")
+    print(f"  Load (hash sources + read):    {load_seconds * 1000:.1f} ms")
+    print(f"✅ Store saved to '{STORE_FOLDER}'.")
+
+if __name__ == "__main__":
+    main()
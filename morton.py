@@ -0,0 +1,119 @@
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+BITS_PER_AXIS = 16  # Keys interleave 16-bit lon/lat cells (~0.0055 x 0.0027 degrees) into a uint32
+INDEX_PREFIX_BITS = 6  # Sparse index: one row offset per 64 x 64 top-level cell
+MAX_RANGE_CELLS = 1024  # Upper bound on cells a bbox is decomposed into
+EARTH_RADIUS_KM = 6371.0
+
+# --- 2. KEYS ---
+def _part1by1(x):
+    """Spreads the low 16 bits of x so there is a zero bit between each."""
+    x = np.asarray(x, dtype=np.uint32) & 0x0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+    return x
+
+def _interleave(cell_x, cell_y):
+    return _part1by1(cell_x) | (_part1by1(cell_y) << np.uint32(1))
+
+def _cells(lat, lon, bits):
+    """Quantizes lat/lon to integer cells on a 2^bits x 2^bits grid (clamped to the grid)."""
+    size = 1 << bits
+    cell_x = np.floor((np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * size)
+    cell_y = np.floor((np.asarray(lat, dtype=np.float64) + 90.0) / 180.0 * size)
+    return (np.clip(cell_x, 0, size - 1).astype(np.uint32),
+            np.clip(cell_y, 0, size - 1).astype(np.uint32))
+
+def morton_key(lat, lon):
+    """Morton (Z-order) key for lat/lon (scalars or arrays); nearby points get nearby keys."""
+    return _interleave(*_cells(lat, lon, BITS_PER_AXIS))
+
+def morton_order(lat, lon):
+    """Stable row order that sorts a dataset by Morton key."""
+    return np.argsort(morton_key(lat, lon), kind='stable')
+
+# --- 3. SPARSE INDEX ---
+def build_sparse_index(keys, prefix_bits=INDEX_PREFIX_BITS):
+    """
+    Row offsets for every top-level key prefix of a key-sorted column.
+
+    index[p] is the first row whose key prefix is >= p, so rows with prefix p are
+    index[p]:index[p + 1]. Finer lookups only binary-search inside that slice.
+    """
+    shift = 2 * (BITS_PER_AXIS - prefix_bits)
+    prefixes = np.arange((1 << (2 * prefix_bits)) + 1, dtype=np.uint64) << np.uint64(shift)
+    return np.searchsorted(np.asarray(keys, dtype=np.uint64), prefixes, side='left').astype(np.int64)
+
+def key_range_to_slice(keys, index, key_lo, key_hi, prefix_bits=INDEX_PREFIX_BITS):
+    """Rows [start, stop) of a key-sorted column with key_lo <= key < key_hi."""
+    shift = 2 * (BITS_PER_AXIS - prefix_bits)
+    lo_prefix, hi_prefix = key_lo >> shift, (key_hi - 1) >> shift
+    lo_base, lo_end = index[lo_prefix], index[lo_prefix + 1]
+    hi_base, hi_end = index[hi_prefix], index[hi_prefix + 1]
+    start = lo_base + np.searchsorted(keys[lo_base:lo_end], key_lo, side='left')
+    stop = hi_base + np.searchsorted(keys[hi_base:hi_end], key_hi, side='left')
+    return int(start), int(stop)
+
+# --- 4. RANGE DECOMPOSITION ---
+def _bbox_parts(lat_min, lon_min, lat_max, lon_max):
+    """Splits a bbox crossing the antimeridian (lon_min > lon_max) into two."""
+    if lon_min <= lon_max:
+        return [(lat_min, lon_min, lat_max, lon_max)]
+    return [(lat_min, lon_min, lat_max, 180.0), (lat_min, -180.0, lat_max, lon_max)]
+
+def bbox_key_ranges(lat_min, lon_min, lat_max, lon_max, max_cells=MAX_RANGE_CELLS):
+    """
+    Covers a lat/lon box with merged [key_lo, key_hi) Morton ranges.
+
+    Uses the finest cell level whose cover stays under max_cells, so the ranges may
+    include some rows just outside the box; callers filter those precisely.
+    """
+    ranges = []
+    for part in _bbox_parts(lat_min, lon_min, lat_max, lon_max):
+        for bits in range(BITS_PER_AXIS, -1, -1):
+            x0, y0 = _cells(part[0], part[1], bits)
+            x1, y1 = _cells(part[2], part[3], bits)
+            if (int(x1) - int(x0) + 1) * (int(y1) - int(y0) + 1) <= max_cells:
+                break
+        grid_x, grid_y = np.meshgrid(np.arange(x0, x1 + 1, dtype=np.uint32), np.arange(y0, y1 + 1, dtype=np.uint32))
+        shift = 2 * (BITS_PER_AXIS - bits)
+        prefixes = np.sort(_interleave(grid_x.ravel(), grid_y.ravel()).astype(np.int64))
+        ranges.extend(zip((prefixes << shift).tolist(), ((prefixes + 1) << shift).tolist()))
+
+    merged = []
+    for key_lo, key_hi in sorted(ranges):
+        if merged and key_lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], key_hi)
+        else:
+            merged.append([key_lo, key_hi])
+    return [tuple(r) for r in merged]
+
+def bbox_row_slices(keys, index, lat_min, lon_min, lat_max, lon_max):
+    """Contiguous (start, stop) row slices of a Morton-sorted dataset that cover a lat/lon box."""
+    slices = []
+    for key_lo, key_hi in bbox_key_ranges(lat_min, lon_min, lat_max, lon_max):
+        start, stop = key_range_to_slice(keys, index, key_lo, key_hi)
+        if stop > start:
+            slices.append((start, stop))
+    return slices
+
+def radius_bbox(lat, lon, radius_km):
+    """Exact lat/lon box enclosing a great-circle radius (all longitudes if it contains a pole)."""
+    angle = radius_km / EARTH_RADIUS_KM
+    lat_min, lat_max = lat - np.degrees(angle), lat + np.degrees(angle)
+    if lat_min <= -90.0 or lat_max >= 90.0 or angle >= np.pi / 2:
+        return max(lat_min, -90.0), -180.0, min(lat_max, 90.0), 180.0
+    dlon = np.degrees(np.arcsin(np.sin(angle) / np.cos(np.radians(lat))))
+    lon_min = (lon - dlon + 180.0) % 360.0 - 180.0
+    lon_max = (lon + dlon + 180.0) % 360.0 - 180.0
+    return lat_min, lon_min, lat_max, lon_max
+
+def candidate_rows(keys, index, lat, lon, radius_km):
+    """Row indices of every point that can be within radius_km, gathered from contiguous slices."""
+    slices = bbox_row_slices(keys, index, *radius_bbox(lat, lon, radius_km))
+    if not slices:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(start, stop) for start, stop in slices])
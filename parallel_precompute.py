@@ -0,0 +1,193 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import time
+from multiprocessing import Pool, shared_memory
+from scipy.spatial import KDTree
+from tile_grid import NO_DESCRIPTION_CODE, TILE_SIZE, tile_grid_shape, tile_centers, tile_grid_to_cache
+
+# --- 1. CONFIGURATION (Must match k_test2.py) ---
+CSV_FILE = "global_complete_k_values.csv"
+OUTPUT_FILE = "tile_k_values_cache.json"
+RADIUS_KM = 20.0
+K_VALUE_SIMILARITY_THRESHOLD = 2e-4
+NEIGHBORS = 50  # Candidates gathered per tile before the radius filter, as in k_test2.py
+BAND_ROWS = 8  # Tile rows per work item
+WORKERS = os.cpu_count() or 1
+
+# --- 2. HELPER FUNCTIONS ---
+def latlon_to_xyz(lat, lon):
+    """Convert latitude and longitude to an (N, 3) array of 3D Cartesian coordinates."""
+    lat_rad = np.radians(lat)
+    lon_rad = np.radians(lon)
+    return np.column_stack([np.cos(lat_rad) * np.cos(lon_rad), np.cos(lat_rad) * np.sin(lon_rad), np.sin(lat_rad)])
+
+def haversine_distance(lon1, lat1, lon2, lat2):
+    """Calculate the great-circle distance in kilometers."""
+    R = 6371
+    lon1, lat1, lon2, lat2 = map(np.radians, [lon1, lat1, lon2, lat2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat/2.0)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2.0)**2
+    return R * 2 * np.arcsin(np.sqrt(a))
+
+def create_shared_array(array):
+    """Copies an array into a new shared memory block; returns the block and a picklable spec."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+def attach_shared_array(spec):
+    """Attaches to a shared block by spec without copying; keep the block alive while using the view."""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+# --- 3. DATASET ENCODING (RUNS ONCE, IN THE PARENT) ---
+def encode_dataset(df):
+    """
+    Turns the dataset into flat arrays the workers can share.
+
+    Descriptions become codes into one table, so workers never touch strings. The
+    "geologically different" message only depends on the detailed point's k-value,
+    so its code is precomputed per row as well.
+    """
+    descriptions = df['description']
+    is_detailed = (descriptions != 'Interpolated').values
+    has_text = descriptions.apply(lambda d: isinstance(d, str)).values & is_detailed
+
+    table = list(pd.unique(descriptions[has_text]))
+    codes = {d: i for i, d in enumerate(table)}
+    description_code = np.full(len(df), NO_DESCRIPTION_CODE, dtype=np.int32)
+    description_code[has_text] = descriptions[has_text].map(codes).values
+
+    different_code = np.full(len(df), NO_DESCRIPTION_CODE, dtype=np.int32)
+    for k_value in np.unique(df['k_value'].values[is_detailed]):
+        message = f"Nearest detailed point is geologically different (k-value: {k_value:.5f})"
+        if message not in codes:
+            codes[message] = len(table)
+            table.append(message)
+        different_code[is_detailed & (df['k_value'].values == k_value)] = codes[message]
+
+    arrays = {
+        "xyz": latlon_to_xyz(df['latitude'].values, df['longitude'].values),
+        "latitude": df['latitude'].values.astype(np.float64),
+        "longitude": df['longitude'].values.astype(np.float64),
+        "k_value": df['k_value'].values.astype(np.float64),
+        "is_detailed": is_detailed,
+        "description_code": description_code,
+        "different_code": different_code
+    }
+    return arrays, table
+
+def lookup_points(tree, arrays, lat, lon):
+    """
+    Vectorized k_test2 lookup for many points against an encode_dataset result.
+
+    Returns:
+        tuple: (nearest row, description code, similar) arrays, one entry per point.
+    """
+    k_value = arrays["k_value"]
+    xyz = latlon_to_xyz(lat, lon)
+    # The nearest point comes from its own k=1 query, as in k_test2.py: on equidistant
+    # points (e.g. near the poles) it can differ from the first of the k=50 candidates
+    _, nearest = tree.query(xyz, k=1)
+    _, neighbors = tree.query(xyz, k=min(NEIGHBORS, len(k_value)))
+    neighbors = neighbors.reshape(len(lat), -1)
+
+    distances = haversine_distance(lon[:, None], lat[:, None],
+                                   arrays["longitude"][neighbors], arrays["latitude"][neighbors])
+    detailed = (distances <= RADIUS_KM) & arrays["is_detailed"][neighbors]
+    has_detailed = detailed.any(axis=1)
+    closest = neighbors[np.arange(len(lat)), np.where(detailed, distances, np.inf).argmin(axis=1)]
+
+    similar = has_detailed & (np.abs(k_value[nearest] - k_value[closest]) <= K_VALUE_SIMILARITY_THRESHOLD)
+    code = np.where(similar, arrays["description_code"][closest],
+                    np.where(has_detailed, arrays["different_code"][closest], arrays["description_code"][nearest]))
+    return nearest, code, similar
+
+# --- 4. WORKER ---
+_shared = {}  # Per-worker views onto the shared blocks, set up once by _init_worker
+
+def _init_worker(specs):
+    for key, spec in specs.items():
+        _shared[key] = attach_shared_array(spec)
+    # Built on the shared coordinates without copying them; only the node arrays are per-worker
+    _shared["tree"] = KDTree(_shared["xyz"][1], copy_data=False)
+
+def _array(key):
+    return _shared[key][1]
+
+def _process_band(band):
+    """Computes one band of tile rows and writes the results straight into the shared grids."""
+    y0, y1 = band
+    lat, lon = _array("center_lat")[y0:y1].ravel(), _array("center_lon")[y0:y1].ravel()
+    views = {key: _array(key) for key in _shared if key != "tree"}
+    nearest, code, similar = lookup_points(_shared["tree"], views, lat, lon)
+
+    shape = (y1 - y0, -1)
+    _array("out_k")[y0:y1] = _array("k_value")[nearest].reshape(shape)
+    _array("out_code")[y0:y1] = code.reshape(shape)
+    _array("out_similar")[y0:y1] = similar.reshape(shape)
+    return y1 - y0
+
+# --- 5. PARALLEL PRECOMPUTATION ---
+def precompute_tile_k_values(df, workers=WORKERS):
+    """Splits the tile grid into row bands and processes them in a pool over shared memory."""
+    arrays, descriptions = encode_dataset(df)
+    rows, cols = tile_grid_shape(TILE_SIZE)
+    center_lat, center_lon = tile_centers(TILE_SIZE)
+    arrays.update({
+        "center_lat": center_lat,
+        "center_lon": center_lon,
+        "out_k": np.zeros((rows, cols), dtype=np.float64),
+        "out_code": np.full((rows, cols), NO_DESCRIPTION_CODE, dtype=np.int32),
+        "out_similar": np.zeros((rows, cols), dtype=bool)
+    })
+
+    blocks, specs = {}, {}
+    try:
+        for key, array in arrays.items():
+            blocks[key], specs[key] = create_shared_array(array)
+
+        bands = [(y0, min(y0 + BAND_ROWS, rows)) for y0 in range(0, rows, BAND_ROWS)]
+        print(f"Precomputing {rows * cols} tiles in {len(bands)} bands on {workers} workers...")
+        with Pool(workers, initializer=_init_worker, initargs=(specs,)) as pool:
+            done = 0
+            for n_rows in pool.imap_unordered(_process_band, bands):
+                done += n_rows
+                if done % (BAND_ROWS * 16) == 0 or done == rows:
+                    print(f"Progress: {100.0 * done / rows:.1f}% ({done}/{rows} rows)")
+
+        outputs = [np.ndarray(arrays[key].shape, dtype=arrays[key].dtype, buffer=blocks[key].buf).copy()
+                   for key in ("out_k", "out_code", "out_similar")]
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+
+    return (*outputs, descriptions)
+
+# --- 6. MAIN EXECUTION ---
+def main():
+    print(f"Loading data from '{CSV_FILE}'...")
+    if not os.path.exists(CSV_FILE):
+        print(f"\nFatal Error: Data file not found at '{CSV_FILE}'.")
+        exit()
+
+    df = pd.read_csv(CSV_FILE)
+    df.dropna(subset=['latitude', 'longitude', 'k_value'], inplace=True)
+
+    start = time.time()
+    k_grid, code_grid, similar_grid, descriptions = precompute_tile_k_values(df)
+    print(f"Precomputation complete in {time.time() - start:.1f}s. Encoded {len(descriptions)} distinct descriptions.")
+
+    print(f"\nSaving to {OUTPUT_FILE}...")
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(tile_grid_to_cache(k_grid, code_grid, similar_grid, descriptions), f)
+    print(f"Successfully saved {k_grid.size} tiles.")
+
+if __name__ == "__main__":
+    main()
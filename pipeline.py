@@ -0,0 +1,255 @@
+import argparse
+import ast
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# --- 1. THE STAGE GRAPH ---
+# Each stage runs one script. Inputs and outputs are glob patterns relative to the repo;
+# a stage depends on every stage whose outputs match one of its inputs (plus any listed
+# in "after", whose outputs then count as inputs). The script and the local modules it
+# imports count as inputs too, as does "env": variables the script is run with.
+STAGES = {
+    # Geology polygons -> k-values -> interpolated global dataset -> tile cache
+    "global3": {"script": "global3.py", "inputs": [],
+                "outputs": ["output_checkpoints2/*_geology.fgb"]},
+    "find_k_global": {"script": "find_k_global.py", "inputs": ["output_checkpoints2/*.fgb", "output_checkpoints2/*.geojson"],
+                      "outputs": ["k_value_outputs2/*_geology_k_values.csv"]},
+    "ice_water_k": {"script": "ice_water_k.py", "inputs": ["countries/ne_110m_admin_0_countries.*"],
+                    "outputs": ["k_value_outputs2/Greenland_k_values.csv", "k_value_outputs2/Iceland_k_values.csv",
+                                "k_value_outputs2/Antarctica_k_values.csv", "k_value_outputs2/Oceans_k_values.csv"]},
+    "smooth": {"script": "smooth.py", "inputs": ["k_value_outputs2/*.csv"],
+               "outputs": ["global_complete_k_values.csv", "global_complete_k_values.csv.snapshot/*",
+                           "global_complete_heatmap.html"]},
+    "k_test2": {"script": "k_test2.py", "inputs": ["global_complete_k_values.csv"],
+                "outputs": ["tile_k_values_cache.json"]},
+    "sample_pre": {"script": "sample_pre.py", "inputs": ["tile_k_values_cache.json"], "outputs": []},
+
+    # Macrostrat lithologies -> k-values by coordinate -> averaged -> map
+    # rock.py fetches every lith_id up to the highest one in lith_defs.json, from the URL template
+    "rock": {"script": "rock.py", "inputs": ["lith_defs.json"], "outputs": ["liths/lith_*.json"],
+             "env": {"MACROSTRAT_URL_TEMPLATE": "https://macrostrat.org/api/columns?lith_id={lith_id}"}},
+    "find_k": {"script": "find_k.py", "inputs": ["liths/lith_*.json", "lith_defs.json"],
+               "outputs": ["k_values_by_coordinate.csv"]},
+    # sort.py reads k_vals.csv rather than find_k.py's k_values_by_coordinate.csv, so the
+    # edge is declared explicitly
+    "sort": {"script": "sort.py", "inputs": ["k_vals.csv"], "outputs": ["k_vals_sorted.csv"],
+             "after": ["find_k"]},
+    "map": {"script": "map.py", "inputs": ["k_vals_sorted.csv"], "outputs": ["geo_map.html"]},
+}
+
+# --- 2. CONFIGURATION ---
+STATE_FILE = "pipeline_state.json"
+LOG_FOLDER = "pipeline_logs"
+JOBS = max(1, min(4, os.cpu_count() or 1))
+
+# --- 3. CONTENT HASHES ---
+_file_hashes = {}  # (path, size, mtime_ns) -> sha256, carried across runs in the state file
+
+def file_sha256(path):
+    stat = os.stat(path)
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+def expand(patterns):
+    return sorted({path for pattern in patterns for path in glob.glob(pattern) if os.path.isfile(path)})
+
+def files_sha256(paths):
+    """One hash over file names and contents; None if there are no files."""
+    if not paths:
+        return None
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode('utf-8') + b'\0' + file_sha256(path).encode('ascii'))
+    return digest.hexdigest()
+
+def local_modules(script, seen=None):
+    """The script plus every repo module it imports, followed transitively."""
+    seen = set() if seen is None else seen
+    if script in seen or not os.path.exists(script):
+        return seen
+    seen.add(script)
+    with open(script, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=script)
+    for node in ast.walk(tree):
+        names = [alias.name for alias in node.names] if isinstance(node, ast.Import) else \
+                [node.module] if isinstance(node, ast.ImportFrom) and node.module and not node.level else []
+        for name in names:
+            local_modules(name.split('.')[0] + ".py", seen)
+    return seen
+
+def stage_inputs(stage):
+    after_outputs = [pattern for dep in stage.get("after", []) for pattern in STAGES[dep]["outputs"]]
+    return expand(stage["inputs"] + after_outputs) + sorted(local_modules(stage["script"]))
+
+def stage_fingerprint(stage):
+    """One hash over a stage's input files (see stage_inputs) and the environment it runs with."""
+    inputs_hash = files_sha256(stage_inputs(stage))
+    if not stage.get("env"):
+        return inputs_hash
+    env = json.dumps(stage["env"], sort_keys=True)
+    return hashlib.sha256(f"{inputs_hash}\0{env}".encode('utf-8')).hexdigest()
+
+# --- 4. THE GRAPH ---
+def upstream_of(name):
+    """Stages whose outputs feed this stage's inputs, plus its explicit "after" stages."""
+    stage = STAGES[name]
+    deps = set(stage.get("after", []))
+    for other, candidate in STAGES.items():
+        if other == name:
+            continue
+        for output in candidate["outputs"]:
+            for pattern in stage["inputs"]:
+                if fnmatch.fnmatch(output, pattern) or fnmatch.fnmatch(pattern, output):
+                    deps.add(other)
+    return deps
+
+def select(targets):
+    """The targets and everything upstream of them (all stages if no targets are given)."""
+    selected, pending = set(), list(targets or STAGES)
+    while pending:
+        name = pending.pop()
+        if name not in STAGES:
+            raise SystemExit(f"Unknown stage '{name}'. Stages: {', '.join(STAGES)}")
+        if name not in selected:
+            selected.add(name)
+            pending.extend(upstream_of(name))
+    return selected
+
+# --- 5. RUNNING ---
+def run_script(script, log_path, env=None):
+    """Runs one script with its output in log_path; returns (exit code, wall seconds, peak RSS in MB or None)."""
+    start = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen([sys.executable, script], stdout=log, stderr=subprocess.STDOUT,
+                                   env={**os.environ, **env} if env else None)
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    else:
+        process.wait()
+        peak_mb = None
+    return process.returncode, time.perf_counter() - start, peak_mb
+
+def is_up_to_date(name, record, force):
+    if name in force or record is None:
+        return False
+    stage = STAGES[name]
+    outputs = expand(stage["outputs"])
+    if stage["outputs"] and not outputs:
+        return False
+    return record["inputs"] == stage_fingerprint(stage) and record["outputs"] == files_sha256(outputs)
+
+def run_pipeline(targets=None, force=(), jobs=JOBS, dry_run=False, adopt=False):
+    """
+    Runs the selected stages in dependency order, skipping those that are up to date.
+
+    A stage is up to date when the hash of its inputs (files, code and env) matches the last
+    successful run and its outputs are unchanged since then. Stages whose dependencies
+    are done run in parallel, up to `jobs` at a time; a failure skips everything downstream.
+    With adopt, stages whose outputs already exist are recorded as up to date without
+    running (e.g. to avoid re-downloading on the first run).
+    """
+    state = {"stages": {}, "file_hashes": {}}
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    _file_hashes.update(state.get("file_hashes", {}))
+
+    selected = select(targets)
+    deps = {name: upstream_of(name) & selected for name in selected}
+    force = selected if "*" in force else set(force)
+    status, report = {}, []
+
+    def start(name):
+        # Checked only once every dependency has finished, so fresh upstream outputs are seen
+        upstream_pending = dry_run and any(status[dep] == "would run" for dep in deps[name])
+        if not upstream_pending and is_up_to_date(name, state["stages"].get(name), force):
+            return "up to date", None
+        if dry_run:
+            return "would run", None
+        outputs = expand(STAGES[name]["outputs"])
+        if adopt and outputs:
+            return "adopted", {"inputs": stage_fingerprint(STAGES[name]), "outputs": files_sha256(outputs),
+                               "finished_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        os.makedirs(LOG_FOLDER, exist_ok=True)
+        log_path = os.path.join(LOG_FOLDER, f"{name}.log")
+        print(f"Running {name} ({STAGES[name]['script']}), output in '{log_path}'...", flush=True)
+        inputs_hash = stage_fingerprint(STAGES[name])
+        code, seconds, peak_mb = run_script(STAGES[name]["script"], log_path, STAGES[name].get("env"))
+        if code != 0:
+            print(f"  --> {name} failed with exit code {code}; see '{log_path}'.", flush=True)
+            return "failed", {"exit_code": code, "wall_seconds": seconds, "peak_rss_mb": peak_mb}
+        return "ran", {"inputs": inputs_hash, "outputs": files_sha256(expand(STAGES[name]["outputs"])),
+                       "wall_seconds": round(seconds, 3),
+                       "peak_rss_mb": round(peak_mb, 1) if peak_mb is not None else None,
+                       "finished_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        while len(status) < len(selected):
+            for name in sorted(selected - set(status) - set(running.values())):
+                if any(status.get(dep) in ("failed", "skipped (upstream failed)") for dep in deps[name]):
+                    status[name] = "skipped (upstream failed)"
+                    report.append((name, status[name], None))
+                elif all(dep in status for dep in deps[name]) and len(running) < jobs:
+                    running[pool.submit(start, name)] = name
+            if not running:
+                if len(status) < len(selected):
+                    raise SystemExit(f"Dependency cycle among: {', '.join(sorted(selected - set(status)))}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name], record = future.result()
+                report.append((name, status[name], record))
+                if status[name] in ("ran", "adopted"):
+                    state["stages"][name] = record
+
+    state["file_hashes"] = {key: value for key, value in _file_hashes.items()
+                            if os.path.exists(key.split('|')[0])}
+    if not dry_run:
+        with open(STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+    return report
+
+# --- 6. MAIN EXECUTION ---
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the data products, re-running only stages that are out of date.")
+    parser.add_argument("targets", nargs="*", help=f"stages to bring up to date with their upstream (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE", help="re-run this stage even if it is up to date ('*' for all)")
+    parser.add_argument("--jobs", type=int, default=JOBS, help="stages to run in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would run")
+    parser.add_argument("--adopt", action="store_true", help="record stages whose outputs already exist as up to date instead of running them")
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Stage paths are relative to the repo
+
+    report = run_pipeline(args.targets, args.force, args.jobs, args.dry_run, args.adopt)
+
+    print("\n--- Pipeline summary ---")
+    for name, result, record in report:
+        timing = ""
+        if record and "wall_seconds" in record:
+            peak = f", peak {record['peak_rss_mb']:.0f} MB" if record.get("peak_rss_mb") is not None else ""
+            timing = f" ({record['wall_seconds']:.1f}s{peak})"
+        print(f"  {name:<14} {result}{timing}")
+    if any(result == "failed" for _, result, _ in report):
+        exit(1)
+    print("✅ Pipeline complete.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Configuration
+DEFAULT_MAXSIZE = 65536
+DEFAULT_PRECISION = 4  # Decimal places kept from lat/lon (~11 m), matching the dataset's coordinates
+_ANY_VERSION = object()  # put() without a version check
+
+def file_version(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a data file, as a cache version token; None if it can't be read."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def _arg_key(arg: Any, pinned: list) -> Hashable:
+    """
+    Hashable stand-in for an argument; unhashable ones (data lists, hashes) go by identity
+    and size. Those are appended to `pinned`: the cache entry keeps a reference to them, so
+    their id can't be reused by another object while the entry exists.
+    """
+    try:
+        hash(arg)
+        return arg
+    except TypeError:
+        pinned.append(arg)
+        return ("id", id(arg), len(arg) if hasattr(arg, "__len__") else None)
+
+class QuantizedLRUCache:
+    """
+    Bounded LRU cache for point lookups keyed on lat/lon rounded to `precision` decimals.
+
+    Misses are computed at the quantized coordinates, so every query in the same cell gets
+    the same answer regardless of which one arrived first. `version` is an optional callable
+    returning a token for the underlying dataset; refresh() calls it (once per batch of
+    lookups, not per lookup) and clears the cache when the token changed. Cached values are
+    shared between callers, so they must be immutable (wrap() stores tuples).
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, precision: int = DEFAULT_PRECISION,
+                 version: Optional[Callable[[], Hashable]] = None):
+        self.maxsize = maxsize
+        self.precision = precision
+        self.version = version
+        self._entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version_token = version() if version else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def quantize(self, lat: float, lon: float) -> Tuple[float, float]:
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    def refresh(self) -> Hashable:
+        """
+        Checks the dataset version and clears the cache if it changed; returns the token.
+        version() runs outside the lock, so it may take its time (e.g. reload the data).
+        """
+        if self.version is None:
+            return None
+        token = self.version()
+        with self._lock:
+            if token != self._version_token:
+                self._entries.clear()
+                self._version_token = token
+                self.invalidations += 1
+        return token
+
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key][0]
+
+    def put(self, key: Tuple, value: Any, pinned: Tuple = (), version_token: Any = _ANY_VERSION):
+        """
+        Stores value; `pinned` holds objects the key refers to by id (see _arg_key). With
+        version_token, the value is dropped if the dataset version changed since then: it was
+        computed from data that is no longer current.
+        """
+        with self._lock:
+            if version_token is not _ANY_VERSION and version_token != self._version_token:
+                return
+            self._entries[key] = (value, tuple(pinned))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "precision": self.precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def wrap(self, lookup: Callable) -> Callable:
+        """
+        Puts the cache in front of a lookup(lat, lon, *args, **kwargs) returning (point, description).
+
+        Extra arguments are part of the key. Failed lookups (point is None) are not cached. The
+        point (a dict or pandas Series) comes back as a read-only mapping, so a result can be
+        shared between callers. Single lookups don't check the dataset version; `.batch(points,
+        *args, **kwargs)` checks it once and then looks up every (lat, lon) in `points`.
+        """
+        @functools.wraps(lookup)
+        def cached_lookup(lat, lon, *args, **kwargs):
+            q_lat, q_lon = self.quantize(lat, lon)
+            pinned = []
+            key = (q_lat, q_lon, tuple(_arg_key(a, pinned) for a in args),
+                   tuple(sorted((k, _arg_key(v, pinned)) for k, v in kwargs.items())))
+
+            # Read before the miss, so a refresh() during the lookup below is always noticed
+            version_token = self._version_token
+            found, result = self.get(key)
+            if found:
+                return result
+
+            # Computed outside the lock so concurrent readers are never blocked by a slow search
+            result = lookup(q_lat, q_lon, *args, **kwargs)
+            if result[0] is None:
+                return result
+            result = (MappingProxyType(dict(result[0])),) + tuple(result[1:])
+            self.put(key, result, pinned, version_token)
+            return result
+
+        def batch(points, *args, **kwargs):
+            self.refresh()
+            return [cached_lookup(lat, lon, *args, **kwargs) for lat, lon in points]
+
+        cached_lookup.cache = self
+        cached_lookup.batch = batch
+        return cached_lookup
@@ -0,0 +1,141 @@
+import numpy as np
+from k_snapshot import CSV_FILE, load_dataframe, load_morton_index, load_snapshot_arrays
+from morton import bbox_row_slices, build_sparse_index, candidate_rows, morton_key, morton_order
+
+# --- 1. CONFIGURATION ---
+EARTH_RADIUS_KM = 6371.0
+HISTOGRAM_BINS = 20
+
+# --- 2. HELPERS ---
+def haversine_distance(lon1, lat1, lon2, lat2):
+    """Calculate the great-circle distance in kilometers (vectorized)."""
+    lon1, lat1, lon2, lat2 = map(np.radians, [lon1, lat1, lon2, lat2])
+    a = np.sin((lat2 - lat1) / 2.0)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0)**2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+def _slices_to_rows(slices):
+    if not slices:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([np.arange(start, stop, dtype=np.int64) for start, stop in slices])
+
+def points_in_polygon(lon, lat, vertices):
+    """Even-odd ray casting of points against a polygon given as [(lon, lat), ...] (vectorized)."""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    inside = np.zeros(len(lon), dtype=bool)
+    x_prev, y_prev = vertices[-1]
+    for x, y in vertices:
+        crosses = (y > lat) != (y_prev > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = (x_prev - x) * (lat - y) / (y_prev - y) + x
+        inside ^= crosses & (lon < x_cross)
+        x_prev, y_prev = x, y
+    return inside
+
+# --- 3. REGION INDEX ---
+class KValueRegionIndex:
+    """
+    Region queries over the k-value dataset, backed by its Morton key order.
+
+    Candidate rows for a region are read as contiguous key-range slices and then filtered
+    exactly with vectorized tests, so no per-row Python objects are created. Queries return
+    row indices; region_arrays and aggregate_k turn them into columns or summary numbers.
+    """
+
+    def __init__(self, latitude, longitude, k_value, description_code, descriptions, keys, sparse_index):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.k_value = k_value
+        self.description_code = description_code
+        self.descriptions = descriptions
+        self.keys = keys
+        self.sparse_index = sparse_index
+
+    @classmethod
+    def load(cls, csv_file=CSV_FILE):
+        """Memory-maps the snapshot if it is current; otherwise sorts the CSV in memory."""
+        snapshot = load_snapshot_arrays(csv_file)
+        if snapshot is not None:
+            columns, descriptions = snapshot
+            keys, sparse_index = load_morton_index(csv_file)
+            return cls(columns["latitude"], columns["longitude"], columns["k_value"],
+                       columns["description_code"], descriptions, keys, sparse_index)
+
+        df, _ = load_dataframe(csv_file)
+        df = df.iloc[morton_order(df['latitude'].values, df['longitude'].values)]
+        descriptions = list(df['description'].dropna().unique())
+        codes = df['description'].map({d: i for i, d in enumerate(descriptions)}).fillna(-1).values.astype(np.int32)
+        keys = morton_key(df['latitude'].values, df['longitude'].values)
+        return cls(df['latitude'].values, df['longitude'].values, df['k_value'].values,
+                   codes, descriptions, keys, build_sparse_index(keys))
+
+    def __len__(self):
+        return len(self.k_value)
+
+    # --- Region selection (row indices) ---
+    def rows_in_bbox(self, lat_min, lon_min, lat_max, lon_max):
+        """Rows inside a lat/lon box; lon_min > lon_max means the box crosses the antimeridian."""
+        rows = _slices_to_rows(bbox_row_slices(self.keys, self.sparse_index, lat_min, lon_min, lat_max, lon_max))
+        lat, lon = self.latitude[rows], self.longitude[rows]
+        if lon_min <= lon_max:
+            in_lon = (lon >= lon_min) & (lon <= lon_max)
+        else:
+            in_lon = (lon >= lon_min) | (lon <= lon_max)
+        return rows[(lat >= lat_min) & (lat <= lat_max) & in_lon]
+
+    def rows_in_radius(self, lat, lon, radius_km):
+        """Rows within a great-circle radius of a point."""
+        rows = candidate_rows(self.keys, self.sparse_index, lat, lon, radius_km)
+        distances = haversine_distance(lon, lat, self.longitude[rows], self.latitude[rows])
+        return rows[distances <= radius_km]
+
+    def rows_in_polygon(self, vertices):
+        """Rows inside a polygon given as [(lon, lat), ...] in plain lon/lat coordinates."""
+        vertices = np.asarray(vertices, dtype=np.float64)
+        rows = self.rows_in_bbox(vertices[:, 1].min(), vertices[:, 0].min(),
+                                 vertices[:, 1].max(), vertices[:, 0].max())
+        return rows[points_in_polygon(self.longitude[rows], self.latitude[rows], vertices)]
+
+    # --- Results ---
+    def region_arrays(self, rows):
+        """Column arrays for the selected rows (descriptions stay as codes into self.descriptions)."""
+        return {
+            "latitude": np.asarray(self.latitude[rows]),
+            "longitude": np.asarray(self.longitude[rows]),
+            "k_value": np.asarray(self.k_value[rows]),
+            "description_code": np.asarray(self.description_code[rows])
+        }
+
+    def aggregate_k(self, rows, bins=HISTOGRAM_BINS):
+        """
+        Summary of k over the selected rows.
+
+        Returns:
+            dict: count, mean, min, max and histogram (counts, bin_edges); the numbers
+            are None and the histogram empty when the region holds no points.
+        """
+        k_values = np.asarray(self.k_value[rows])
+        if len(k_values) == 0:
+            return {"count": 0, "mean": None, "min": None, "max": None,
+                    "histogram": (np.zeros(0, dtype=np.int64), np.zeros(0))}
+        counts, edges = np.histogram(k_values, bins=bins)
+        return {
+            "count": int(len(k_values)),
+            "mean": float(k_values.mean()),
+            "min": float(k_values.min()),
+            "max": float(k_values.max()),
+            "histogram": (counts, edges)
+        }
+
+# --- 4. EXAMPLE USAGE ---
+if __name__ == "__main__":
+    index = KValueRegionIndex.load()
+    print(f"✅ Region index ready over {len(index)} points.")
+
+    # 200 km around Clemson University, SC
+    rows = index.rows_in_radius(34.6834, -82.8374, 200.0)
+    summary = index.aggregate_k(rows)
+    print(f"\n200 km around Clemson: {summary['count']} points, mean k = {summary['mean']}")
+
+    # Box over the continental United States
+    summary = index.aggregate_k(index.rows_in_bbox(24.5, -125.0, 49.5, -66.9))
+    print(f"Continental US box: {summary['count']} points, k in [{summary['min']}, {summary['max']}]")
@@ -1,16 +1,119 @@
-import requests
+import asyncio
 import json
+import os
+import random
+import aiohttp
 
-for lith in range(221):
+# --- 1. CONFIGURATION ---
+api_url = os.environ.get("MACROSTRAT_URL_TEMPLATE", "https://macrostrat.org/api/columns?lith_id={lith_id}")
+lith_defs_file = 'lith_defs.json'
+output_folder = 'liths'
+# ETag / Last-Modified of each saved response, so unchanged lithologies are revalidated
+# with a conditional request instead of downloaded again
+validators_file = os.path.join(output_folder, 'validators.json')
+CONCURRENCY = 8   # Requests in flight at once over the pooled session
+RETRIES = 4       # For connection errors, timeouts, 429 and 5xx responses
+BACKOFF_SECONDS = 1.0
+TIMEOUT_SECONDS = 30
+
+# --- 2. HELPERS ---
+def load_lith_ids():
+    """Every lith_id up to the highest defined in lith_defs.json (1-221 if it is missing)."""
+    if not os.path.exists(lith_defs_file):
+        return range(1, 222)
+    with open(lith_defs_file, 'r') as f:
+        return range(1, max(item['lith_id'] for item in json.load(f)['success']['data']) + 1)
+
+def lith_path(lith_id):
+    return os.path.join(output_folder, f"lith_{lith_id}.json")
+
+def load_validators():
+    if not os.path.exists(validators_file):
+        return {}
     try:
-        response = requests.get(f"https://macrostrat.org/api/columns?lith_id={lith + 1}") #221
-        response.raise_for_status()
-        data = response.json()
+        with open(validators_file, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def write_if_changed(path, content):
+    """Writes content unless the file already holds exactly it; returns True if it was written."""
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    temp_path = path + '.part'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+    return True
+
+# --- 3. FETCHING ---
+async def fetch_lith(session, semaphore, lith_id, validators, url_template=api_url):
+    """Fetches one lithology; returns 'updated', 'unchanged' or 'failed'."""
+    path = lith_path(lith_id)
+    headers = {}
+    cached = validators.get(str(lith_id)) if os.path.exists(path) else None
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    for attempt in range(RETRIES + 1):
+        retry_after = None
+        try:
+            async with semaphore:
+                async with session.get(url_template.format(lith_id=lith_id), headers=headers) as response:
+                    if response.status == 304:
+                        return 'unchanged'
+                    if response.status == 429 or response.status >= 500:
+                        retry_after = response.headers.get('Retry-After')
+                        raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                          status=response.status, message=response.reason)
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+                    etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+            retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status == 429 or e.status >= 500
+            if attempt == RETRIES or not retryable:
+                print(f"An error occurred during the API request for lith_id={lith_id}: {e}")
+                return 'failed'
+            # Waits outside the semaphore, so a throttled request doesn't hold a slot the others could use
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else BACKOFF_SECONDS * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, BACKOFF_SECONDS / 2))
+
+    # Compact JSON; the file is only rewritten (and its mtime bumped) if the content changed
+    content = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    changed = write_if_changed(path, content)
+    validators[str(lith_id)] = {'etag': etag, 'last_modified': last_modified}
+    return 'updated' if changed else 'unchanged'
+
+async def fetch_all(ids=None, url_template=api_url, concurrency=CONCURRENCY):
+    """Fetches the lithologies (all of load_lith_ids() by default) over one pooled session; returns {lith_id: outcome}."""
+    ids = load_lith_ids() if ids is None else ids
+    os.makedirs(output_folder, exist_ok=True)
+    validators = load_validators()
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_SECONDS)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        outcomes = await asyncio.gather(*(fetch_lith(session, semaphore, lith_id, validators, url_template)
+                                          for lith_id in ids))
+
+    write_if_changed(validators_file, json.dumps(validators, sort_keys=True).encode('utf-8'))
+    return dict(zip(ids, outcomes))
 
-        with open(f"liths/lith_{lith + 1}.json", 'w') as f:
-            json.dump(data, f, indent=4)
+# --- 4. MAIN EXECUTION ---
+def main():
+    lith_ids = load_lith_ids()
+    print(f"Fetching {len(lith_ids)} lithologies with up to {CONCURRENCY} concurrent requests...")
+    outcomes = asyncio.run(fetch_all(lith_ids))
+    counts = {outcome: list(outcomes.values()).count(outcome) for outcome in ('updated', 'unchanged', 'failed')}
+    print(f"✅ {counts['updated']} updated, {counts['unchanged']} unchanged, {counts['failed']} failed.")
+    if counts['failed']:
+        exit(1)
 
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred during the API request: {e}")
-    except KeyError as e:
-        print(f"Error parsing data: could not find key {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
-import pandas as pd
 import numpy as np
 import os
+import threading
+import time
+from k_snapshot import load_dataframe
+from query_cache import QuantizedLRUCache, file_version
 
 # --- 1. SETUP AND INITIALIZATION (RUNS ONCE) ---
 
@@ -13,12 +16,13 @@ if not os.path.exists(data_filename):
     print(f"\nFatal Error: Data file not found at '{data_filename}'.")
     exit()
 
-# Load the entire dataset
-df = pd.read_csv(data_filename)
-df.dropna(subset=['latitude', 'longitude', 'k_value'], inplace=True)
+# Load the entire dataset (from the binary snapshot when it is up to date)
+load_start = time.perf_counter()
+loaded_version = file_version(data_filename)  # Taken first, so a change during the load is seen later
+df, data_source = load_dataframe(data_filename)
 
 # No need to build a tree, the data is ready to be queried.
-print(f"✅ Data loaded. Ready to query {len(df)} points.")
+print(f"✅ Data loaded from {data_source} in {time.perf_counter() - load_start:.3f}s. Ready to query {len(df)} points.")
 
 
 # --- 2. THE DISTANCE AND QUERY FUNCTIONS (NO SKLEARN) ---
@@ -89,6 +93,28 @@ def find_k_and_relevant_description(lat, lon, radius_km=20, k_value_similarity_t
         print(f"An error occurred during query: {e}")
         return None, "Error during search."
 
+reload_lock = threading.Lock()
+
+def dataset_version():
+    """
+    (mtime, size) of the loaded dataset. The query cache calls this once per batch of
+    lookups, outside its lock: if the data file changed on disk, the dataset is reloaded
+    first, and the cache is then cleared.
+    """
+    global df, loaded_version
+    with reload_lock:
+        token = file_version(data_filename)
+        if token is not None and token != loaded_version:  # Missing file: keep the loaded data
+            print(f"'{data_filename}' changed on disk; reloading...")
+            df, _ = load_dataframe(data_filename)
+            loaded_version = token
+        return loaded_version
+
+# Repeated queries (same cities, small jitter) are answered from a quantized LRU cache,
+# which is cleared when a batch finds the data file changed on disk.
+query_cache = QuantizedLRUCache(version=dataset_version)
+find_k_and_relevant_description = query_cache.wrap(find_k_and_relevant_description)
+
 # --- 3. EXAMPLE USAGE ---
 
 if __name__ == "__main__":
@@ -101,7 +127,7 @@ if __name__ == "__main__":
     print(f"Querying coordinates: ({query_latitude}, {query_longitude})")
     print("(This may take a moment as it calculates distance to all points...)")
     
-    nearest_point, description = find_k_and_relevant_description(query_latitude, query_longitude)
+    [(nearest_point, description)] = find_k_and_relevant_description.batch([(query_latitude, query_longitude)])
     
     if nearest_point is not None:
         print("\n--- Results ---")
@@ -111,4 +137,6 @@ if __name__ == "__main__":
         
         if description:
             print("\nRelevant Description:")
-            print(f"  - Description: {description}")
\ No newline at end of file
+            print(f"  - Description: {description}")
+
+        print(f"\nQuery cache: {query_cache.stats()}")
\ No newline at end of file
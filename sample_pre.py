@@ -1,11 +1,14 @@
 import json
 import math
 import os
+from tile_grid import bilinear_sample, cache_to_tile_grid
 
 # --- 1. CONFIGURATION (Must match the precomputation script) ---
 CACHE_FILE = "tile_k_values_cache.json"
 TILE_SIZE = (3, 3)
 END_POS = (3085, 1542)
+NO_DESCRIPTION_CODE = -1
+DESCRIPTIONS_KEY = "descriptions"  # Reserved cache key holding the description code table
 
 # --- 2. LOAD THE PRECOMPUTED CACHE (RUNS ONCE) ---
 print(f"Loading precomputed k-value cache from '{CACHE_FILE}'...")
@@ -17,39 +20,47 @@ if not os.path.exists(CACHE_FILE):
 try:
     with open(CACHE_FILE, 'r', encoding='utf-8') as f:
         tile_k_values_cache = json.load(f)
+    # Older caches only hold k-values; newer ones carry a description table alongside the tiles
+    description_table = tile_k_values_cache.pop(DESCRIPTIONS_KEY, [])
     print(f"✅ Cache loaded with {len(tile_k_values_cache)} tiles.")
 except Exception as e:
     print(f"Fatal Error: Could not read or parse the cache file. Error: {e}")
     exit()
 
 
-# --- 3. THE FAST QUERY FUNCTION ---
+# --- 3. THE FAST QUERY FUNCTIONS ---
 
-def get_k_from_cache(lat, lon):
+def _tile_key(lat, lon):
+    """Converts a lat/lon to the "x,y" key of the tile it falls in."""
+    # 1. Convert lat/lon to the pixel coordinate system
+    # These are the inverse of the formulas in the precomputation script
+    pixel_x = (lon / 360.0 + 0.5) * END_POS[0]
+    pixel_y = (lat / 180.0 + 0.5) * END_POS[1]
+    
+    # 2. Convert pixel coordinates to tile coordinates
+    tile_x = int(math.floor(pixel_x / TILE_SIZE[0]))
+    tile_y = int(math.floor(pixel_y / TILE_SIZE[1]))
+    
+    return f"{tile_x},{tile_y}"
+
+def get_k_from_cache(lat, lon, interpolate=False):
     """
     Finds the precomputed k-value for a given lat/lon by looking it up in the cache.
     
     Args:
         lat (float): The latitude of the point to query.
         lon (float): The longitude of the point to query.
+        interpolate (bool): Blend the four surrounding tile centers bilinearly
+            instead of snapping to the tile the point falls in.
         
     Returns:
         float: The k-value for that tile, or None if not found.
     """
+    if interpolate:
+        return get_k_interpolated(lat, lon)
     try:
-        # --- Reverse Mapping: Convert lat/lon back to tile coordinates ---
-
-        # 1. Convert lat/lon to the pixel coordinate system
-        # These are the inverse of the formulas in the precomputation script
-        pixel_x = (lon / 360.0 + 0.5) * END_POS[0]
-        pixel_y = (lat / 180.0 + 0.5) * END_POS[1]
-        
-        # 2. Convert pixel coordinates to tile coordinates
-        tile_x = int(math.floor(pixel_x / TILE_SIZE[0]))
-        tile_y = int(math.floor(pixel_y / TILE_SIZE[1]))
-        
-        # 3. Construct the key and look it up in the cache
-        key = f"{tile_x},{tile_y}"
+        # Reverse mapping: convert lat/lon back to tile coordinates and look it up
+        key = _tile_key(lat, lon)
         
         if key in tile_k_values_cache:
             return tile_k_values_cache[key].get("k_value")
@@ -60,6 +71,66 @@ def get_k_from_cache(lat, lon):
         print(f"An error occurred during lookup: {e}")
         return None
 
+_dense_k_grid = None
+
+def _get_dense_k_grid():
+    """Builds the dense k array for interpolation on first use (the dict stays the source of truth)."""
+    global _dense_k_grid
+    if _dense_k_grid is None:
+        _dense_k_grid = cache_to_tile_grid(tile_k_values_cache)[0]
+    return _dense_k_grid
+
+def get_k_interpolated_array(lats, lons):
+    """
+    Vectorized bilinear k lookup for arrays of coordinates.
+    
+    Longitudes wrap across the antimeridian and latitudes are clamped at the poles.
+    
+    Returns:
+        numpy.ndarray: Interpolated k-values (NaN where no surrounding tile has a value).
+    """
+    return bilinear_sample(_get_dense_k_grid(), lats, lons)
+
+def get_k_interpolated(lat, lon):
+    """
+    Finds a k-value for a given lat/lon by blending the four surrounding tile centers.
+    
+    Returns:
+        float: The interpolated k-value, or None if no surrounding tile has a value.
+    """
+    try:
+        k_value = float(get_k_interpolated_array(lat, lon))
+        return None if math.isnan(k_value) else k_value
+    except Exception as e:
+        print(f"An error occurred during lookup: {e}")
+        return None
+
+def get_description_from_cache(lat, lon):
+    """
+    Finds the precomputed description for a given lat/lon, at the same cost as a k lookup.
+    
+    Args:
+        lat (float): The latitude of the point to query.
+        lon (float): The longitude of the point to query.
+        
+    Returns:
+        tuple: (description, similar), where description is None if the tile has no
+        relevant description (or the cache predates description codes) and similar is
+        True when it came from a geologically similar detailed point.
+    """
+    try:
+        tile = tile_k_values_cache.get(_tile_key(lat, lon))
+        if tile is None:
+            return None, False # The coordinate is outside the precomputed grid
+        
+        code = tile.get("description_code", NO_DESCRIPTION_CODE)
+        description = description_table[code] if code != NO_DESCRIPTION_CODE else None
+        return description, bool(tile.get("similar", False))
+
+    except Exception as e:
+        print(f"An error occurred during lookup: {e}")
+        return None, False
+
 # --- 4. EXAMPLE USAGE ---
 
 if __name__ == "__main__":
@@ -76,5 +147,12 @@ if __name__ == "__main__":
     if k_value is not None:
         print("\n--- Result ---")
         print(f"  - Precomputed K-Value: {k_value:.5f}")
+        interpolated_k_value = get_k_from_cache(query_latitude, query_longitude, interpolate=True)
+        if interpolated_k_value is not None:
+            print(f"  - Interpolated K-Value: {interpolated_k_value:.5f}")
+        
+        description, similar = get_description_from_cache(query_latitude, query_longitude)
+        if description:
+            print(f"  - Description: {description}")
     else:
         print("\nCould not find a k-value for the specified coordinates.")
\ No newline at end of file
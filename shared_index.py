@@ -0,0 +1,214 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import scipy
+from k_snapshot import CSV_FILE, load_dataframe
+from kd_index import coordinates_sha256, load_or_build_kdtree, tree_from_state, tree_state
+from parallel_precompute import encode_dataset, lookup_points
+
+# --- 1. CONFIGURATION ---
+SEGMENT_NAME = "k_value_index"
+INDEX_FILE = CSV_FILE + ".shared"
+MAGIC = b"KIDX0001"
+HEADER = struct.Struct("<8sQ")  # magic, manifest length
+ALIGNMENT = 64
+
+# --- 2. LAYOUT ---
+def _layout(arrays, meta):
+    """Manifest (offsets, dtypes, shapes plus meta) and total size of a packed index."""
+    manifest = {"arrays": {}, **meta}
+    offset = 0
+    for name, array in arrays.items():
+        manifest["arrays"][name] = [offset, array.dtype.str, list(array.shape)]
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded = json.dumps(manifest).encode("utf-8")
+    data_start = -(-(HEADER.size + len(encoded)) // ALIGNMENT) * ALIGNMENT
+    return encoded, data_start, data_start + offset
+
+def _pack(buffer, arrays, encoded, data_start):
+    HEADER.pack_into(buffer, 0, MAGIC, len(encoded))
+    buffer[HEADER.size:HEADER.size + len(encoded)] = encoded
+    manifest = json.loads(encoded)
+    for name, array in arrays.items():
+        offset, dtype, shape = manifest["arrays"][name]
+        view = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=data_start + offset)
+        view[...] = array
+
+def _unpack(buffer):
+    """Read-only array views onto a packed index; nothing is copied."""
+    magic, length = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("not a k-value index segment")
+    manifest = json.loads(bytes(buffer[HEADER.size:HEADER.size + length]))
+    data_start = -(-(HEADER.size + length) // ALIGNMENT) * ALIGNMENT
+    arrays = {}
+    for name, (offset, dtype, shape) in manifest["arrays"].items():
+        view = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=data_start + offset)
+        view.flags.writeable = False
+        arrays[name] = view
+    return arrays, manifest
+
+def _build(df, csv_file):
+    """Arrays and manifest meta for a dataset: lookup columns plus the KD-tree's internal state."""
+    tree, _ = load_or_build_kdtree(df, csv_file)
+    arrays, descriptions = encode_dataset(df)
+    tree_arrays, tree_scalars = tree_state(tree)
+    arrays.update(tree_arrays)
+    meta = {"descriptions": descriptions, "content_sha256": coordinates_sha256(df),
+            "scipy_version": scipy.__version__, "tree": tree_scalars}
+    return arrays, meta
+
+def _attach_untracked(name):
+    """
+    Opens an existing segment without registering it with the resource tracker.
+
+    A registered segment is unlinked when the registering process exits, and unregistering
+    afterwards would also drop the owner's registration when the tracker is shared (as it
+    is for multiprocessing children), so only the owner ever registers.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+# --- 3. SHARED INDEX ---
+class SharedKIndex:
+    """
+    A KD-tree k-value index packed into one shared-memory segment or memory-mapped file.
+
+    The owner builds it once with create() (or save() for a file); any number of worker
+    processes then attach() / open() read-only. Coordinates, tree indices, k-values and
+    description codes are used in place, so attaching costs no parsing and no tree build.
+    Only scipy's node buffer (about 1 MB here) is copied per process, because scipy
+    rebuilds its node vector on unpickling. Queries go through lookup_points, as in
+    parallel_precompute.py and k_service.py.
+
+    Call detach() (or use the index as a context manager) before a worker exits; the
+    owner also calls unlink() once the last worker is done with the segment.
+    """
+
+    def __init__(self, arrays, manifest, handle, owner=False):
+        if manifest["scipy_version"] != scipy.__version__:
+            raise ValueError(f"index was written by scipy {manifest['scipy_version']}, "
+                             f"this process has {scipy.__version__}")
+        self.arrays = arrays
+        self.descriptions = manifest["descriptions"]
+        self.content_sha256 = manifest["content_sha256"]
+        self.handle = handle
+        self.owner = owner
+
+        self.tree = tree_from_state(arrays, manifest["tree"])
+
+    # --- Lifecycle: shared memory ---
+    @classmethod
+    def create(cls, df, name=SEGMENT_NAME, csv_file=CSV_FILE):
+        """Packs the dataset's index into a new named segment; the caller owns (and unlinks) it."""
+        arrays, meta = _build(df, csv_file)
+        encoded, data_start, size = _layout(arrays, meta)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        try:
+            _pack(shm.buf, arrays, encoded, data_start)
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+        return cls(*_unpack(shm.buf), shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=SEGMENT_NAME):
+        """Attaches read-only to a segment created by another process."""
+        shm = _attach_untracked(name)
+        try:
+            return cls(*_unpack(shm.buf), shm)
+        except Exception:
+            shm.close()
+            raise
+
+    # --- Lifecycle: memory-mapped file ---
+    @staticmethod
+    def save(df, path=INDEX_FILE, csv_file=CSV_FILE):
+        """Writes the packed index to a file, atomically, for open() to map."""
+        arrays, meta = _build(df, csv_file)
+        encoded, data_start, size = _layout(arrays, meta)
+        buffer = bytearray(size)
+        _pack(buffer, arrays, encoded, data_start)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(buffer)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def open(cls, path=INDEX_FILE):
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(*_unpack(memoryview(mapped)), mapped)
+        except Exception:
+            mapped.close()
+            raise
+
+    def detach(self):
+        """Drops every view onto the segment and closes this process's mapping."""
+        if self.handle is None:
+            return
+        self.tree = None
+        self.arrays = {}
+        self.handle.close()
+        self.handle = None
+
+    def unlink(self):
+        """Owner only: removes the segment once all workers have detached."""
+        if not self.owner:
+            raise RuntimeError("only the process that created the segment may unlink it")
+        shm = self.handle
+        self.detach()
+        if shm is not None:
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.detach()
+
+    # --- Queries ---
+    def __len__(self):
+        return len(self.arrays["k_value"])
+
+    def lookup(self, lat, lon):
+        """Vectorized k_test2 lookup: (k_value, description or None, similar) arrays."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        nearest, code, similar = lookup_points(self.tree, self.arrays, lat, lon)
+        descriptions = [self.descriptions[c] if c >= 0 else None for c in code]
+        return self.arrays["k_value"][nearest], descriptions, similar
+
+# --- 4. MAIN EXECUTION ---
+def main():
+    print(f"Loading data from '{CSV_FILE}'...")
+    if not os.path.exists(CSV_FILE):
+        print(f"\nFatal Error: Data file not found at '{CSV_FILE}'.")
+        exit()
+
+    df, _ = load_dataframe(CSV_FILE)
+    path = SharedKIndex.save(df)
+    print(f"✅ Wrote {os.path.getsize(path) / (1024 * 1024):.1f} MB index to '{path}'")
+
+    start = time.perf_counter()
+    with SharedKIndex.open(path) as index:
+        ready = time.perf_counter() - start
+        k_value, description, _ = index.lookup(34.6834, -82.8374)
+        print(f"Worker ready in {ready * 1000:.1f} ms over {len(index)} points.")
+        print(f"Clemson University, SC: k = {k_value[0]:.5f}, description = {description[0]}")
+
+if __name__ == "__main__":
+    main()
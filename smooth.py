@@ -4,7 +4,9 @@ import folium
 from folium.plugins import HeatMap
 import glob
 import os
-from scipy.interpolate import griddata
+from interp_weights import interpolate, load_or_build_weights
+from k_snapshot import write_snapshot, snapshot_folder
+from morton import morton_order
 
 # --- 1. LOAD AND COMBINE ALL KNOWN DATA POINTS ---
 input_folder = 'k_value_outputs2'
@@ -31,20 +33,21 @@ known_values = df_known['k_value'].values
 # --- 3. CREATE A DENSE GLOBAL GRID TO INTERPOLATE ONTO ---
 print("\nCreating a dense global grid...")
 spacing = 1.0
+# 'planar' interpolates in flat lon/lat (as griddata does), leaving gaps at the +-180 seam and
+# the poles; 'spherical' triangulates on the unit sphere and covers the whole globe
+interpolation_mode = 'planar'
 lons = np.arange(-180, 181, spacing)
 lats = np.arange(-90, 91, spacing)
 grid_lons, grid_lats = np.meshgrid(lons, lats)
 print(f"Grid created with {grid_lons.size} points.")
 
 # --- 4. PERFORM THE INTERPOLATION ---
-print("Interpolating k-values onto the grid (this may take a few minutes)...")
-interpolated_k_values = griddata(
-    known_points,
-    known_values,
-    (grid_lons, grid_lats),
-    method='linear'
-)
-print("✅ Interpolation complete.")
+# Linear (Delaunay) interpolation, with the triangulation's weights cached on disk while
+# the point locations stay the same
+print(f"Interpolating k-values onto the grid ({interpolation_mode} triangulation)...")
+weights, weights_source = load_or_build_weights(known_points, grid_lons, grid_lats, interpolation_mode)
+interpolated_k_values = interpolate(weights, known_values).reshape(grid_lons.shape)
+print(f"✅ Interpolation complete (weights {'loaded from cache' if weights_source == 'cache' else 'built and cached'}).")
 
 # --- 5. CREATE, COMBINE, AND SAVE THE FINAL DATAFRAME ---
 print("Preparing and combining final DataFrame...")
@@ -65,11 +68,18 @@ df_combined = pd.concat([df_known, df_interpolated], ignore_index=True)
 df_final = df_combined.drop_duplicates(subset=['latitude', 'longitude'], keep='first')
 print(f"Combined data contains {len(df_final)} unique points.")
 
+# Store rows in Morton (Z-order) so spatial neighbors are adjacent in the file and in memory
+df_final = df_final.iloc[morton_order(df_final['latitude'].values, df_final['longitude'].values)]
+
 # Save the complete dataset (original + interpolated) to a CSV file
 print(f"Saving combined data to '{output_csv_filename}'...")
 df_final.to_csv(output_csv_filename, index=False)
 print("✅ CSV file saved.")
 
+# Write the binary columnar snapshot so lookup scripts can skip parsing the CSV
+write_snapshot(output_csv_filename)
+print(f"✅ Binary snapshot saved to '{snapshot_folder(output_csv_filename)}'.")
+
 
 # --- 6. CREATE THE FINAL MAP ---
 print("Generating final heatmap...")
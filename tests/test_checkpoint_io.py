@@ -0,0 +1,45 @@
+import os
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point, Polygon
+
+from checkpoint_io import read_checkpoint, write_checkpoint
+
+
+def _continent():
+    return gpd.GeoDataFrame(
+        {"LITHO_EN": ["granite", "missing", "shale", "empty", "gneiss"]},
+        geometry=[Polygon([(0, 0), (1, 0), (1, 1)]), None, Point(5, 5).buffer(1), Polygon(), Point(-3, 2).buffer(0.5)],
+        crs="EPSG:4326",
+    )
+
+
+def test_null_and_empty_geometries_are_dropped(tmp_path):
+    path = str(tmp_path / "Africa_geology.fgb")
+    assert write_checkpoint(_continent(), path) == 3
+
+    gdf = read_checkpoint(path)
+    assert gdf["LITHO_EN"].tolist() == ["granite", "shale", "gneiss"]
+    assert not gdf.geometry.is_empty.any()
+    assert os.listdir(tmp_path) == ["Africa_geology.fgb"]
+
+
+def test_bbox_read_keeps_the_written_order(tmp_path):
+    path = str(tmp_path / "Africa_geology.fgb")
+    write_checkpoint(_continent(), path)
+    assert read_checkpoint(path, bbox=(-4, -1, 2, 3))["LITHO_EN"].tolist() == ["granite", "gneiss"]
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "Africa_geology.fgb")
+    to_file = gpd.GeoDataFrame.to_file
+
+    def interrupted(self, filename, **kwargs):
+        to_file(self, filename, **kwargs)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(gpd.GeoDataFrame, "to_file", interrupted)
+    with pytest.raises(OSError):
+        write_checkpoint(_continent(), path)
+    assert os.listdir(tmp_path) == []
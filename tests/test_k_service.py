@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+import pytest
+
+from k_service import _handle_connection
+
+
+class StubIndex:
+    def stats(self):
+        return {"requests": 0}
+
+
+def _exchange(raw_request):
+    """Sends one raw request to _handle_connection and returns (status, body)."""
+    async def run():
+        server = await asyncio.start_server(lambda r, w: _handle_connection(StubIndex(), r, w), "127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(raw_request)
+            await writer.drain()
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            length = next(int(line.split(b":")[1]) for line in head.split(b"\r\n")
+                          if line.lower().startswith(b"content-length:"))
+            body = await reader.readexactly(length)
+            writer.close()
+        return int(head.split()[1]), json.loads(body)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("length", ["-1", "-100", "abc", "1.5", "+3", "1_0", ""])
+def test_invalid_content_length_is_a_400(length):
+    status, body = _exchange(f"POST /k HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+    assert status == 400
+    assert body == {"error": "malformed request"}
+
+
+def test_valid_content_length_reads_the_body():
+    body = b'{"points": "nope"}'
+    status, payload = _exchange(b"POST /k HTTP/1.1\r\nConnection: close\r\nContent-Length: "
+                                + str(len(body)).encode() + b"\r\n\r\n" + body)
+    assert status == 400
+    assert "points must be a list" in payload["error"]
+
+
+def test_request_without_a_body():
+    assert _exchange(b"GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n") == (200, {"requests": 0})
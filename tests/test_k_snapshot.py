@@ -0,0 +1,71 @@
+import os
+
+import pandas as pd
+
+import k_snapshot
+import k_test
+
+CSV = """latitude,longitude,k_value,description
+10.0,20.0,0.03,granite
+-45.5,170.25,0.02,
+10.0,20.0,0.05,shale
+,5.0,0.01,no latitude
+80.0,-120.0,0.04,Interpolated
+-10.0,-60.0,0.02,granite
+"""
+
+
+def _write_csv(tmp_path, text=CSV):
+    path = str(tmp_path / "k_values.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def test_snapshot_loads_in_csv_order(tmp_path):
+    path = _write_csv(tmp_path)
+    k_snapshot.write_snapshot(path)
+
+    df, source = k_snapshot.load_dataframe(path)
+    expected = pd.read_csv(path).dropna(subset=['latitude', 'longitude', 'k_value'])
+    assert source == "snapshot"
+    assert df.equals(expected)
+    # The first of the two rows at (10, 20) wins a nearest-point tie, as on the CSV
+    assert df['k_value'].iloc[0] == 0.03
+
+
+def test_k_test_reads_the_snapshot_in_csv_order(tmp_path):
+    # k_test.py's CSV reader has no missing-value handling, so every row here is complete
+    path = _write_csv(tmp_path, CSV.replace(",5.0,0.01,no latitude\n", ""))
+    from_csv, _ = k_test.load_data(path)
+    k_snapshot.write_snapshot(path)
+    from_snapshot, _ = k_test.load_data(path)
+    assert from_snapshot == from_csv
+
+
+def test_freshness_hashes_only_when_the_mtime_alone_changed(tmp_path, monkeypatch):
+    path = _write_csv(tmp_path)
+    k_snapshot.write_snapshot(path)
+    hashed = []
+    sha256 = k_snapshot.file_sha256
+    monkeypatch.setattr(k_snapshot, "file_sha256", lambda p: hashed.append(p) or sha256(p))
+
+    assert k_snapshot.read_meta(path) is not None
+    assert hashed == []
+
+    # Touched but unchanged: hashed once, then the new mtime is recorded
+    os.utime(path, (1_000_000, 1_000_000))
+    assert k_snapshot.read_meta(path) is not None
+    assert k_snapshot.read_meta(path) is not None
+    assert len(hashed) == 1
+
+    # Same size, different content
+    _write_csv(tmp_path, CSV.replace("0.03", "0.07"))
+    os.utime(path, (2_000_000, 2_000_000))
+    assert k_snapshot.read_meta(path) is None
+
+    # Different size: stale without hashing
+    hashed.clear()
+    _write_csv(tmp_path, CSV + "1.0,2.0,0.03,gneiss\n")
+    assert k_snapshot.read_meta(path) is None
+    assert hashed == []
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from k_test import SpatialHash, find_nearest_point, haversine_distance
+
+RADIUS_KM = 800.0
+
+
+def _points(seed, count=3000):
+    rng = random.Random(seed)
+    points = []
+    for i in range(count):
+        # Half the points crowd the antimeridian, where the narrow last column sits
+        lon = rng.uniform(170.0, 190.0) if i % 2 else rng.uniform(-180.0, 180.0)
+        points.append({"latitude": rng.uniform(-89.0, 89.0), "longitude": (lon + 180.0) % 360.0 - 180.0,
+                       "k_value": float(i)})
+    return points
+
+
+def _hash(points, grid_size):
+    spatial_hash = SpatialHash(grid_size)
+    for point in points:
+        spatial_hash.add_point(point)
+    return spatial_hash
+
+
+@pytest.mark.parametrize("grid_size", [7.0, 2.7, 1.0])
+def test_radius_cells_hold_every_point_within_the_radius(grid_size):
+    points = _points(1)
+    spatial_hash = _hash(points, grid_size)
+    assert spatial_hash.lon_cells == -(-360 // grid_size)
+
+    rng = random.Random(2)
+    queries = [(rng.uniform(-80.0, 80.0), rng.choice([179.5, -179.5, 177.0, -176.0, 180.0]) + rng.uniform(-3.0, 3.0))
+               for _ in range(150)]
+    for lat, lon in queries:
+        found = {id(p) for p in spatial_hash.get_points_in_radius_cells(lat, lon, RADIUS_KM)}
+        within = {id(p) for p in points
+                  if haversine_distance(lon, lat, p["longitude"], p["latitude"]) <= RADIUS_KM}
+        assert within <= found, (lat, lon)
+
+
+@pytest.mark.parametrize("grid_size", [7.0, 2.7])
+def test_nearest_point_matches_brute_force(grid_size):
+    points = _points(3, count=400)
+    spatial_hash = _hash(points, grid_size)
+
+    rng = random.Random(4)
+    for _ in range(300):
+        lat, lon = rng.uniform(-89.5, 89.5), rng.choice([179.9, -179.9, 0.0]) + rng.uniform(-6.0, 6.0)
+        nearest = find_nearest_point(lat, lon, points, spatial_hash)
+        best = min(haversine_distance(lon, lat, p["longitude"], p["latitude"]) for p in points)
+        assert haversine_distance(lon, lat, nearest["longitude"], nearest["latitude"]) == best
+    assert spatial_hash.brute_force_fallbacks == 0
@@ -0,0 +1,47 @@
+import importlib
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from parallel_precompute import encode_dataset, lookup_points
+from tile_grid import TILE_SIZE, tile_centers
+
+
+@pytest.fixture
+def k_test2(tmp_path, monkeypatch):
+    """k_test2.py loaded against a synthetic dataset whose grid includes both poles."""
+    rng = np.random.default_rng(0)
+    lats, lons = np.meshgrid(np.arange(-90.0, 91.0, 2.0), np.arange(-180.0, 180.0, 4.0), indexing='ij')
+    n = lats.size
+    descriptions = np.where(rng.random(n) < 0.6, 'Interpolated', rng.choice(['Ice Sheet', 'Ocean', 'Granite'], n))
+    pd.DataFrame({
+        'latitude': lats.ravel(),
+        'longitude': lons.ravel(),
+        'k_value': rng.choice([0.03, 0.0003, 0.0305, 0.05], n),
+        'description': descriptions,
+    }).to_csv(tmp_path / 'global_complete_k_values.csv', index=False)
+
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop('k_test2', None)
+    module = importlib.import_module('k_test2')
+    yield module
+    sys.modules.pop('k_test2', None)
+
+
+def test_lookup_points_matches_k_test2_including_the_poles(k_test2):
+    center_lat, center_lon = tile_centers(TILE_SIZE)
+    polar_rows = list(range(4)) + list(range(center_lat.shape[0] - 4, center_lat.shape[0]))
+    sample = np.random.default_rng(1).choice(center_lat.size, 500, replace=False)
+    lat = np.concatenate([center_lat[polar_rows].ravel(), center_lat.ravel()[sample]])
+    lon = np.concatenate([center_lon[polar_rows].ravel(), center_lon.ravel()[sample]])
+
+    arrays, table = encode_dataset(k_test2.df)
+    nearest, code, similar = lookup_points(k_test2.tree, arrays, lat, lon)
+
+    for i in range(len(lat)):
+        point, description, is_similar = k_test2.find_k_description_and_similarity(lat[i], lon[i])
+        assert arrays["k_value"][nearest[i]] == point["k_value"]
+        assert (table[code[i]] if code[i] >= 0 else None) == description
+        assert similar[i] == is_similar
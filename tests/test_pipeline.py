@@ -0,0 +1,53 @@
+import pytest
+
+import pipeline
+
+# make.py copies source.txt into made.txt; use.py reads a file nothing declares and
+# writes used.txt, so it only follows make.py through "after"; env.py records $GREETING
+MAKE = "open('made.txt', 'w').write(open('source.txt').read())\n"
+USE = "open('used.txt', 'w').write(open('side.txt').read() + open('made.txt').read())\n"
+ENV = "import os\nopen('env.txt', 'w').write(os.environ['GREETING'])\n"
+
+
+@pytest.fixture
+def stages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, text in {"make.py": MAKE, "use.py": USE, "env.py": ENV, "source.txt": "a", "side.txt": "s"}.items():
+        (tmp_path / name).write_text(text)
+    stages = {
+        "make": {"script": "make.py", "inputs": ["source.txt"], "outputs": ["made.txt"]},
+        "use": {"script": "use.py", "inputs": ["side.txt"], "outputs": ["used.txt"], "after": ["make"]},
+        "env": {"script": "env.py", "inputs": [], "outputs": ["env.txt"], "env": {"GREETING": "hello"}},
+    }
+    monkeypatch.setattr(pipeline, "STAGES", stages)
+    monkeypatch.setattr(pipeline, "_file_hashes", {})
+    return stages
+
+
+def _results(report):
+    return {name: result for name, result, _ in report}
+
+
+def test_after_edge_reruns_the_stage_when_upstream_output_changes(stages, tmp_path):
+    assert _results(pipeline.run_pipeline(jobs=1)) == {"make": "ran", "use": "ran", "env": "ran"}
+    assert _results(pipeline.run_pipeline(jobs=1))["use"] == "up to date"
+
+    (tmp_path / "source.txt").write_text("b")
+    assert _results(pipeline.run_pipeline(["use"], jobs=1)) == {"make": "ran", "use": "ran"}
+    assert (tmp_path / "used.txt").read_text() == "sb"
+
+
+def test_env_is_passed_and_part_of_the_fingerprint(stages, tmp_path):
+    pipeline.run_pipeline(["env"], jobs=1)
+    assert (tmp_path / "env.txt").read_text() == "hello"
+    assert _results(pipeline.run_pipeline(["env"], jobs=1)) == {"env": "up to date"}
+
+    stages["env"]["env"] = {"GREETING": "bonjour"}
+    assert _results(pipeline.run_pipeline(["env"], jobs=1)) == {"env": "ran"}
+    assert (tmp_path / "env.txt").read_text() == "bonjour"
+
+
+def test_rock_declares_its_inputs():
+    rock = pipeline.STAGES["rock"]
+    assert rock["inputs"] == ["lith_defs.json"]
+    assert "{lith_id}" in rock["env"]["MACROSTRAT_URL_TEMPLATE"]
@@ -0,0 +1,55 @@
+import pytest
+
+from query_cache import QuantizedLRUCache
+
+
+def _versioned_cache():
+    state = {"version": 1, "checks": 0}
+
+    def version():
+        state["checks"] += 1
+        return state["version"]
+
+    return QuantizedLRUCache(version=version), state
+
+
+def test_result_from_before_a_refresh_is_not_stored():
+    cache, state = _versioned_cache()
+
+    def lookup(lat, lon):
+        # The data changes (and a batch notices) while this lookup is running
+        state["version"] = 2
+        cache.refresh()
+        return {"k_value": 1.0}, "old data"
+
+    cached = cache.wrap(lookup)
+    assert cached(10.0, 20.0)[1] == "old data"
+    assert cache.stats()["size"] == 0
+
+
+def test_version_is_checked_once_per_batch():
+    cache, state = _versioned_cache()
+    calls = []
+    cached = cache.wrap(lambda lat, lon: (calls.append((lat, lon)) or {"k_value": lat}, None))
+    checks = state["checks"]
+
+    cached.batch([(1.0, 2.0), (3.0, 4.0), (1.0, 2.0)])
+    assert state["checks"] == checks + 1
+    assert calls == [(1.0, 2.0), (3.0, 4.0)]
+
+    state["version"] = 2
+    cached(1.0, 2.0)
+    assert len(calls) == 2  # single lookups don't check the version
+    cached.batch([(1.0, 2.0)])
+    assert len(calls) == 3
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_cached_results_are_shared_and_read_only():
+    cache = QuantizedLRUCache()
+    cached = cache.wrap(lambda lat, lon: ({"k_value": 0.5}, "granite"))
+
+    first = cached(1.0, 2.0)
+    assert cached(1.0, 2.0) is first
+    with pytest.raises(TypeError):
+        first[0]["k_value"] = 0.0
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+
+import pytest
+from aiohttp import web
+
+import rock
+
+LITH = {"success": {"data": [{"col_id": 1, "lat": 41.5, "lng": -112.25}]}}
+ETAG = '"lith-v1"'
+LAST_MODIFIED = 'Tue, 06 Oct 2026 08:00:00 GMT'
+
+
+class StubMacrostrat:
+    """Stands in for the Macrostrat API: replays queued error statuses per lith_id, then serves LITH."""
+
+    def __init__(self):
+        self.errors = {}
+        self.requests = []
+
+    async def columns(self, request):
+        lith_id = int(request.query['lith_id'])
+        self.requests.append((lith_id, dict(request.headers)))
+        if self.errors.get(lith_id):
+            return web.Response(status=self.errors[lith_id].pop(0))
+        if request.headers.get('If-None-Match') == ETAG:
+            return web.Response(status=304)
+        return web.json_response(LITH, headers={'ETag': ETAG, 'Last-Modified': LAST_MODIFIED}, dumps=json.dumps)
+
+
+def _fetch_all(server, ids, concurrency=rock.CONCURRENCY):
+    async def run():
+        app = web.Application()
+        app.router.add_get('/columns', server.columns)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            return await rock.fetch_all(ids, f'http://127.0.0.1:{port}/columns?lith_id={{lith_id}}', concurrency)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rock, 'BACKOFF_SECONDS', 0.05)
+    return tmp_path
+
+
+def test_200_writes_compact_json():
+    assert _fetch_all(StubMacrostrat(), [1]) == {1: 'updated'}
+
+    with open(rock.lith_path(1), 'rb') as f:
+        assert f.read() == json.dumps(LITH, separators=(',', ':')).encode('utf-8')
+    with open(rock.validators_file) as f:
+        assert json.load(f) == {"1": {"etag": ETAG, "last_modified": LAST_MODIFIED}}
+
+
+def test_validators_are_sent_back_and_304_leaves_the_file_untouched():
+    server = StubMacrostrat()
+    _fetch_all(server, [1])
+    os.utime(rock.lith_path(1), (1_000_000, 1_000_000))
+
+    assert _fetch_all(server, [1]) == {1: 'unchanged'}
+
+    headers = server.requests[-1][1]
+    assert headers['If-None-Match'] == ETAG
+    assert headers['If-Modified-Since'] == LAST_MODIFIED
+    assert os.stat(rock.lith_path(1)).st_mtime == 1_000_000
+    with open(rock.lith_path(1), 'rb') as f:
+        assert f.read() == json.dumps(LITH, separators=(',', ':')).encode('utf-8')
+
+
+def test_no_validators_without_a_saved_file():
+    server = StubMacrostrat()
+    _fetch_all(server, [1])
+    os.remove(rock.lith_path(1))
+
+    assert _fetch_all(server, [1]) == {1: 'updated'}
+    assert 'If-None-Match' not in server.requests[-1][1]
+
+
+def test_429_and_5xx_are_retried_with_backoff():
+    server = StubMacrostrat()
+    server.errors[1] = [429, 503]
+    server.errors[2] = [404]
+
+    assert _fetch_all(server, [1, 2]) == {1: 'updated', 2: 'failed'}
+    assert [lith_id for lith_id, _ in server.requests].count(1) == 3
+    assert [lith_id for lith_id, _ in server.requests].count(2) == 1
+
+
+def test_backoff_does_not_hold_a_concurrency_slot():
+    server = StubMacrostrat()
+    server.errors[1] = [429]
+
+    assert _fetch_all(server, [1, 2, 3], concurrency=1) == {1: 'updated', 2: 'updated', 3: 'updated'}
+    # While lith 1 waits to retry, the single slot serves the others
+    assert [lith_id for lith_id, _ in server.requests] == [1, 2, 3, 1]
+
+
+def test_failed_retries_give_up():
+    server = StubMacrostrat()
+    server.errors[1] = [500] * (rock.RETRIES + 1)
+
+    assert _fetch_all(server, [1]) == {1: 'failed'}
+    assert len(server.requests) == rock.RETRIES + 1
+    assert not os.path.exists(rock.lith_path(1))
+
+
+def test_write_if_changed_skips_identical_content(workdir):
+    path = str(workdir / 'lith_1.json')
+    assert rock.write_if_changed(path, b'{"a":1}')
+    os.utime(path, (1_000_000, 1_000_000))
+
+    assert not rock.write_if_changed(path, b'{"a":1}')
+    assert os.stat(path).st_mtime == 1_000_000
+
+    assert rock.write_if_changed(path, b'{"a":2}')
+    with open(path, 'rb') as f:
+        assert f.read() == b'{"a":2}'
+    assert os.listdir(workdir) == ['lith_1.json']
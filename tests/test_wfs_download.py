@@ -0,0 +1,121 @@
+import os
+
+from checkpoint_io import read_checkpoint
+from wfs_download import TileDownloader, download_checkpoints, read_tiles, scan_tiles
+
+SIZE = 0.2  # Each feature is a SIZE x SIZE square
+
+
+def _gml(features, matched, extra=None):
+    """A WFS 2.0 GetFeature response holding `features` (id, lon, lat) out of `matched`."""
+    members = ''.join(
+        f'<wfs:member><ms:Units gml:id="Units.{i}"><ms:msGeometry><gml:Polygon gml:id="p{i}" srsName="urn:ogc:def:crs:EPSG::4326">'
+        f'<gml:exterior><gml:LinearRing><gml:posList srsDimension="2">'
+        f'{lat} {lon} {lat + SIZE} {lon} {lat + SIZE} {lon + SIZE} {lat} {lon + SIZE} {lat} {lon}'
+        f'</gml:posList></gml:LinearRing></gml:exterior></gml:Polygon></ms:msGeometry>'
+        f'<ms:LITHO_EN>granite {i}</ms:LITHO_EN>{(extra or {}).get(i, "")}</ms:Units></wfs:member>'
+        for i, lon, lat in features)
+    return (f'<?xml version="1.0" encoding="UTF-8"?><wfs:FeatureCollection xmlns:ms="http://mapserver.gis.umn.edu/mapserver" '
+            f'xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:wfs="http://www.opengis.net/wfs/2.0" '
+            f'numberMatched="{matched}" numberReturned="{len(features)}">{members}</wfs:FeatureCollection>').encode()
+
+
+class StubWFS:
+    """Stands in for the server: a bbox-intersect query that returns at most max_features."""
+
+    def __init__(self, features, max_features, extra=None):
+        self.features = features
+        self.max_features = max_features
+        self.extra = extra
+        self.requests = []
+
+    def __call__(self, bbox):
+        self.requests.append(bbox)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        hits = [f for f in self.features
+                if f[1] <= max_lon and f[1] + SIZE >= min_lon and f[2] <= max_lat and f[2] + SIZE >= min_lat]
+        return _gml(hits[:self.max_features], len(hits), self.extra)
+
+
+def _downloader(fetch, tmp_path, max_features, **kwargs):
+    return TileDownloader(fetch, 'ms:Units', cache_folder=str(tmp_path / 'wfs_cache'), workers=2,
+                          rate=1000, burst=100, max_features=max_features, backoff_seconds=0, **kwargs)
+
+
+def _dense_features():
+    # 60 features spread over the (0, 0, 10, 10) tile, plus a few over the rest of the continent
+    features = [(i, 0.3 + i % 10, 0.3 + (i // 10) * 1.6) for i in range(60)]
+    return features + [(100, 12.5, 3.5), (101, 7.5, 17.5), (102, 17.0, 12.0)]
+
+
+def test_truncated_tile_is_split_into_quadrants(tmp_path):
+    fetch = StubWFS(_dense_features(), max_features=50)
+    downloader = _downloader(fetch, tmp_path, max_features=50)
+
+    paths, failed = downloader.download([(0, 0, 10, 10)])
+
+    assert failed == []
+    assert fetch.requests[0] == (0, 0, 10, 10)
+    assert os.path.exists(downloader.split_path((0, 0, 10, 10)))
+    assert not os.path.exists(downloader.tile_path((0, 0, 10, 10)))
+    assert (0, 0, 5.0, 5.0) in fetch.requests
+    assert paths == [downloader.tile_path(child) for child in
+                     [(0, 0, 5.0, 5.0), (0, 5.0, 5.0, 10), (5.0, 0, 10, 5.0), (5.0, 5.0, 10, 10)]]
+
+
+def test_rerun_resumes_from_cached_tiles(tmp_path):
+    fetch = StubWFS(_dense_features(), max_features=50)
+    downloader = _downloader(fetch, tmp_path, max_features=50)
+    continents = {"Africa": (0, 0, 20, 20)}
+
+    assert download_checkpoints(downloader, continents, 10, str(tmp_path / 'out')) == []
+    first_run = len(fetch.requests)
+    os.remove(tmp_path / 'out' / 'Africa_geology.fgb')
+    os.remove(downloader.tile_path((10, 10, 20, 20)))
+
+    assert download_checkpoints(downloader, continents, 10, str(tmp_path / 'out')) == []
+    assert fetch.requests[first_run:] == [(10, 10, 20, 20)]
+    assert len(read_checkpoint(str(tmp_path / 'out' / 'Africa_geology.fgb'))) == 63
+
+
+def test_features_on_tile_edges_are_kept_once(tmp_path):
+    # Both squares straddle the 10° edges, so they come back from two and four tiles
+    features = [(1, 9.9, 5.0), (2, 9.9, 9.9), (3, 2.0, 2.0)]
+    downloader = _downloader(StubWFS(features, max_features=50), tmp_path, max_features=50)
+
+    download_checkpoints(downloader, {"Africa": (0, 0, 20, 20)}, 10, str(tmp_path / 'out'))
+
+    gdf = read_checkpoint(str(tmp_path / 'out' / 'Africa_geology.fgb'))
+    assert sorted(gdf['gml_id']) == ['Units.1', 'Units.2', 'Units.3']
+
+
+def test_tile_truncated_at_the_minimum_size_fails(tmp_path):
+    # 20 features in one spot: no quadrant of any size gets them under 10
+    features = [(i, 2.0, 2.0) for i in range(20)]
+    downloader = _downloader(StubWFS(features, max_features=10), tmp_path, max_features=10, min_tile_degrees=2)
+
+    kind, error = downloader._download((2.0, 2.0, 4.0, 4.0))
+    assert kind == 'failed'
+    assert isinstance(error, ValueError) and "minimum tile size" in str(error)
+    assert not os.path.exists(downloader.tile_path((2.0, 2.0, 4.0, 4.0)))
+
+    assert download_checkpoints(downloader, {"Africa": (0, 0, 10, 10)}, 10, str(tmp_path / 'out')) == ["Africa"]
+    assert not os.path.exists(tmp_path / 'out' / 'Africa_geology.fgb')
+
+
+def test_tiles_with_different_columns_stream_into_one_schema(tmp_path):
+    features = [(1, 2.0, 2.0), (2, 12.0, 2.0)]
+    extra = {2: '<ms:AGE>410</ms:AGE>'}
+    downloader = _downloader(StubWFS(features, max_features=50, extra=extra), tmp_path, max_features=50)
+    paths, _ = downloader.download([(0, 0, 10, 10), (10, 0, 20, 10)])
+
+    paths, columns, unreadable = scan_tiles(paths)
+    assert unreadable == []
+    assert columns == {'gml_id': None, 'LITHO_EN': None, 'AGE': 'float64'}
+    tiles = list(read_tiles(paths, columns))
+    assert [tile.columns.tolist() for tile in tiles] == [['gml_id', 'LITHO_EN', 'AGE', 'geometry']] * 2
+
+    download_checkpoints(downloader, {"Africa": (0, 0, 20, 10)}, 10, str(tmp_path / 'out'))
+    gdf = read_checkpoint(str(tmp_path / 'out' / 'Africa_geology.fgb'))
+    assert gdf['AGE'].isna().tolist() == [True, False]
+    assert gdf['AGE'].iloc[1] == 410
@@ -0,0 +1,117 @@
+import json
+import math
+import numpy as np
+
+# --- 1. CONFIGURATION (Must match the precomputation script) ---
+CACHE_FILE = "tile_k_values_cache.json"
+TILE_SIZE = (3, 3)
+END_POS = (3085, 1542)
+NO_DESCRIPTION_CODE = -1
+DESCRIPTIONS_KEY = "descriptions"  # Reserved cache key holding the description code table
+
+# --- 2. TILE GEOMETRY ---
+def tile_grid_shape(tile_size=TILE_SIZE):
+    """Returns the (rows, cols) of the tile grid covering END_POS for a tile size in pixels."""
+    return (math.ceil(END_POS[1] / tile_size[1]), math.ceil(END_POS[0] / tile_size[0]))
+
+def latlon_to_pixel(lat, lon):
+    """Converts lat/lon (scalars or arrays) to the pixel coordinate system."""
+    pixel_x = (np.asarray(lon, dtype=np.float64) / 360.0 + 0.5) * END_POS[0]
+    pixel_y = (np.asarray(lat, dtype=np.float64) / 180.0 + 0.5) * END_POS[1]
+    return pixel_x, pixel_y
+
+def pixel_to_latlon(pixel_x, pixel_y):
+    """Converts pixel coordinates (scalars or arrays) to lat/lon."""
+    lat = 90.0 * 2.0 * (np.asarray(pixel_y, dtype=np.float64) / END_POS[1] - 0.5)
+    lon = 180.0 * 2.0 * (np.asarray(pixel_x, dtype=np.float64) / END_POS[0] - 0.5)
+    return lat, lon
+
+def tile_centers(tile_size=TILE_SIZE):
+    """Returns (lat, lon) arrays of shape (rows, cols) holding every tile center."""
+    rows, cols = tile_grid_shape(tile_size)
+    pixel_x = np.arange(cols) * tile_size[0] + tile_size[0] / 2.0
+    pixel_y = np.arange(rows) * tile_size[1] + tile_size[1] / 2.0
+    grid_x, grid_y = np.meshgrid(pixel_x, pixel_y)
+    return pixel_to_latlon(grid_x, grid_y)
+
+# --- 3. DENSE GRID LOADING ---
+def load_tile_grid(cache_file=CACHE_FILE):
+    """
+    Loads a "x,y"-keyed tile cache JSON into dense, row-major (tile_y, tile_x) arrays.
+
+    Returns:
+        tuple: (k_grid, code_grid, similar_grid, descriptions). Tiles missing from the
+        cache are NaN in k_grid; caches without description codes give all-missing codes.
+    """
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        return cache_to_tile_grid(json.load(f))
+
+def cache_to_tile_grid(cache):
+    """Same as load_tile_grid, for a cache dict that is already loaded (not modified)."""
+    descriptions = cache.get(DESCRIPTIONS_KEY, [])
+
+    rows, cols = tile_grid_shape()
+    k_grid = np.full((rows, cols), np.nan, dtype=np.float64)
+    code_grid = np.full((rows, cols), NO_DESCRIPTION_CODE, dtype=np.int32)
+    similar_grid = np.zeros((rows, cols), dtype=bool)
+
+    for key, tile in cache.items():
+        if key == DESCRIPTIONS_KEY:
+            continue
+        tile_x, tile_y = map(int, key.split(","))
+        if not (0 <= tile_x < cols and 0 <= tile_y < rows):
+            continue
+        k_grid[tile_y, tile_x] = tile.get("k_value", np.nan)
+        code_grid[tile_y, tile_x] = tile.get("description_code", NO_DESCRIPTION_CODE)
+        similar_grid[tile_y, tile_x] = tile.get("similar", False)
+
+    return k_grid, code_grid, similar_grid, descriptions
+
+def tile_grid_to_cache(k_grid, code_grid, similar_grid, descriptions):
+    """Converts dense tile arrays back into the "x,y"-keyed cache dict written by k_test2.py."""
+    rows, cols = k_grid.shape
+    cache = {}
+    for tile_y in range(rows):
+        for tile_x in range(cols):
+            cache[f"{tile_x},{tile_y}"] = {
+                "k_value": float(k_grid[tile_y, tile_x]),
+                "description_code": int(code_grid[tile_y, tile_x]),
+                "similar": bool(similar_grid[tile_y, tile_x])
+            }
+    cache[DESCRIPTIONS_KEY] = list(descriptions)
+    return cache
+
+# --- 4. SUB-TILE INTERPOLATION ---
+def bilinear_sample(k_grid, lat, lon, tile_size=TILE_SIZE):
+    """
+    Blends the four tile centers surrounding each lat/lon bilinearly (scalars or arrays).
+
+    Longitude wraps across the antimeridian: the neighbor on the other side is placed a
+    full END_POS width (360 degrees) away, since the last tile column overhangs END_POS.
+    Latitude is clamped, so queries beyond the outermost tile centers use the edge row.
+    Missing (NaN) tiles are skipped and the remaining weights renormalized.
+    """
+    rows, cols = k_grid.shape
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -90.0, 90.0)
+    lon = (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+    pixel_x, pixel_y = latlon_to_pixel(lat, lon)
+
+    x0 = np.floor(pixel_x / tile_size[0] - 0.5).astype(np.int64)
+    x1 = x0 + 1
+    center_x0 = (x0 + 0.5) * tile_size[0] + np.where(x0 < 0, cols * tile_size[0] - END_POS[0], 0)
+    center_x1 = (x1 + 0.5) * tile_size[0] + np.where(x1 >= cols, END_POS[0] - cols * tile_size[0], 0)
+    x0, x1 = x0 % cols, x1 % cols
+    weight_x = np.clip((pixel_x - center_x0) / (center_x1 - center_x0), 0.0, 1.0)
+
+    fy = pixel_y / tile_size[1] - 0.5
+    y0 = np.clip(np.floor(fy).astype(np.int64), 0, rows - 1)
+    y1 = np.clip(y0 + 1, 0, rows - 1)
+    weight_y = np.clip(fy - y0, 0.0, 1.0)
+
+    corners = np.stack([k_grid[y0, x0], k_grid[y0, x1], k_grid[y1, x0], k_grid[y1, x1]])
+    weights = np.stack([(1 - weight_x) * (1 - weight_y), weight_x * (1 - weight_y),
+                        (1 - weight_x) * weight_y, weight_x * weight_y])
+    valid = ~np.isnan(corners)
+    total = (weights * valid).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, (np.where(valid, corners, 0.0) * weights).sum(axis=0) / total, np.nan)
@@ -0,0 +1,135 @@
+import json
+import os
+import numpy as np
+from tile_grid import CACHE_FILE, TILE_SIZE, load_tile_grid, latlon_to_pixel
+
+# --- 1. CONFIGURATION ---
+PYRAMID_FOLDER = "tile_pyramid"
+MANIFEST_FILE = "manifest.json"
+STATS = ("mean", "min", "max", "mode")
+BLOCK = 2  # Each coarser level merges BLOCK x BLOCK tiles of the level below
+
+# --- 2. BLOCK AGGREGATION ---
+def _blocks(grid, fill):
+    """Pads a 2D grid to a multiple of BLOCK and returns it as (rows, cols, BLOCK*BLOCK) blocks."""
+    rows, cols = grid.shape
+    pad_rows, pad_cols = (-rows) % BLOCK, (-cols) % BLOCK
+    padded = np.pad(grid, ((0, pad_rows), (0, pad_cols)), constant_values=fill)
+    out_rows, out_cols = padded.shape[0] // BLOCK, padded.shape[1] // BLOCK
+    blocks = padded.reshape(out_rows, BLOCK, out_cols, BLOCK).swapaxes(1, 2)
+    return blocks.reshape(out_rows, out_cols, BLOCK * BLOCK)
+
+def _block_mode(blocks):
+    """Most frequent value per block, ignoring NaN (ties go to the first value in the block)."""
+    counts = (blocks[..., :, None] == blocks[..., None, :]).sum(axis=-1)
+    first_most_common = counts.argmax(axis=-1)[..., None]
+    return np.take_along_axis(blocks, first_most_common, axis=-1)[..., 0]
+
+def aggregate_level(level):
+    """Derives the next coarser level from a level dict of stat arrays plus valid-tile counts."""
+    counts = _blocks(level["count"], 0)
+    count = counts.sum(axis=-1)
+
+    weighted = _blocks(np.where(level["count"] > 0, level["mean"] * level["count"], 0.0), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, weighted.sum(axis=-1) / count, np.nan)
+
+    mins = _blocks(np.nan_to_num(level["min"], nan=np.inf), np.inf).min(axis=-1)
+    maxs = _blocks(np.nan_to_num(level["max"], nan=-np.inf), -np.inf).max(axis=-1)
+
+    return {
+        "mean": mean,
+        "min": np.where(np.isfinite(mins), mins, np.nan),
+        "max": np.where(np.isfinite(maxs), maxs, np.nan),
+        # Mode of the child modes; exact mode over all fine tiles would cost O(block^2) per tile
+        "mode": _block_mode(_blocks(level["mode"], np.nan)),
+        "count": count.astype(np.int32)
+    }
+
+def build_pyramid(k_grid):
+    """Builds every zoom level from the finest k grid, down to a single tile."""
+    valid = ~np.isnan(k_grid)
+    levels = [{
+        "mean": k_grid, "min": k_grid, "max": k_grid, "mode": k_grid,
+        "count": valid.astype(np.int32)
+    }]
+    while levels[-1]["count"].shape != (1, 1):
+        levels.append(aggregate_level(levels[-1]))
+    return levels
+
+# --- 3. STORAGE ---
+def level_tile_size(level):
+    """Tile size in pixels at a zoom level (level 0 is the precomputed cache)."""
+    return (TILE_SIZE[0] * BLOCK ** level, TILE_SIZE[1] * BLOCK ** level)
+
+def level_path(level, stat, folder=PYRAMID_FOLDER):
+    return os.path.join(folder, f"level{level}_{stat}.npy")
+
+def save_pyramid(levels, folder=PYRAMID_FOLDER):
+    """Saves each level and stat as its own .npy array plus a manifest describing the levels."""
+    os.makedirs(folder, exist_ok=True)
+    manifest = {"tile_size": list(TILE_SIZE), "block": BLOCK, "stats": list(STATS), "levels": []}
+
+    for n, level in enumerate(levels):
+        for stat in STATS + ("count",):
+            np.save(level_path(n, stat, folder), level[stat])
+        manifest["levels"].append({
+            "level": n,
+            "tile_size": list(level_tile_size(n)),
+            "shape": list(level["count"].shape)
+        })
+
+    with open(os.path.join(folder, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def load_level(level, stat="mean", folder=PYRAMID_FOLDER):
+    """Memory-maps one level/stat array, so only the tiles actually read are loaded."""
+    return np.load(level_path(level, stat, folder), mmap_mode='r')
+
+# --- 4. QUERY FUNCTIONS ---
+def level_tile_index(lat, lon, level):
+    """Converts lat/lon (scalars or arrays) to (tile_y, tile_x) indices at a zoom level."""
+    pixel_x, pixel_y = latlon_to_pixel(lat, lon)
+    tile_size = level_tile_size(level)
+    return (np.floor(pixel_y / tile_size[1]).astype(np.int64),
+            np.floor(pixel_x / tile_size[0]).astype(np.int64))
+
+def get_k_from_pyramid(lat, lon, level=0, stat="mean", folder=PYRAMID_FOLDER):
+    """Returns the aggregated k-value for the tile containing lat/lon at a zoom level, or None."""
+    grid = load_level(level, stat, folder)
+    tile_y, tile_x = level_tile_index(lat, lon, level)
+    if not (0 <= tile_y < grid.shape[0] and 0 <= tile_x < grid.shape[1]):
+        return None # The coordinate is outside the precomputed grid
+    k_value = float(grid[tile_y, tile_x])
+    return None if np.isnan(k_value) else k_value
+
+def read_window(lat_min, lon_min, lat_max, lon_max, level, stat="mean", folder=PYRAMID_FOLDER):
+    """Reads the block of tiles covering a lat/lon box at a zoom level (I/O bounded by the window)."""
+    grid = load_level(level, stat, folder)
+    y0, x0 = level_tile_index(lat_min, lon_min, level)
+    y1, x1 = level_tile_index(lat_max, lon_max, level)
+    y0, x0 = max(int(y0), 0), max(int(x0), 0)
+    y1, x1 = min(int(y1) + 1, grid.shape[0]), min(int(x1) + 1, grid.shape[1])
+    return np.array(grid[y0:y1, x0:x1])
+
+# --- 5. MAIN EXECUTION ---
+def main():
+    print(f"Loading finest level from '{CACHE_FILE}'...")
+    if not os.path.exists(CACHE_FILE):
+        print(f"\nFatal Error: Cache file not found at '{CACHE_FILE}'.")
+        print("Please run the precomputation script first.")
+        exit()
+
+    k_grid, _, _, _ = load_tile_grid(CACHE_FILE)
+    print(f"Finest level has {k_grid.shape[1]} x {k_grid.shape[0]} tiles.")
+
+    levels = build_pyramid(k_grid)
+    save_pyramid(levels, PYRAMID_FOLDER)
+
+    for n, level in enumerate(levels):
+        rows, cols = level["count"].shape
+        print(f"  Level {n}: {cols} x {rows} tiles, tile size {level_tile_size(n)} px")
+    print(f"✅ Saved {len(levels)} levels to '{PYRAMID_FOLDER}'")
+
+if __name__ == "__main__":
+    main()
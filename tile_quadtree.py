@@ -0,0 +1,149 @@
+import os
+import numpy as np
+from tile_grid import CACHE_FILE, TILE_SIZE, latlon_to_pixel, load_tile_grid
+
+# --- 1. CONFIGURATION ---
+QUADTREE_FILE = "tile_k_values_quadtree.npz"
+
+# --- 2. QUADTREE GRID ---
+class QuadtreeGrid:
+    """
+    Lossless quadtree encoding of a 2D grid that collapses uniform square blocks.
+
+    The grid is padded (with NaN) to a power-of-two square and stored as one int32 array
+    in breadth-first order: an entry >= 0 is an internal node holding the index of its
+    four contiguous children (top-left, top-right, bottom-left, bottom-right); an entry
+    < 0 is a leaf whose value is values[-entry - 1]. Oceans and ice sheets at a constant
+    k collapse into a handful of leaves, and every value (including NaN) is kept exactly.
+    """
+
+    def __init__(self, nodes, values, shape, side):
+        self.nodes = nodes
+        self.values = values
+        self.shape = tuple(shape)
+        self.side = int(side)
+
+    @classmethod
+    def encode(cls, grid):
+        grid = np.asarray(grid, dtype=np.float64)
+        side = 1 << int(np.ceil(np.log2(max(max(grid.shape), 1))))
+        padded = np.full((side, side), np.nan)
+        padded[:grid.shape[0], :grid.shape[1]] = grid
+        values, codes = np.unique(padded, return_inverse=True)
+        codes = codes.reshape(side, side).astype(np.int64)
+
+        # Bottom-up: uniform[level] holds each block's shared code, or -1 if it is mixed
+        uniform = [codes]
+        while uniform[-1].shape[0] > 1:
+            child = uniform[-1]
+            n = child.shape[0] // 2
+            quads = child.reshape(n, 2, n, 2).swapaxes(1, 2).reshape(n, n, 4)
+            same = (quads[..., 0] >= 0) & (quads == quads[..., :1]).all(axis=-1)
+            uniform.append(np.where(same, quads[..., 0], -1))
+
+        # Top-down, breadth-first: children of a level's internal nodes form the next level
+        nodes = []
+        ys, xs = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        level_start = 0
+        for level in range(len(uniform) - 1, -1, -1):
+            block = uniform[level][ys, xs]
+            internal = block < 0
+            entries = np.where(internal, 0, -block - 1)
+            first_child = level_start + len(ys) + 4 * (np.cumsum(internal) - 1)
+            entries[internal] = first_child[internal]
+            nodes.append(entries)
+            level_start += len(ys)
+            ys = (2 * ys[internal])[:, None] + np.array([0, 0, 1, 1])
+            xs = (2 * xs[internal])[:, None] + np.array([0, 1, 0, 1])
+            ys, xs = ys.ravel(), xs.ravel()
+
+        return cls(np.concatenate(nodes).astype(np.int32), values, grid.shape, side)
+
+    # --- Storage ---
+    def save(self, path=QUADTREE_FILE):
+        np.savez_compressed(path, nodes=self.nodes, values=self.values,
+                            shape=np.array(self.shape), side=np.array(self.side))
+
+    @classmethod
+    def load(cls, path=QUADTREE_FILE):
+        with np.load(path) as data:
+            return cls(data["nodes"], data["values"], data["shape"], data["side"])
+
+    # --- Lookup ---
+    def lookup(self, tile_y, tile_x):
+        """Values at tile indices (scalars or arrays) in O(log n); NaN outside the grid."""
+        if np.ndim(tile_y) == 0 and np.ndim(tile_x) == 0:
+            return self._lookup_one(int(tile_y), int(tile_x))
+        tile_y, tile_x = np.broadcast_arrays(np.asarray(tile_y, dtype=np.int64), np.asarray(tile_x, dtype=np.int64))
+        outside = (tile_y < 0) | (tile_y >= self.shape[0]) | (tile_x < 0) | (tile_x >= self.shape[1])
+        y, x = np.where(outside, 0, tile_y), np.where(outside, 0, tile_x)
+        node = np.zeros(y.shape, dtype=np.int64)
+        half = self.side // 2
+        entry = self.nodes[node].astype(np.int64)
+        while half >= 1 and (entry >= 0).any():
+            descend = entry >= 0
+            quadrant = (y >= half) * 2 + (x >= half)
+            node = np.where(descend, entry + quadrant, node)
+            y, x = np.where(descend, y % half, y), np.where(descend, x % half, x)
+            half //= 2
+            entry = self.nodes[node].astype(np.int64)
+        return np.where(outside, np.nan, self.values[-entry - 1])
+
+    def _lookup_one(self, y, x):
+        if not (0 <= y < self.shape[0] and 0 <= x < self.shape[1]):
+            return float('nan')
+        entry, half = int(self.nodes[0]), self.side // 2
+        while entry >= 0:
+            entry = int(self.nodes[entry + (y >= half) * 2 + (x >= half)])
+            y, x, half = y % half, x % half, half // 2
+        return float(self.values[-entry - 1])
+
+    def lookup_latlon(self, lat, lon, tile_size=TILE_SIZE):
+        """Value of the tile containing each lat/lon, as sample_pre.get_k_from_cache would return."""
+        pixel_x, pixel_y = latlon_to_pixel(lat, lon)
+        return self.lookup(np.floor(pixel_y / tile_size[1]).astype(np.int64),
+                           np.floor(pixel_x / tile_size[0]).astype(np.int64))
+
+    def decode_window(self, y0, x0, y1, x1):
+        """Dense array of rows y0:y1 and columns x0:x1, filling whole uniform blocks at once."""
+        y0, x0 = max(y0, 0), max(x0, 0)
+        y1, x1 = min(y1, self.shape[0]), min(x1, self.shape[1])
+        window = np.empty((max(y1 - y0, 0), max(x1 - x0, 0)))
+        stack = [(0, 0, 0, self.side)]
+        while stack:
+            node, top, left, size = stack.pop()
+            if top >= y1 or left >= x1 or top + size <= y0 or left + size <= x0:
+                continue
+            entry = int(self.nodes[node])
+            if entry < 0:
+                window[max(top, y0) - y0:min(top + size, y1) - y0,
+                       max(left, x0) - x0:min(left + size, x1) - x0] = self.values[-entry - 1]
+                continue
+            half = size // 2
+            for quadrant, (dy, dx) in enumerate(((0, 0), (0, half), (half, 0), (half, half))):
+                stack.append((entry + quadrant, top + dy, left + dx, half))
+        return window
+
+    def decode(self):
+        return self.decode_window(0, 0, self.shape[0], self.shape[1])
+
+# --- 3. MAIN EXECUTION ---
+def main():
+    print(f"Loading tile grid from '{CACHE_FILE}'...")
+    if not os.path.exists(CACHE_FILE):
+        print(f"\nFatal Error: Cache file not found at '{CACHE_FILE}'.")
+        print("Please run the precomputation script first.")
+        exit()
+
+    k_grid = load_tile_grid(CACHE_FILE)[0]
+    tree = QuadtreeGrid.encode(k_grid)
+    tree.save(QUADTREE_FILE)
+
+    identical = np.array_equal(tree.decode(), k_grid, equal_nan=True)
+    print(f"✅ Encoded {k_grid.size} tiles into {len(tree.nodes)} nodes ({len(tree.values)} distinct values).")
+    print(f"  JSON cache: {os.path.getsize(CACHE_FILE) / (1024 * 1024):.2f} MB")
+    print(f"  Quadtree:   {os.path.getsize(QUADTREE_FILE) / (1024 * 1024):.2f} MB")
+    print(f"  Decodes to identical values: {identical}")
+
+if __name__ == "__main__":
+    main()
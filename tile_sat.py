@@ -0,0 +1,162 @@
+import os
+import numpy as np
+from tile_grid import CACHE_FILE, TILE_SIZE, latlon_to_pixel, load_tile_grid, pixel_to_latlon
+
+# --- 1. CONFIGURATION ---
+SAT_FOLDER = "tile_k_values_sat"
+EARTH_RADIUS_KM = 6371.0
+DISK_STRIPS = 8  # Rectangles used to approximate a disk footprint
+
+# --- 2. SUMMED-AREA TABLES ---
+def build_summed_area(k_grid):
+    """
+    Integral images of k and of valid-tile counts, padded with a leading zero row/column.
+
+    sat[y, x] holds the sum over grid[:y, :x], so any tile rectangle costs four lookups.
+    Missing (NaN) tiles add nothing to either table.
+    """
+    valid = ~np.isnan(k_grid)
+    sat_k = np.zeros((k_grid.shape[0] + 1, k_grid.shape[1] + 1), dtype=np.float64)
+    sat_count = np.zeros(sat_k.shape, dtype=np.int64)
+    sat_k[1:, 1:] = np.where(valid, k_grid, 0.0).cumsum(axis=0).cumsum(axis=1)
+    sat_count[1:, 1:] = valid.cumsum(axis=0).cumsum(axis=1)
+    return sat_k, sat_count
+
+def save_summed_area(sat_k, sat_count, folder=SAT_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+    np.save(os.path.join(folder, "sat_k.npy"), sat_k)
+    np.save(os.path.join(folder, "sat_count.npy"), sat_count)
+
+class KSummedArea:
+    """
+    Constant-time mean k over lat/lon rectangles of the tile grid (all methods vectorized).
+
+    Rectangles snap outward to the tiles they touch. Longitudes wrap across the antimeridian
+    and latitudes are clamped at the poles.
+    """
+
+    def __init__(self, sat_k, sat_count, tile_size=TILE_SIZE):
+        self.sat_k = sat_k
+        self.sat_count = sat_count
+        self.tile_size = tile_size
+        self.rows = sat_k.shape[0] - 1
+        self.cols = sat_k.shape[1] - 1
+
+    @classmethod
+    def load(cls, folder=SAT_FOLDER):
+        """Memory-maps saved tables, so only the corners actually looked up are read."""
+        return cls(np.load(os.path.join(folder, "sat_k.npy"), mmap_mode='r'),
+                   np.load(os.path.join(folder, "sat_count.npy"), mmap_mode='r'))
+
+    @classmethod
+    def from_cache(cls, cache_file=CACHE_FILE):
+        return cls(*build_summed_area(load_tile_grid(cache_file)[0]))
+
+    # --- Tile index helpers ---
+    def _tile_rows(self, lat):
+        _, pixel_y = latlon_to_pixel(np.clip(lat, -90.0, 90.0), 0.0)
+        return np.clip(np.floor(pixel_y / self.tile_size[1]).astype(np.int64), 0, self.rows - 1)
+
+    def _tile_cols(self, lon):
+        pixel_x, _ = latlon_to_pixel(0.0, lon)
+        return np.clip(np.floor(pixel_x / self.tile_size[0]).astype(np.int64), 0, self.cols - 1)
+
+    def _rect(self, y0, x0, y1, x1, enabled):
+        """(k sum, count) over inclusive tile rectangles; disabled or empty ones give zero."""
+        enabled = enabled & (y1 >= y0) & (x1 >= x0)
+        y0, x0 = np.where(enabled, y0, 0), np.where(enabled, x0, 0)
+        y1, x1 = np.where(enabled, y1, -1), np.where(enabled, x1, -1)
+        sums = []
+        for sat in (self.sat_k, self.sat_count):
+            total = sat[y1 + 1, x1 + 1] - sat[y0, x1 + 1] - sat[y1 + 1, x0] + sat[y0, x0]
+            sums.append(np.where(enabled, total, 0))
+        return sums[0], sums[1]
+
+    def _strip(self, y0, y1, lon_start, width):
+        """Sums over tile rows y0..y1 and a lon interval starting at lon_start, wrapping at 180."""
+        lon_start = (lon_start + 180.0) % 360.0 - 180.0
+        lon_end = lon_start + width
+        # A wrapped part reaching back to the start column covers every column
+        full = (width >= 360.0) | ((lon_end > 180.0) & (self._tile_cols(lon_end - 360.0) >= self._tile_cols(lon_start)))
+        wraps = ~full & (lon_end > 180.0)
+
+        k_main, n_main = self._rect(y0, np.where(full, 0, self._tile_cols(lon_start)),
+                                    y1, np.where(full, self.cols - 1, self._tile_cols(np.minimum(lon_end, 180.0))),
+                                    width >= 0.0)
+        k_wrap, n_wrap = self._rect(y0, np.zeros_like(y0), y1, self._tile_cols(lon_end - 360.0), wraps)
+        return k_main + k_wrap, n_main + n_wrap
+
+    # --- Footprints ---
+    def sum_in_box(self, lat_min, lon_min, lat_max, lon_max):
+        """(k sum, valid tile count) over lat/lon boxes; lon_min > lon_max crosses the antimeridian."""
+        lat_min, lat_max = np.asarray(lat_min, dtype=np.float64), np.asarray(lat_max, dtype=np.float64)
+        lon_min, lon_max = np.asarray(lon_min, dtype=np.float64), np.asarray(lon_max, dtype=np.float64)
+        width = np.where(lon_max >= lon_min, lon_max - lon_min, lon_max - lon_min + 360.0)
+        return self._strip(self._tile_rows(lat_min), self._tile_rows(lat_max), lon_min, width)
+
+    def mean_in_box(self, lat_min, lon_min, lat_max, lon_max):
+        """Mean k over lat/lon boxes (NaN where a box holds no valid tiles)."""
+        return _mean(*self.sum_in_box(lat_min, lon_min, lat_max, lon_max))
+
+    def sum_in_disk(self, lat, lon, radius_km, strips=DISK_STRIPS):
+        """
+        (k sum, valid tile count) over great-circle disks, approximated by `strips` rectangles.
+
+        The disk's tile rows are split into disjoint groups; each group spans the disk's
+        longitude extent at its middle latitude. Disks containing a pole span all longitudes
+        there; disks smaller than a tile fall back to the tile holding their center.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        angle = np.asarray(radius_km, dtype=np.float64) / EARTH_RADIUS_KM
+        y_lo = self._tile_rows(lat - np.degrees(angle))
+        y_hi = self._tile_rows(lat + np.degrees(angle))
+        span = y_hi - y_lo + 1
+
+        k_total, n_total = np.zeros(np.broadcast(lat, lon, angle).shape), np.zeros(np.broadcast(lat, lon, angle).shape)
+        lat_rad = np.radians(lat)
+        for i in range(strips):
+            y0 = y_lo + (span * i) // strips
+            y1 = y_lo + (span * (i + 1)) // strips - 1
+            mid_lat, _ = pixel_to_latlon(0.0, (y0 + y1 + 1) / 2.0 * self.tile_size[1])
+            mid_rad = np.radians(np.clip(mid_lat, -90.0, 90.0))
+            # Spherical law of cosines solved for the longitude half-width at mid_lat
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cos_dlon = (np.cos(angle) - np.sin(lat_rad) * np.sin(mid_rad)) / (np.cos(lat_rad) * np.cos(mid_rad))
+            cos_dlon = np.nan_to_num(cos_dlon, nan=-1.0, posinf=2.0, neginf=-2.0)
+            half_width = np.where(cos_dlon <= -1.0, 180.0, np.degrees(np.arccos(np.clip(cos_dlon, -1.0, 1.0))))
+            width = np.where(cos_dlon > 1.0, -1.0, 2.0 * half_width)
+            k_sum, count = self._strip(y0, y1, lon - half_width, width)
+            k_total, n_total = k_total + k_sum, n_total + count
+
+        # Disks smaller than a tile can miss every strip's middle row; use the center tile
+        k_center, n_center = self.sum_in_box(lat, lon, lat, lon)
+        empty = n_total == 0
+        return np.where(empty, k_center, k_total), np.where(empty, n_center, n_total)
+
+    def mean_in_disk(self, lat, lon, radius_km, strips=DISK_STRIPS):
+        """Mean k over great-circle disks (NaN where a disk holds no valid tiles)."""
+        return _mean(*self.sum_in_disk(lat, lon, radius_km, strips))
+
+def _mean(k_sum, count):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, k_sum / count, np.nan)
+
+# --- 3. MAIN EXECUTION ---
+def main():
+    print(f"Building summed-area tables from '{CACHE_FILE}'...")
+    if not os.path.exists(CACHE_FILE):
+        print(f"\nFatal Error: Cache file not found at '{CACHE_FILE}'.")
+        print("Please run the precomputation script first.")
+        exit()
+
+    sat_k, sat_count = build_summed_area(load_tile_grid(CACHE_FILE)[0])
+    save_summed_area(sat_k, sat_count)
+    print(f"✅ Saved {sat_k.shape[1] - 1} x {sat_k.shape[0] - 1} tile tables to '{SAT_FOLDER}'")
+
+    sat = KSummedArea.load()
+    mean_k = sat.mean_in_disk(34.6834, -82.8374, 100.0)
+    print(f"\nMean k within 100 km of Clemson University, SC: {float(mean_k):.5f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
-import pandas as pd
 import geopandas as gpd
+from k_snapshot import load_dataframe
 
 # --- SCRIPT TO ANALYZE YOUR K-VALUE FILE ---
 
 try:
     # Load your final k-value dataset
     print("Loading your k-value data...")
-    df_k_values = pd.read_csv('global_complete_k_values.csv')
+    df_k_values, _ = load_dataframe('global_complete_k_values.csv')
     
     # Convert it to a GeoDataFrame
     gdf_k_values = gpd.GeoDataFrame(
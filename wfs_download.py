@@ -0,0 +1,318 @@
+import os
+import io
+import re
+import json
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import geopandas as gpd
+import pyogrio
+from checkpoint_io import checkpoint_path, write_checkpoint_chunks
+
+# --- 1. CONFIGURATION ---
+CACHE_FOLDER = 'wfs_cache'
+WORKERS = 4                # Requests in flight at once
+REQUESTS_PER_SECOND = 1.0  # Sustained request rate, to stay polite to the server
+BURST = 2                  # Requests that may start back to back after an idle spell
+MAX_FEATURES = 5000        # Features asked for per request; a full response means "split the tile"
+MIN_TILE_DEGREES = 0.5     # Truncated tiles stop splitting below this size
+FEATURE_ID_COLUMN = 'gml_id'  # GDAL's column for the GML feature id (gml:id)
+RETRIES = 3
+BACKOFF_SECONDS = 2.0
+
+# --- 2. RATE LIMITING ---
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may start."""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+# --- 3. THE TILE CACHE ---
+# One file per (layer, bbox): '<bbox>.gml' holds a complete response, '<bbox>.split.json'
+# records that the server truncated it and lists the sub-tiles that replace it.
+def _layer_folder(cache_folder, layer):
+    return os.path.join(cache_folder, re.sub(r'[^A-Za-z0-9_.-]', '_', layer))
+
+def _tile_name(bbox):
+    return '_'.join(repr(float(v)) for v in bbox)
+
+def _write_atomic(path, data):
+    # Written under a temporary name first, so an interrupted run never leaves a partial tile
+    temp_path = path + '.part'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def split_bbox(bbox):
+    """The four quadrants of a bbox, west-to-east then south-to-north like the tile loops."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    mid_lon, mid_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+    return [(min_lon, min_lat, mid_lon, mid_lat), (min_lon, mid_lat, mid_lon, max_lat),
+            (mid_lon, min_lat, max_lon, mid_lat), (mid_lon, mid_lat, max_lon, max_lat)]
+
+# --- 4. RESPONSE CHECKS ---
+_COUNT_PATTERN = re.compile(rb'number(Matched|Returned)="([^"]*)"')
+_MEMBER_PATTERN = re.compile(rb'<(?:wfs:member|gml:featureMember)\b')
+
+def feature_count(data):
+    """Features in a GML response: numberReturned if the server reports it, else counted."""
+    counts = dict(_COUNT_PATTERN.findall(data[:4096]))
+    if counts.get(b'Returned', b'').isdigit():
+        return int(counts[b'Returned'])
+    return len(_MEMBER_PATTERN.findall(data))
+
+def is_truncated(data, max_features=MAX_FEATURES):
+    """True if the server returned fewer features than match the request."""
+    counts = dict(_COUNT_PATTERN.findall(data[:4096]))
+    matched = counts.get(b'Matched', b'')
+    if matched.isdigit():
+        return feature_count(data) < int(matched)
+    # numberMatched="unknown" (or WFS 1.x): a full page means there may be more
+    return bool(max_features) and feature_count(data) >= max_features
+
+# --- 5. THE DOWNLOADER ---
+class TileDownloader:
+    """
+    Downloads bbox tiles of one WFS layer through an on-disk cache.
+
+    fetch(bbox) performs one GetFeature request and returns the response bytes; it is
+    called from worker threads, at most `workers` at a time and no faster than the token
+    bucket allows. Every finished tile is written to the cache immediately, so an
+    interrupted run resumes where it stopped, and a truncated response is replaced by
+    its four quadrants (recursively, down to min_tile_degrees; a tile still truncated at
+    that size is reported as failed rather than saved incomplete).
+    """
+
+    def __init__(self, fetch, layer, cache_folder=CACHE_FOLDER, workers=WORKERS,
+                 rate=REQUESTS_PER_SECOND, burst=BURST, max_features=MAX_FEATURES,
+                 min_tile_degrees=MIN_TILE_DEGREES, retries=RETRIES, backoff_seconds=BACKOFF_SECONDS):
+        self.fetch = fetch
+        self.folder = _layer_folder(cache_folder, layer)
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.max_features = max_features
+        self.min_tile_degrees = min_tile_degrees
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        os.makedirs(self.folder, exist_ok=True)
+
+    def tile_path(self, bbox):
+        return os.path.join(self.folder, _tile_name(bbox) + '.gml')
+
+    def split_path(self, bbox):
+        return os.path.join(self.folder, _tile_name(bbox) + '.split.json')
+
+    def _cached(self, bbox):
+        """('tile', path) or ('split', children) from the cache, or None if not downloaded yet."""
+        if os.path.exists(self.tile_path(bbox)):
+            return 'tile', self.tile_path(bbox)
+        if os.path.exists(self.split_path(bbox)):
+            with open(self.split_path(bbox), 'r', encoding='utf-8') as f:
+                return 'split', [tuple(child) for child in json.load(f)]
+        return None
+
+    def _download(self, bbox):
+        """Runs on a worker thread: fetches one tile (with retries) and caches the outcome."""
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                data = self.fetch(bbox)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    return 'failed', e
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+
+        if is_truncated(data, self.max_features):
+            if bbox[2] - bbox[0] <= self.min_tile_degrees or bbox[3] - bbox[1] <= self.min_tile_degrees:
+                # Not cached: saving it would silently drop the features the server left out
+                return 'failed', ValueError(f"still truncated at the minimum tile size ({self.min_tile_degrees}°); "
+                                            "raise MAX_FEATURES or lower MIN_TILE_DEGREES")
+            children = split_bbox(bbox)
+            _write_atomic(self.split_path(bbox), json.dumps(children).encode('utf-8'))
+            return 'split', children
+        _write_atomic(self.tile_path(bbox), data)
+        return 'tile', self.tile_path(bbox)
+
+    def download(self, bboxes):
+        """
+        Brings every bbox into the cache. Returns (tile paths, failed bboxes), with the
+        paths in the order of `bboxes` and split tiles replaced by their quadrants in place.
+        """
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+
+            def resolve(bbox):
+                cached = self._cached(bbox)
+                if cached is None:
+                    running[pool.submit(self._download, bbox)] = bbox
+                    return
+                outcomes[bbox] = cached
+                if cached[0] == 'split':
+                    for child in cached[1]:
+                        resolve(child)
+
+            for bbox in bboxes:
+                resolve(bbox)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    bbox = running.pop(future)
+                    outcomes[bbox] = future.result()
+                    kind, detail = outcomes[bbox]
+                    if kind == 'tile':
+                        with open(detail, 'rb') as f:
+                            print(f"  Tile {bbox}: {feature_count(f.read())} features")
+                    elif kind == 'split':
+                        print(f"  Tile {bbox}: truncated by the server, splitting into 4")
+                        for child in detail:
+                            resolve(child)
+                    else:
+                        print(f"    --> Warning: Could not download tile {bbox}. Error: {detail}")
+
+        paths, failed = [], []
+
+        def collect(bbox):
+            kind, detail = outcomes[bbox]
+            if kind == 'tile':
+                paths.append(detail)
+            elif kind == 'split':
+                for child in detail:
+                    collect(child)
+            else:
+                failed.append(bbox)
+
+        for bbox in bboxes:
+            collect(bbox)
+        return paths, failed
+
+# --- 6. CONTINENT CHECKPOINTS ---
+def continent_tiles(bbox, step):
+    """The step-degree tiles covering a continent's bbox, lon outer and lat inner."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return [(lon, lat, lon + step, lat + step)
+            for lon in range(min_lon, max_lon, step) for lat in range(min_lat, max_lat, step)]
+
+_NUMERIC_OGR_TYPES = {'OFTInteger', 'OFTInteger64', 'OFTReal'}
+
+def scan_tiles(paths):
+    """
+    Reads the schema (not the features) of every cached GML tile, so the tiles can be
+    streamed into one checkpoint. Returns (tiles that hold features, columns, unreadable
+    tiles); unreadable tiles are dropped from the cache so the next run requests them again.
+
+    GDAL infers each tile's columns from its own features, so a column can be missing
+    from some tiles or typed differently between them. `columns` maps each column to the
+    dtype every tile is cast to, or None where the tiles already agree; as with pd.concat,
+    a column that is numeric everywhere becomes float64, and any other mix becomes text.
+    """
+    readable, unreadable, tile_types = [], [], []
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if feature_count(data) == 0:
+            continue
+        try:
+            info = pyogrio.read_info(data)
+        except Exception as e:
+            print(f"    --> Warning: Could not process tile '{path}'. Error: {e}")
+            os.remove(path)
+            unreadable.append(path)
+            continue
+        readable.append(path)
+        tile_types.append(dict(zip(info['fields'], info['ogr_types'])))
+
+    columns = {}
+    for types in tile_types:
+        for name in types:
+            columns.setdefault(name, None)
+    for name in columns:
+        seen = {types.get(name) for types in tile_types}
+        if len(seen) > 1:
+            columns[name] = 'float64' if seen - {None} <= _NUMERIC_OGR_TYPES else 'object'
+    return readable, columns, unreadable
+
+def read_tiles(paths, columns):
+    """
+    Yields the tiles from scan_tiles() one GeoDataFrame at a time, with the same columns
+    and dtypes, ready for checkpoint_io.write_checkpoint_chunks().
+
+    Tiles are bbox-intersect queries, so a feature crossing a tile (or quadrant) edge
+    comes back once per tile; only its first copy is kept, by gml:id.
+    """
+    seen_ids = set()
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            tile_gdf = gpd.read_file(io.BytesIO(data))
+        except Exception:
+            os.remove(path)
+            raise
+        if FEATURE_ID_COLUMN in tile_gdf.columns:
+            ids = tile_gdf[FEATURE_ID_COLUMN]
+            keep = ~(ids.notna() & (ids.duplicated() | ids.isin(seen_ids)))
+            seen_ids.update(ids[keep & ids.notna()])
+            tile_gdf = tile_gdf[keep]
+        for name, dtype in columns.items():
+            if name not in tile_gdf.columns:
+                tile_gdf[name] = None
+            if dtype == 'float64':
+                tile_gdf[name] = tile_gdf[name].astype('float64')
+            elif dtype == 'object':
+                tile_gdf[name] = tile_gdf[name].map(str, na_action='ignore').astype(object)
+        yield tile_gdf[list(columns) + [tile_gdf.geometry.name]].reset_index(drop=True)
+
+def download_checkpoints(downloader, continents, step, output_folder):
+    """
+    Downloads each continent's tiles and saves them as '<continent>_geology.fgb' (see checkpoint_io).
+
+    A continent with tiles that could not be downloaded or read gets no checkpoint; running
+    again re-requests only those tiles. Returns the names of the incomplete continents.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    incomplete = []
+    for continent, bbox in continents.items():
+        print(f"\n--- Processing {continent} ---")
+        paths, failed = downloader.download(continent_tiles(bbox, step))
+        if failed:
+            print(f"  {len(failed)} tile(s) failed; no checkpoint written for {continent}. Run again to resume.")
+            incomplete.append(continent)
+            continue
+
+        print(f"  Combining tiles for {continent}...")
+        paths, columns, unreadable = scan_tiles(paths)
+        if unreadable:
+            print(f"  {len(unreadable)} tile(s) were unreadable; no checkpoint written for {continent}. Run again to resume.")
+            incomplete.append(continent)
+            continue
+
+        checkpoint_filename = checkpoint_path(output_folder, continent)
+        try:
+            written = write_checkpoint_chunks(read_tiles(paths, columns), checkpoint_filename)
+        except Exception as e:
+            print(f"    --> Error writing the checkpoint for {continent}. Error: {e}. Run again to resume.")
+            incomplete.append(continent)
+            continue
+        if not written:
+            print(f"  No data was downloaded for {continent}.")
+            continue
+        print(f"  ✅ Checkpoint saved: {checkpoint_filename} ({written} features)")
+    return incomplete